@@ -2,7 +2,9 @@
 
 from flask import Blueprint, jsonify, request
 
+from app.core.exceptions import DatabaseError
 from app.core.security import security_manager
+from app.database.backup import backup_engine
 from app.database.connection import db_manager
 from app.services.user_service import UserService
 
@@ -44,11 +46,25 @@ async def dashboard():
 
 @admin_bp.route("/backup", methods=["POST"])
 async def backup():
-    """Создать backup SQLite БД для простого администрирования."""
+    """Запустить резервное копирование БД в фоне."""
     if not _is_admin_request():
         return jsonify({"error": "Unauthorized"}), 401
 
     data = request.get_json(silent=True) or {}
-    backup_path = data.get("path")
-    result_path = await db_manager.backup_database(backup_path)
-    return jsonify({"status": "ok", "backup_path": result_path})
+    try:
+        job = backup_engine.start(data.get("path"), data.get("compression"))
+    except DatabaseError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": job.status, "job_id": job.id}), 202
+
+
+@admin_bp.route("/backup/<job_id>", methods=["GET"])
+async def backup_status(job_id: str):
+    """Состояние задачи резервного копирования."""
+    if not _is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = backup_engine.get(job_id)
+    if job is None:
+        return jsonify({"error": "Backup job not found"}), 404
+    return jsonify(job.to_dict())
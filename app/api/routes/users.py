@@ -30,17 +30,34 @@ async def list_users():
         return jsonify({"error": "Unauthorized"}), 401
 
     limit = min(max(request.args.get("limit", default=50, type=int) or 50, 1), 200)
-    offset = max(request.args.get("offset", default=0, type=int) or 0, 0)
     active_only = request.args.get("active_only", default="true").lower() != "false"
     search = request.args.get("search")
 
-    users = await user_service.get_users_list(
-        limit=limit,
-        offset=offset,
-        search=search,
-        active_only=active_only,
-    )
-    return jsonify({"items": users, "limit": limit, "offset": offset})
+    cursor = request.args.get("cursor") or None
+    offset = max(request.args.get("offset", default=0, type=int) or 0, 0)
+
+    # Продолжение по курсору: keyset пагинация без OFFSET
+    if cursor and not search:
+        page = await user_service.get_users_page(limit=limit, cursor=cursor, active_only=active_only)
+        return jsonify({"items": page["items"], "limit": limit, "next_cursor": page["next_cursor"]})
+
+    if search:
+        users = await user_service.get_users_list(
+            limit=limit,
+            offset=offset,
+            search=search,
+            active_only=active_only,
+        )
+        return jsonify({"items": users, "limit": limit, "offset": offset, "next_cursor": None})
+
+    # По умолчанию пагинация через OFFSET; next_cursor позволяет перейти на курсор
+    page = await user_service.get_users_page(limit=limit, offset=offset, active_only=active_only)
+    return jsonify({
+        "items": page["items"],
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": page["next_cursor"],
+    })
 
 
 @users_bp.route("/<int:telegram_id>/ban", methods=["POST"])
@@ -52,5 +69,21 @@ async def ban_user(telegram_id: int):
 
     data = request.get_json(silent=True) or {}
     banned = bool(data.get("banned", True))
-    updated = await user_service.ban_user(telegram_id, banned=banned)
-    return jsonify({"telegram_id": telegram_id, "banned": banned, "updated": updated})
+    subscription_ids = await user_service.ban_user_with_subscriptions(telegram_id, banned=banned)
+    return jsonify({
+        "telegram_id": telegram_id,
+        "banned": banned,
+        "updated": subscription_ids is not None,
+        "subscription_ids": subscription_ids or [],
+    })
+
+
+@users_bp.route("/<int:telegram_id>", methods=["DELETE"])
+async def delete_user(telegram_id: int):
+    """Удаление пользователя вместе с подписками и платежами."""
+    payload = _extract_token_payload()
+    if not payload or payload.get("role") != "admin":
+        return jsonify({"error": "Unauthorized"}), 401
+
+    subscription_ids = await user_service.delete_user(telegram_id)
+    return jsonify({"telegram_id": telegram_id, "deleted": True, "subscription_ids": subscription_ids})
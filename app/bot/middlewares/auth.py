@@ -8,6 +8,7 @@ from aiogram.types import TelegramObject, Message, CallbackQuery
 
 from config.settings import settings
 from app.services.user_service import UserService
+from app.services.activity_service import activity_tracker
 from app.core.exceptions import AuthorizationError
 from config.logging import security_logger
 
@@ -70,6 +71,9 @@ class AuthMiddleware(BaseMiddleware):
                     await event.answer("Недостаточно прав.", show_alert=True)
                 return
 
+        # Отмечаем активность (запись в БД отложенная, см. ActivityTracker)
+        activity_tracker.touch(user.id)
+
         # Добавляем флаг админа в контекст
         data['is_admin'] = user.id in settings.telegram.admin_ids
 
@@ -4,7 +4,7 @@
 
 import json
 import pickle
-from typing import Any, Optional, Union
+from typing import Any, Iterable, Optional, Union
 import aioredis
 from config.settings import settings
 from config.logging import get_logger
@@ -113,6 +113,18 @@ class CacheManager:
             logger.error(f"Failed to delete cache key {key}: {e}")
             return False
 
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """Удаление нескольких ключей одной командой."""
+        keys = list(keys)
+        if not self.connected or not keys:
+            return 0
+
+        try:
+            return await self.redis.delete(*keys)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(keys)} cache keys: {e}")
+            return 0
+
     async def exists(self, key: str) -> bool:
         """Проверка существования ключа."""
         if not self.connected:
@@ -160,6 +172,20 @@ class CacheManager:
 # Глобальный экземпляр кэша
 cache = CacheManager()
 
+# Пространство кэша профилей пользователей (UserService.get_user_profile)
+PROFILE_NAMESPACE = "profile"
+
+
+def profile_cache_key(telegram_id: int) -> str:
+    """Ключ кэша профиля пользователя."""
+    return cache.cache_key(PROFILE_NAMESPACE, telegram_id)
+
+
+async def invalidate_profiles(telegram_ids: Iterable[int]) -> int:
+    """Сброс закэшированных профилей пользователей после записи,
+    меняющей поля их профилей."""
+    return await cache.delete_many(profile_cache_key(telegram_id) for telegram_id in set(telegram_ids))
+
 
 def cached(ttl: int = None, key_prefix: str = ""):
     """Декоратор для кэширования результатов функций."""
@@ -17,6 +17,11 @@ class DatabaseError(BuryatVPNException):
     pass
 
 
+class QueryTimeoutError(DatabaseError):
+    """Запрос к базе данных прерван по таймауту."""
+    pass
+
+
 class ValidationError(BuryatVPNException):
     """Ошибки валидации данных."""
     pass
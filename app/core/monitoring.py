@@ -75,17 +75,104 @@ system_cpu_usage = Gauge(
 # Метрики базы данных
 db_connections = Gauge(
     'buryatvpn_db_connections',
-    'Number of database connections',
+    'Number of database connections by pool and state (checked_out, overflow)',
+    ['pool', 'state'],
     registry=registry
 )
 
 db_query_duration = Histogram(
     'buryatvpn_db_query_duration_seconds',
-    'Database query duration in seconds',
+    'Database query duration in seconds by repository method',
     ['operation'],
     registry=registry
 )
 
+db_pool_checkout_wait = Histogram(
+    'buryatvpn_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the pool',
+    ['pool'],
+    registry=registry
+)
+
+db_connection_lifetime = Histogram(
+    'buryatvpn_db_connection_lifetime_seconds',
+    'Lifetime of closed database connections',
+    ['pool'],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 7200, 86400),
+    registry=registry
+)
+
+db_statement_cache = Counter(
+    'buryatvpn_db_statement_cache_total',
+    'Statement cache lookups by cache (statement, compiled) and result',
+    ['cache', 'result'],
+    registry=registry
+)
+
+db_statement_timeouts = Counter(
+    'buryatvpn_db_statement_timeouts_total',
+    'Number of repository operations interrupted by a statement timeout',
+    ['operation'],
+    registry=registry
+)
+
+db_write_queue_depth = Gauge(
+    'buryatvpn_db_write_queue_depth',
+    'Number of write transactions waiting in the SQLite write queue',
+    registry=registry
+)
+
+db_write_batch_size = Histogram(
+    'buryatvpn_db_write_batch_size',
+    'Number of write transactions committed by one SQLite group commit',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+    registry=registry
+)
+
+db_write_busy_retries = Counter(
+    'buryatvpn_db_write_busy_retries_total',
+    'Number of SQLITE_BUSY retries when starting a write transaction',
+    registry=registry
+)
+
+db_slow_queries = Counter(
+    'buryatvpn_db_slow_queries_total',
+    'Number of statements slower than DATABASE_SLOW_QUERY_THRESHOLD',
+    ['operation'],
+    registry=registry
+)
+
+stats_counter_drift = Gauge(
+    'buryatvpn_stats_counter_drift',
+    'Difference between incremental stats counters and source tables at last reconciliation',
+    ['counter'],
+    registry=registry
+)
+
+subscriptions_expired = Counter(
+    'buryatvpn_subscriptions_expired_total',
+    'Number of subscriptions deactivated by the expiry engine',
+    registry=registry
+)
+
+expiry_delay = Histogram(
+    'buryatvpn_subscription_expiry_delay_seconds',
+    'Delay between subscription end_date and its deactivation',
+    registry=registry
+)
+
+traffic_buffer_depth = Gauge(
+    'buryatvpn_traffic_buffer_depth',
+    'Number of subscriptions with pending traffic updates',
+    registry=registry
+)
+
+traffic_flush_duration = Histogram(
+    'buryatvpn_traffic_flush_duration_seconds',
+    'Duration of traffic buffer flushes in seconds',
+    registry=registry
+)
+
 
 class HealthChecker:
     """Проверка состояния системы."""
@@ -0,0 +1,41 @@
+"""
+Замер длительности фаз запуска приложения.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from config.logging import get_logger
+
+logger = get_logger("startup")
+
+
+class StartupTimer:
+    """Длительность фаз запуска в порядке их выполнения."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Замер фазы ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def summary(self) -> str:
+        """Строка вида ``database=12ms, database.schema=3ms, ..., total=40ms``."""
+        parts = [f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases]
+        parts.append(f"total={(time.perf_counter() - self.started) * 1000:.0f}ms")
+        return ", ".join(parts)
+
+    def log_summary(self):
+        logger.info(f"Startup phases: {self.summary()}")
+
+
+# Глобальный таймер запуска
+startup_timer = StartupTimer()
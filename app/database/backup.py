@@ -0,0 +1,293 @@
+"""
+Резервное копирование базы данных без блокировки приложения.
+
+- SQLite: online backup API (``sqlite3.Connection.backup``) за один шаг
+  под транзакцией чтения; в режиме WAL писатели при этом продолжают
+  работать. Копия получается согласованной, в отличие от копирования
+  файла посреди записи.
+- PostgreSQL: ``COPY <table> TO STDOUT`` для каждой таблицы через asyncpg,
+  результат — каталог с CSV файлами и manifest.json.
+
+Резервная копия создается в фоновом потоке: API возвращает идентификатор
+задачи сразу, состояние доступно через ``BackupEngine.get``.
+Поддерживается потоковое сжатие (gzip, zstd — если установлен пакет
+``zstandard``) и SHA-256 контрольная сумма итоговых файлов.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database.models import Base
+from app.core.exceptions import DatabaseError
+from config.settings import settings
+from config.logging import db_logger
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Размер блока при потоковом чтении/сжатии
+_CHUNK_SIZE = 1024 * 1024
+
+# Сколько завершенных задач хранить в памяти
+_MAX_JOBS = 50
+
+
+@dataclass
+class BackupJob:
+    """Задача резервного копирования."""
+
+    id: str
+    path: str
+    compression: str
+    status: str = "pending"  # pending, running, done, failed
+    checksum: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        """Состояние задачи для API."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "backup_path": self.path,
+            "compression": self.compression,
+            "checksum": self.checksum,
+            "size": self.size,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class _HashingWriter:
+    """Файл, считающий SHA-256 и размер записанных данных."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "wb")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _CompressedOutput:
+    """Потоковая запись со сжатием и контрольной суммой итогового файла."""
+
+    def __init__(self, path: Path, compression: str):
+        self._raw = _HashingWriter(path)
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                self._raw.close()
+                raise DatabaseError("zstd compression requires the 'zstandard' package")
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, data: bytes):
+        self._stream.write(data)
+
+    def close(self) -> tuple:
+        """Закрытие потока; возвращает (sha256, размер)."""
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+        return self._raw.sha256.hexdigest(), self._raw.size
+
+
+class BackupEngine:
+    """Фоновое резервное копирование SQLite и PostgreSQL."""
+
+    def __init__(self):
+        self.jobs: Dict[str, BackupJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, backup_path: str = None, compression: str = None) -> BackupJob:
+        """Запуск резервного копирования в фоне; возвращает задачу."""
+        compression = (compression or settings.database.backup_compression).lower()
+        if compression not in COMPRESSION_SUFFIXES:
+            raise DatabaseError(f"Unsupported backup compression: {compression}")
+        if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise DatabaseError("zstd compression requires the 'zstandard' package")
+
+        database_url = make_url(settings.database.url)
+        if database_url.get_backend_name() not in ("sqlite", "postgresql"):
+            raise DatabaseError("Backup supports only SQLite and PostgreSQL databases")
+
+        if not backup_path:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_dir = Path(settings.database.backup_dir)
+            backup_dir.mkdir(parents=True, exist_ok=True)
+            if database_url.get_backend_name() == "sqlite":
+                name = f"database_backup_{timestamp}.db{COMPRESSION_SUFFIXES[compression]}"
+            else:
+                name = f"database_backup_{timestamp}"
+            backup_path = str(backup_dir / name)
+
+        job = BackupJob(id=uuid.uuid4().hex, path=backup_path, compression=compression)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune_jobs()
+
+        threading.Thread(
+            target=self._run_job, args=(job,), name=f"backup-{job.id}", daemon=True
+        ).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[BackupJob]:
+        """Задача по идентификатору."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _prune_jobs(self):
+        """Удаление старых завершенных задач сверх лимита."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished.is_set()]
+        for job_id in finished[: max(0, len(self.jobs) - _MAX_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run_job(self, job: BackupJob):
+        """Выполнение задачи в отдельном потоке."""
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            database_url = make_url(settings.database.url)
+            if database_url.get_backend_name() == "sqlite":
+                self._backup_sqlite(database_url.database, job)
+            else:
+                asyncio.run(self._backup_postgres(job))
+
+            job.status = "done"
+            db_logger.info(f"Database backup created: {job.path} (sha256 {job.checksum})")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            db_logger.error(f"Failed to create database backup {job.id}: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            job.finished.set()
+
+    def _backup_sqlite(self, db_path: str, job: BackupJob):
+        """Online backup SQLite за один шаг."""
+        target = Path(job.path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        raw_path = target if job.compression == "none" else target.with_name(target.name + ".tmp")
+
+        source = sqlite3.connect(db_path, timeout=settings.database.sqlite_busy_timeout / 1000)
+        destination = sqlite3.connect(str(raw_path))
+        try:
+            # Копирование порциями начинается заново после каждой записи
+            # в источник другим соединением и на нагруженной базе может не
+            # закончиться; один шаг держит только снимок чтения
+            source.backup(destination, pages=-1)
+        finally:
+            destination.close()
+            source.close()
+
+        if raw_path == target:
+            job.checksum, job.size = self._checksum_file(target)
+            self._write_checksum_file(target, job.checksum)
+            return
+
+        try:
+            output = _CompressedOutput(target, job.compression)
+            with open(raw_path, "rb") as raw:
+                for chunk in iter(lambda: raw.read(_CHUNK_SIZE), b""):
+                    output.write(chunk)
+            job.checksum, job.size = output.close()
+        finally:
+            os.remove(raw_path)
+
+        self._write_checksum_file(target, job.checksum)
+
+    async def _backup_postgres(self, job: BackupJob):
+        """COPY ... TO STDOUT для каждой таблицы в отдельный файл."""
+        target = Path(job.path)
+        target.mkdir(parents=True, exist_ok=True)
+        suffix = COMPRESSION_SUFFIXES[job.compression]
+
+        # Отдельный движок: задача выполняется в своем event loop. COPY
+        # выполняется через asyncpg, каким бы драйвером ни был задан URL
+        copy_url = make_url(settings.database.url).set(drivername="postgresql+asyncpg")
+        backup_engine = create_async_engine(copy_url, poolclass=NullPool)
+        manifest = {"created_at": datetime.utcnow().isoformat(), "tables": {}}
+        try:
+            async with backup_engine.connect() as conn:
+                raw_connection = await conn.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+
+                # Один снимок данных для всех таблиц
+                async with driver_connection.transaction(isolation="repeatable_read", readonly=True):
+                    for table in Base.metadata.sorted_tables:
+                        output = _CompressedOutput(target / f"{table.name}.csv{suffix}", job.compression)
+
+                        async def sink(data: bytes, output=output):
+                            output.write(data)
+
+                        try:
+                            await driver_connection.copy_from_table(
+                                table.name, output=sink, format="csv", header=True
+                            )
+                        finally:
+                            checksum, size = output.close()
+
+                        manifest["tables"][table.name] = {
+                            "file": f"{table.name}.csv{suffix}",
+                            "sha256": checksum,
+                            "size": size,
+                        }
+        finally:
+            await backup_engine.dispose()
+
+        manifest_bytes = json.dumps(manifest, indent=2).encode()
+        (target / "manifest.json").write_bytes(manifest_bytes)
+        job.checksum = hashlib.sha256(manifest_bytes).hexdigest()
+        job.size = sum(table["size"] for table in manifest["tables"].values())
+
+    @staticmethod
+    def _write_checksum_file(path: Path, checksum: str):
+        """Файл контрольной суммы рядом с копией (формат sha256sum)."""
+        path.with_name(path.name + ".sha256").write_text(f"{checksum}  {path.name}\n")
+
+    @staticmethod
+    def _checksum_file(path: Path) -> tuple:
+        """SHA-256 и размер файла."""
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                size += len(chunk)
+        return sha256.hexdigest(), size
+
+
+# Глобальный экземпляр движка резервного копирования
+backup_engine = BackupEngine()
@@ -3,47 +3,132 @@
 """
 
 import asyncio
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Optional
+from contextvars import ContextVar
+from typing import AsyncContextManager, AsyncGenerator, List, Optional
 from sqlalchemy.ext.asyncio import (
     create_async_engine, 
     AsyncSession, 
     async_sessionmaker,
     AsyncEngine
 )
-from sqlalchemy import text
+from sqlalchemy import event, text
 
 from config.settings import settings
 from config.logging import db_logger
-from app.database.models import Base
+from app.database.routing import replica_router
+from app.database import timeouts
+from app.database.timeouts import MIGRATIONS_OPERATION
+from app.database.write_queue import write_queue
+from app.database.instrumentation import instrument_engine, operation_label
+from app.database.schema import get_schema_revision, head_revision, upgrade_schema
+from app.database.search import detect_search_index, install_search_index
+from app.core.startup import startup_timer
 from app.core.exceptions import DatabaseError
 
 # Глобальные переменные для движка и фабрики сессий
 engine: Optional[AsyncEngine] = None
 SessionLocal: Optional[async_sessionmaker] = None
 
+# Фабрика сессий основной БД только для чтения (без COMMIT)
+ReadOnlySessionLocal: Optional[async_sessionmaker] = None
+
+# Сессия текущего unit of work (если операция выполняется внутри unit_of_work)
+_current_session: ContextVar[Optional[AsyncSession]] = ContextVar(
+    "current_db_session", default=None
+)
+
+# Время последней записи в текущем контексте (для read-your-writes на репликах)
+_last_write_at: ContextVar[Optional[float]] = ContextVar(
+    "last_db_write_at", default=None
+)
+
+
+def _is_sqlite_file(database_url: str) -> bool:
+    """URL указывает на файловую (не in-memory) базу SQLite."""
+    return (
+        database_url.startswith("sqlite")
+        and ":memory:" not in database_url
+        and not database_url.rstrip("/").endswith(":")
+    )
+
+
+def _sqlite_pragmas(read_only: bool = False) -> List[str]:
+    """PRAGMA производительного профиля SQLite для нового соединения."""
+    db_settings = settings.database
+    pragmas = [
+        f"PRAGMA busy_timeout = {db_settings.sqlite_busy_timeout}",
+        f"PRAGMA cache_size = {db_settings.sqlite_cache_size}",
+        f"PRAGMA mmap_size = {db_settings.sqlite_mmap_size}",
+        f"PRAGMA temp_store = {db_settings.sqlite_temp_store}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode сохраняется в файле БД, достаточно писателя
+        pragmas.append(f"PRAGMA journal_mode = {db_settings.sqlite_journal_mode}")
+        pragmas.append(f"PRAGMA synchronous = {db_settings.sqlite_synchronous}")
+    return pragmas
+
+
+def _install_sqlite_pragmas(async_engine: AsyncEngine, read_only: bool = False):
+    """Выполнение PRAGMA на каждом новом соединении движка."""
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _normalize_url(database_url: str) -> str:
+    """Нормализация URL для async SQLAlchemy.
+
+    В проекте может быть задан синхронный URL sqlite:///...,
+    но create_async_engine требует sqlite+aiosqlite:///...
+    """
+    if database_url.startswith("sqlite:///") and not database_url.startswith("sqlite+aiosqlite:///"):
+        database_url = database_url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return database_url
+
+
+def _driver_kwargs(database_url: str) -> dict:
+    """Кэши запросов и таймаут запросов по умолчанию для движка."""
+    kwargs = {"query_cache_size": settings.database.query_cache_size}
+    if database_url.startswith("postgresql+asyncpg"):
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": settings.database.prepared_statement_cache_size,
+            **timeouts.pg_connect_args(),
+        }
+    return kwargs
+
 
 async def init_database():
     """Инициализация базы данных."""
-    global engine, SessionLocal
+    global engine, SessionLocal, ReadOnlySessionLocal
 
     try:
-        # Нормализация URL для async SQLAlchemy.
-        # В проекте может быть задан синхронный URL sqlite:///...,
-        # но create_async_engine требует sqlite+aiosqlite:///...
-        database_url = settings.database.url
-        if database_url.startswith("sqlite:///") and not database_url.startswith("sqlite+aiosqlite:///"):
-            database_url = database_url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+        database_url = _normalize_url(settings.database.url)
 
         engine_kwargs = {
             "echo": settings.database.echo,
             "pool_pre_ping": True,
             "pool_recycle": 3600,
+            **_driver_kwargs(database_url),
         }
 
-        # Для SQLite не применяем pool_size/max_overflow —
-        # часть драйверов это не поддерживает.
-        if "sqlite" not in database_url:
+        sqlite_file = _is_sqlite_file(database_url)
+
+        # Для файловой SQLite пишет ровно одно соединение: конкурирующие
+        # писатели ждут в пуле, а не получают "database is locked".
+        # Для in-memory SQLite параметры пула не применяем.
+        if sqlite_file:
+            engine_kwargs["pool_size"] = 1
+            engine_kwargs["max_overflow"] = 0
+        elif "sqlite" not in database_url:
             engine_kwargs["pool_size"] = settings.database.pool_size
             engine_kwargs["max_overflow"] = settings.database.max_overflow
 
@@ -52,6 +137,7 @@ async def init_database():
             database_url,
             **engine_kwargs,
         )
+        instrument_engine(engine, "primary")
 
         # Создание фабрики сессий
         SessionLocal = async_sessionmaker(
@@ -60,12 +146,90 @@ async def init_database():
             expire_on_commit=False
         )
 
-        # Создание таблиц
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        # Чтения с основной БД: на PostgreSQL транзакция открывается как
+        # READ ONLY, характеристика сбрасывается при возврате в пул
+        read_only_engine = engine
+        if engine.dialect.name == "postgresql":
+            read_only_engine = engine.execution_options(postgresql_readonly=True)
+
+        # Профиль SQLite: WAL + отдельный пул соединений только для чтения
+        if sqlite_file:
+            _install_sqlite_pragmas(engine)
+
+            read_engine = create_async_engine(
+                database_url,
+                echo=settings.database.echo,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+                pool_size=settings.database.sqlite_read_pool_size,
+                max_overflow=0,
+                **_driver_kwargs(database_url),
+            )
+            _install_sqlite_pragmas(read_engine, read_only=True)
+            instrument_engine(read_engine, "sqlite-reader")
+
+            # Пул основной БД из одного соединения может держать
+            # транзакция записи: чтения не должны ждать его
+            read_only_engine = read_engine
+
+            replica_router.add_replica(
+                "sqlite-reader",
+                read_engine,
+                async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False),
+                check_lag=False,
+            )
+
+        ReadOnlySessionLocal = async_sessionmaker(
+            read_only_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
 
-        # Проверка соединения
-        await test_connection()
+        # Реплики для чтения (PostgreSQL)
+        for index, replica_url in enumerate(settings.database.replica_urls):
+            replica_url = _normalize_url(replica_url)
+            replica_engine = create_async_engine(
+                replica_url,
+                echo=settings.database.echo,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+                pool_size=settings.database.pool_size,
+                max_overflow=settings.database.max_overflow,
+                **_driver_kwargs(replica_url),
+            )
+            instrument_engine(replica_engine, f"replica-{index}")
+            replica_router.add_replica(
+                f"replica-{index}",
+                replica_engine,
+                async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False),
+            )
+
+        # Версия схемы: одно чтение alembic_version вместо отражения всех
+        # таблиц; заодно проверяет соединение
+        with startup_timer.phase("database.schema_check"):
+            async with engine.connect() as conn:
+                current = await get_schema_revision(conn)
+                if current == head_revision():
+                    await detect_search_index(conn)
+
+        if current != head_revision():
+            if not settings.database.auto_migrate:
+                raise DatabaseError(
+                    f"Database schema revision {current} does not match {head_revision()}, "
+                    f"run migrations"
+                )
+
+            with startup_timer.phase("database.migrations"):
+                await run_migrations()
+
+            # Построение индекса на большой таблице не ограничено таймаутом запросов
+            with startup_timer.phase("database.search_index"), operation_label(MIGRATIONS_OPERATION):
+                async with engine.begin() as conn:
+                    await install_search_index(conn)
+
+        # Единственный писатель с групповым коммитом
+        if sqlite_file and settings.database.sqlite_write_queue:
+            write_queue.start(engine)
 
         db_logger.info("Database initialized successfully")
 
@@ -88,9 +252,33 @@ async def test_connection():
         raise DatabaseError(f"Database connection test failed: {e}")
 
 
+def get_db_session() -> AsyncContextManager[AsyncSession]:
+    """Получение сессии базы данных с автоматическим управлением транзакциями.
+
+    Внутри активного unit_of_work возвращается его сессия: коммит и
+    откат выполняет внешний контекст, а не отдельный вызов репозитория.
+    """
+    return _primary_session()
+
+
 @asynccontextmanager
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    """Получение сессии базы данных с автоматическим управлением транзакциями."""
+async def _primary_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия основной БД; после коммита отмечает время записи в контексте.
+
+    Если очередь записи SQLite запущена в текущем event loop, транзакция
+    выполняется в ней.
+    """
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+
+    if write_queue.serves_current_loop():
+        async with write_queue.transaction() as session:
+            yield session
+        _last_write_at.set(time.monotonic())
+        return
+
     if not SessionLocal:
         raise DatabaseError("Database not initialized")
 
@@ -98,6 +286,7 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     try:
         yield session
         await session.commit()
+        _last_write_at.set(time.monotonic())
     except Exception as e:
         await session.rollback()
         db_logger.error(f"Database session error: {e}")
@@ -106,6 +295,84 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+@asynccontextmanager
+async def _read_only_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия основной БД для чтения, которая ничего не фиксирует.
+
+    При выходе транзакция откатывается (закрытие сессии), а не
+    фиксируется: чтение не тратит COMMIT и на SQLite не пытается взять
+    блокировку записи. На PostgreSQL транзакция только для чтения, на
+    файловой SQLite сессия берется из пула читателей.
+    Внутри unit_of_work используется его сессия.
+    """
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+
+    if not ReadOnlySessionLocal:
+        raise DatabaseError("Database not initialized")
+
+    session = ReadOnlySessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия для запросов, которые только читают данные.
+
+    Направляется маршрутизатором реплик: на файловой SQLite — в пул
+    соединений только для чтения (в режиме WAL они не блокируют
+    писателя), на PostgreSQL — в реплику с допустимым отставанием.
+    Внутри unit_of_work, сразу после записи в том же контексте и при
+    отсутствии подходящей реплики используется основная БД — вне
+    unit_of_work в сессии только для чтения, без COMMIT.
+    """
+    read_sessionmaker = None
+    if _current_session.get() is None:
+        read_sessionmaker = await replica_router.pick(_last_write_at.get())
+
+    if read_sessionmaker is None:
+        async with _read_only_session() as session:
+            yield session
+        return
+
+    session = read_sessionmaker()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncGenerator[AsyncSession, None]:
+    """Единая транзакция для нескольких вызовов репозиториев.
+
+    Все репозитории, вызванные внутри контекста, используют одну сессию
+    (одно соединение из пула) и один коммит в конце. Вложенный
+    unit_of_work присоединяется к внешнему.
+
+    Пример:
+        async with unit_of_work():
+            user = await user_repo.get_by_telegram_id(telegram_id)
+            await user_repo.update_last_activity(user.id)
+    """
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+
+    async with get_db_session() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+
 class DatabaseManager:
     """Менеджер базы данных для выполнения операций."""
 
@@ -119,8 +386,15 @@ class DatabaseManager:
     @staticmethod
     async def get_db_info() -> dict:
         """Получение информации о базе данных."""
+        from app.database.repositories.stats_repository import (
+            StatsRepository,
+            USERS_TOTAL,
+            SUBSCRIPTIONS_TOTAL,
+            PAYMENTS_TOTAL,
+        )
+
         try:
-            async with get_db_session() as session:
+            async with unit_of_work() as session:
                 # Получение версии SQLite или PostgreSQL
                 if "sqlite" in settings.database.url:
                     result = await session.execute(text("SELECT sqlite_version()"))
@@ -134,73 +408,76 @@ class DatabaseManager:
                     version = "Unknown"
                     db_type = "Unknown"
 
-                # Подсчет записей в основных таблицах
-                users_count = await session.execute(text("SELECT COUNT(*) FROM users"))
-                subscriptions_count = await session.execute(text("SELECT COUNT(*) FROM subscriptions"))
-                payments_count = await session.execute(text("SELECT COUNT(*) FROM payments"))
+                # Количество записей в основных таблицах берем из счетчиков
+                # stats_counters; COUNT(*) — только если сверка еще не выполнялась
+                table_counters = {
+                    "users": USERS_TOTAL,
+                    "subscriptions": SUBSCRIPTIONS_TOTAL,
+                    "payments": PAYMENTS_TOTAL,
+                }
+                counters = await StatsRepository().get_counters(table_counters.values())
+
+                tables = {}
+                for table, counter in table_counters.items():
+                    if counter in counters:
+                        tables[table] = counters[counter]
+                    else:
+                        result = await session.execute(text(f"SELECT COUNT(*) FROM {table}"))
+                        tables[table] = result.scalar()
 
                 return {
                     "type": db_type,
                     "version": version,
                     "url": settings.database.url.split("@")[-1] if "@" in settings.database.url else settings.database.url,
-                    "tables": {
-                        "users": users_count.scalar(),
-                        "subscriptions": subscriptions_count.scalar(),
-                        "payments": payments_count.scalar(),
-                    }
+                    "tables": tables
                 }
         except Exception as e:
             db_logger.error(f"Failed to get database info: {e}")
             return {"error": str(e)}
 
     @staticmethod
-    async def backup_database(backup_path: str = None) -> str:
-        """Создание резервной копии базы данных."""
-        if "sqlite" not in settings.database.url:
-            raise DatabaseError("Backup currently supports only SQLite databases")
+    async def backup_database(backup_path: str = None, compression: str = None) -> str:
+        """Создание резервной копии базы данных с ожиданием завершения.
 
-        import shutil
-        from datetime import datetime
-        from pathlib import Path
-
-        try:
-            # Определение пути к базе данных
-            db_path = settings.database.url.replace("sqlite:///", "")
+        Копирование выполняется в фоновом потоке (см. app.database.backup),
+        event loop во время ожидания не блокируется.
+        """
+        from app.database.backup import backup_engine
 
-            # Определение пути для резервной копии
-            if not backup_path:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_dir = Path("backups")
-                backup_dir.mkdir(exist_ok=True)
-                backup_path = backup_dir / f"database_backup_{timestamp}.db"
+        job = backup_engine.start(backup_path, compression)
+        await asyncio.to_thread(job.finished.wait)
 
-            # Создание копии
-            shutil.copy2(db_path, backup_path)
-
-            db_logger.info(f"Database backup created: {backup_path}")
-            return str(backup_path)
-
-        except Exception as e:
-            db_logger.error(f"Failed to create database backup: {e}")
-            raise DatabaseError(f"Backup failed: {e}")
+        if job.status != "done":
+            raise DatabaseError(f"Backup failed: {job.error}")
+        return job.path
 
 
 async def close_database():
     """Закрытие соединений с базой данных."""
-    global engine, SessionLocal
+    global engine, SessionLocal, ReadOnlySessionLocal
+
+    await write_queue.stop()
+    await replica_router.dispose()
 
     if engine:
         await engine.dispose()
         engine = None
         SessionLocal = None
+        ReadOnlySessionLocal = None
         db_logger.info("Database connections closed")
 
 
 # Утилиты для миграций
-async def run_migrations():
-    """Запуск миграций базы данных."""
-    # Здесь будет интеграция с Alembic при необходимости
-    pass
+async def run_migrations(revision: str = "head"):
+    """Применение миграций Alembic к основной БД."""
+    if not engine:
+        raise DatabaseError("Database engine not initialized")
+
+    try:
+        await upgrade_schema(engine, revision)
+    except Exception as e:
+        db_logger.error(f"Database migration failed: {e}")
+        raise DatabaseError(f"Database migration failed: {e}")
 
 
 # Экземпляр менеджера базы данных
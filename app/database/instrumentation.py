@@ -0,0 +1,234 @@
+"""
+Метрики пула соединений и запросов SQLAlchemy.
+
+Для каждого движка экспортируются ожидание соединения из пула, число
+выданных соединений и соединений сверх pool_size, время жизни соединений
+и длительность каждого запроса. Длительность помечается методом
+репозитория (``UserRepository.get_by_telegram_id``), а не текстом SQL,
+поэтому число меток ограничено числом методов. Запросы дольше
+DATABASE_SLOW_QUERY_THRESHOLD пишутся в лог медленных запросов без
+значений параметров. Попадания в кэш компиляции считаются в
+``db_statement_cache`` (cache="compiled"). По той же метке выбирается
+таймаут запроса (см. app.database.timeouts).
+"""
+
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Type
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.exceptions import DatabaseError
+from app.core.monitoring import (
+    db_connections,
+    db_connection_lifetime,
+    db_pool_checkout_wait,
+    db_query_duration,
+    db_slow_queries,
+    db_statement_cache,
+)
+from app.database import timeouts
+from config.settings import settings
+from config.logging import db_logger
+
+# Метка для запросов вне методов репозиториев
+OTHER_OPERATION = "other"
+
+# Внешний метод репозитория, выполняющий запросы в текущем контексте
+_operation: ContextVar[str] = ContextVar("db_operation", default=OTHER_OPERATION)
+
+# Длина текста запроса в логе медленных запросов
+_MAX_LOGGED_STATEMENT = 2000
+
+
+def current_operation() -> str:
+    """Метка метода репозитория для текущего контекста."""
+    return _operation.get()
+
+
+@contextmanager
+def operation_label(name: str) -> Iterator[None]:
+    """Метка запросов вне методов репозиториев (например, миграций)."""
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def _labelled(method):
+    """Обертка async метода репозитория: метка запросов и таймаут метода.
+
+    Вложенный вызов другого метода репозитория сохраняет метку и таймаут
+    внешнего: бюджет задается операцией, которую вызвал сервис.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if _operation.get() != OTHER_OPERATION:
+            return await method(self, *args, **kwargs)
+
+        label = f"{type(self).__name__}.{method.__name__}"
+        token = _operation.set(label)
+        try:
+            async with timeouts.cancel_after(label):
+                return await method(self, *args, **kwargs)
+        except DatabaseError as e:
+            # Репозитории оборачивают ошибки в DatabaseError: таймаут поднимается как есть
+            timeout = timeouts.find_timeout(e)
+            if timeout is not None and timeout is not e:
+                raise timeout from e
+            raise
+        finally:
+            _operation.reset(token)
+
+    wrapper.__db_operation__ = True
+    return wrapper
+
+
+def label_repository_methods(cls: Type) -> Type:
+    """Метки для всех публичных async методов класса репозитория.
+
+    Асинхронные генераторы (``iter_*``) не оборачиваются: контекст между
+    итерациями не сохраняется, их запросы попадают в метку ``other``.
+    """
+    for name, member in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(member):
+            continue
+        if getattr(member, "__db_operation__", False):
+            continue
+        setattr(cls, name, _labelled(member))
+    return cls
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> str:
+    """Параметры запроса для лога: только имена и типы, без значений."""
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(
+            f"{name}: <{type(value).__name__}>" for name, value in parameters.items()
+        ) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(f"<{type(value).__name__}>" for value in parameters) + ")"
+    return "<redacted>"
+
+
+def _report_pool(pool, pool_name: str):
+    """Текущее число выданных соединений и соединений сверх pool_size."""
+    checkedout = getattr(pool, "checkedout", None)
+    overflow = getattr(pool, "overflow", None)
+    if checkedout is not None:
+        db_connections.labels(pool=pool_name, state="checked_out").set(checkedout())
+    if overflow is not None:
+        db_connections.labels(pool=pool_name, state="overflow").set(max(overflow(), 0))
+
+
+def _report_compiled_cache(context):
+    """Попадание запроса в кэш компиляции SQLAlchemy."""
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is None:
+        return
+    if cache_hit == context.dialect.CACHE_HIT:
+        result = "hit"
+    elif cache_hit == context.dialect.CACHE_MISS:
+        result = "miss"
+    else:
+        # DDL, отключенный кэш и запросы без ключа кэша
+        result = "uncached"
+    db_statement_cache.labels(cache="compiled", result=result).inc()
+
+
+def _time_checkout(pool, pool_name: str):
+    """Замер ожидания соединения при выдаче из пула.
+
+    У пула нет события «запрошено соединение», поэтому оборачивается
+    Pool.connect, через который движок получает каждое соединение.
+    """
+    connect = pool.connect
+
+    @functools.wraps(connect)
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            db_pool_checkout_wait.labels(pool=pool_name).observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+def instrument_engine(async_engine: AsyncEngine, pool_name: str):
+    """Подключение метрик пула и запросов к движку."""
+    sync_engine = async_engine.sync_engine
+    _time_checkout(sync_engine.pool, pool_name)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        connection_record.info["connected_at"] = time.monotonic()
+        timeouts.on_connect(dbapi_connection, connection_record, sync_engine.dialect.name)
+
+    @event.listens_for(sync_engine, "close")
+    def _on_close(dbapi_connection, connection_record):
+        connected_at = connection_record.info.pop("connected_at", None)
+        if connected_at is not None:
+            db_connection_lifetime.labels(pool=pool_name).observe(time.monotonic() - connected_at)
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _report_pool(sync_engine.pool, pool_name)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        _report_pool(sync_engine.pool, pool_name)
+
+    @event.listens_for(sync_engine, "reset")
+    def _on_reset(dbapi_connection, connection_record, reset_state):
+        timeouts.on_transaction_end(connection_record.info, committed=False)
+
+    @event.listens_for(sync_engine, "commit")
+    def _on_commit(conn):
+        timeouts.on_transaction_end(conn.info, committed=True)
+
+    @event.listens_for(sync_engine, "rollback")
+    def _on_rollback(conn):
+        timeouts.on_transaction_end(conn.info, committed=False)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        timeouts.before_statement(conn, cursor, _operation.get())
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started_at"].pop()
+        timeouts.after_statement(conn)
+        operation = _operation.get()
+        db_query_duration.labels(operation=operation).observe(duration)
+        _report_compiled_cache(context)
+
+        threshold = settings.database.slow_query_threshold
+        if threshold and duration >= threshold:
+            db_slow_queries.labels(operation=operation).inc()
+            db_logger.warning(
+                f"Slow query in {operation} ({duration:.3f}s, pool {pool_name}): "
+                f"{statement[:_MAX_LOGGED_STATEMENT]} "
+                f"params={redact_parameters(parameters, executemany)}"
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(exception_context):
+        # Упавший запрос не доходит до after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started_at"):
+            conn.info["query_started_at"].pop()
+
+        timeout = timeouts.statement_error(
+            conn, exception_context.original_exception, _operation.get()
+        )
+        if timeout is not None:
+            raise timeout
@@ -36,6 +36,7 @@ class User(Base):
     referral_code = Column(String(50), unique=True, nullable=True, index=True)
     referred_by = Column(String(50), nullable=True)
     referral_count = Column(Integer, default=0, nullable=False)
+    referral_active_count = Column(Integer, default=0, server_default="0", nullable=False)
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -170,6 +171,8 @@ class Subscription(Base):
     # Статус
     is_active = Column(Boolean, default=True, nullable=False)
     is_trial = Column(Boolean, default=False, nullable=False)
+    # Подписка деактивирована блокировкой пользователя (вернется при разблокировке)
+    suspended_by_ban = Column(Boolean, default=False, server_default="0", nullable=False)
 
     # Статистика трафика
     traffic_used = Column(BigInteger, default=0, nullable=False)
@@ -313,9 +316,31 @@ class UserActivity(Base):
         return f"<UserActivity(id={self.id}, user_id={self.user_id}, type='{self.activity_type}')>"
 
 
+class StatsCounter(Base):
+    """Модель инкрементальных счетчиков статистики для админ-панели."""
+
+    __tablename__ = "stats_counters"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
+
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<StatsCounter(name='{self.name}', value={self.value})>"
+
+
 # Индексы для оптимизации запросов
 Index('idx_users_telegram_id_active', User.telegram_id, User.is_active)
+Index('idx_users_created_id', User.created_at, User.id)
+Index('idx_users_username_lower', func.lower(User.username))
+Index('idx_users_referred_by', User.referred_by)
+Index('idx_subscriptions_created_id', Subscription.created_at, Subscription.id)
 Index('idx_subscriptions_user_active', Subscription.user_id, Subscription.is_active)
 Index('idx_subscriptions_end_date', Subscription.end_date)
+Index('idx_subscriptions_active_end', Subscription.is_active, Subscription.end_date)
+Index('idx_subscriptions_server_active', Subscription.server_id, Subscription.is_active)
 Index('idx_payments_status_created', Payment.status, Payment.created_at)
+Index('idx_payments_user_id', Payment.user_id)
 Index('idx_user_activity_type_created', UserActivity.activity_type, UserActivity.created_at)
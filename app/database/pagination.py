@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) пагинация.
+
+Курсор — непрозрачная строка, кодирующая позицию последней записи
+страницы как пару ``(created_at, id)``. Следующая страница выбирается
+условием ``(created_at, id) > cursor`` по составному индексу, поэтому
+стоимость запроса не зависит от глубины страницы.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import ValidationError
+
+
+def encode_cursor(created_at: datetime, id: int, stored: str = None) -> str:
+    """Кодирование позиции записи в курсор.
+
+    ``stored`` — created_at в том виде, в котором он хранится в SQLite
+    (``stored_created_at``).
+    """
+    payload = [created_at.isoformat() if created_at else None, id]
+    if stored is not None:
+        payload.append(stored)
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> Tuple[Optional[datetime], int, Optional[str]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at, id = payload[:2]
+        stored = payload[2] if len(payload) > 2 else None
+        if stored is not None and not isinstance(stored, str):
+            raise ValueError("stored created_at must be a string")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(id), stored
+    except Exception:
+        raise ValidationError("Invalid pagination cursor", code="invalid_cursor")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Декодирование курсора в пару (created_at, id)."""
+    created_at, id, _ = _decode(cursor)
+    return created_at, id
+
+
+def keyset_position(session: AsyncSession, cursor: str) -> Tuple[Any, int]:
+    """Позиция курсора для условия ``(created_at, id) > позиция``.
+
+    SQLite хранит DateTime строкой и сравнивает строки посимвольно:
+    server_default пишет значение без микросекунд, SQLAlchemy — с
+    ``.ffffff``, и одно и то же время в двух форматах упорядочено по-разному.
+    Поэтому на SQLite граница — хранимая строка последней записи страницы
+    из курсора; для курсора без нее — формат SQLAlchemy.
+    """
+    created_at, id, stored = _decode(cursor)
+    if session.bind.dialect.name != "sqlite" or created_at is None:
+        return created_at, id
+
+    if stored is None:
+        stored = created_at.replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S.%f")
+    return type_coerce(stored, String), id
+
+
+async def stored_created_at(session: AsyncSession, model, id: int) -> Optional[str]:
+    """created_at записи в виде, в котором он хранится в SQLite (None на других БД)."""
+    if session.bind.dialect.name != "sqlite":
+        return None
+    return await session.scalar(select(type_coerce(model.created_at, String)).where(model.id == id))
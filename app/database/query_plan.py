@@ -0,0 +1,342 @@
+"""
+Проверка планов запросов репозиториев.
+
+Запросы, которые репозитории отправляют в БД, перехватываются событием
+``before_cursor_execute`` и повторяются с префиксом ``EXPLAIN QUERY PLAN``
+(SQLite) или ``EXPLAIN (FORMAT JSON)`` (PostgreSQL, с
+``enable_seqscan = off``, чтобы последовательное чтение в плане означало
+отсутствие подходящего индекса, а не малый размер тестовой таблицы).
+
+В плане отмечаются полное чтение таблицы и сортировка во временной
+структуре (TEMP B-TREE / Sort); для каждой проблемы предлагается индекс
+по колонкам из WHERE и ORDER BY запроса.
+
+Запуск по заполненной тестовыми данными БД из DATABASE_URL::
+
+    python -m app.database.query_plan
+"""
+
+import asyncio
+import json
+import re
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+FULL_SCAN = "full_scan"
+TEMP_SORT = "temp_sort"
+
+# Полное чтение таблицы в плане SQLite: "SCAN users" без индекса
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+_SQLITE_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)")
+
+_FROM_TABLE = re.compile(r"\bFROM\s+\"?(\w+)\"?", re.IGNORECASE)
+_ORDER_BY = re.compile(r"\bORDER BY\s+(.+?)(?:\s+LIMIT\b|\s+OFFSET\b|\)|$)", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass
+class PlanIssue:
+    """Проблема в плане запроса."""
+
+    kind: str
+    table: str
+    detail: str
+    statement: str
+    suggestion: Optional[str] = None
+
+    def __str__(self) -> str:
+        text = f"{self.kind} on {self.table}: {self.detail}"
+        if self.suggestion:
+            text += f" -> {self.suggestion}"
+        return text
+
+
+class QueryRecorder:
+    """Сбор SELECT запросов, выполненных через движки.
+
+    Используется как контекстный менеджер; повторяющиеся запросы
+    (одинаковый текст SQL) сохраняются один раз.
+    """
+
+    def __init__(self, engines: Sequence[AsyncEngine]):
+        self.engines = list(engines)
+        self.statements: Dict[str, Tuple[AsyncEngine, Any]] = {}
+        self._listeners = []
+
+    def __enter__(self) -> "QueryRecorder":
+        for engine in self.engines:
+            def record(conn, cursor, statement, parameters, context, executemany, engine=engine):
+                if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                    self.statements.setdefault(statement, (engine, parameters))
+
+            event.listen(engine.sync_engine, "before_cursor_execute", record)
+            self._listeners.append((engine, record))
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine, record in self._listeners:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        self._listeners = []
+
+    def clear(self):
+        """Очистка собранных запросов."""
+        self.statements = {}
+
+
+async def explain(engine: AsyncEngine, statement: str, parameters: Any) -> List[str]:
+    """План запроса в виде строк.
+
+    Для SQLite — строки EXPLAIN QUERY PLAN, для PostgreSQL — узлы плана
+    в формате ``"<Node Type> <Relation Name>"``.
+    """
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            await conn.rollback()
+            return list(_postgres_nodes(plan[0]["Plan"]))
+
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in result.all()]
+
+
+def _postgres_nodes(node: dict):
+    """Обход дерева плана PostgreSQL."""
+    relation = node.get("Relation Name")
+    yield f"{node['Node Type']} {relation}" if relation else node["Node Type"]
+    for child in node.get("Plans", []):
+        yield from _postgres_nodes(child)
+
+
+def find_issues(statement: str, plan: Sequence[str]) -> List[PlanIssue]:
+    """Полные чтения таблиц и временные сортировки в плане."""
+    issues = []
+    from_match = _FROM_TABLE.search(statement)
+    main_table = from_match.group(1) if from_match else "?"
+
+    for line in plan:
+        line = line.strip()
+
+        scan = _SQLITE_SCAN.match(line)
+        if scan is None and line.startswith("Seq Scan "):
+            scan = re.match(r"^Seq Scan (\w+)$", line)
+        if scan:
+            table = scan.group(1)
+            issues.append(PlanIssue(
+                FULL_SCAN, table, line, statement, suggest_index(statement, table, FULL_SCAN)
+            ))
+            continue
+
+        if _SQLITE_TEMP_SORT.search(line) or line in ("Sort", "Incremental Sort"):
+            issues.append(PlanIssue(
+                TEMP_SORT, main_table, line, statement, suggest_index(statement, main_table, TEMP_SORT)
+            ))
+
+    return issues
+
+
+def suggest_index(statement: str, table: str, kind: str) -> Optional[str]:
+    """Индекс, который убрал бы проблему: равенства, затем диапазоны, затем ORDER BY."""
+    equality = []
+    ranges = []
+    for column, operator in re.findall(
+        rf"\b{table}\.(\w+)\s*(=|IN\b|IS\b|>=|<=|>|<|LIKE\b)", statement, re.IGNORECASE
+    ):
+        target = equality if operator.upper() in ("=", "IN", "IS") else ranges
+        if column not in equality and column not in ranges:
+            target.append(column)
+
+    order = []
+    order_match = _ORDER_BY.search(statement)
+    if order_match:
+        order = re.findall(rf"\b{table}\.(\w+)", order_match.group(1))
+
+    if kind == TEMP_SORT:
+        columns = equality + [column for column in order if column not in equality]
+    else:
+        columns = equality + ranges[:1] + [column for column in order if column not in equality + ranges]
+
+    if not columns:
+        return None
+    return f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+async def analyze(recorder: QueryRecorder) -> List[PlanIssue]:
+    """Проблемы в планах всех собранных запросов."""
+    issues = []
+    for statement, (engine, parameters) in recorder.statements.items():
+        plan = await explain(engine, statement, parameters)
+        issues.extend(find_issues(statement, plan))
+    return issues
+
+
+@dataclass
+class PlanCheck:
+    """Проверяемый вызов репозитория и допустимые для него проблемы."""
+
+    name: str
+    call: Callable[[], Awaitable[Any]]
+    allow: Tuple[str, ...] = ()
+
+
+def repository_checks() -> List[PlanCheck]:
+    """Каталог запросов репозиториев для проверки планов.
+
+    ``allow`` — осознанные исключения: агрегаты по всей таблице для сверки
+    счетчиков, сортировка небольших наборов строк (подписки одного
+    пользователя, дни окна новых пользователей, истекшие, но еще не
+    деактивированные подписки).
+    """
+    from app.database.models import Payment, Subscription
+    from app.database.repositories.base import BaseRepository
+    from app.database.repositories.user_repository import UserRepository
+    from app.database.repositories.subscription_repository import SubscriptionRepository
+    from app.database.repositories.stats_repository import StatsRepository, USERS_TOTAL
+
+    users = UserRepository()
+    subscriptions = SubscriptionRepository()
+    payments = BaseRepository(Payment)
+    stats = StatsRepository()
+    since = date.today() - timedelta(days=30)
+
+    async def iterate(chunks):
+        async for _ in chunks:
+            pass
+
+    async def second_page():
+        _, cursor = await users.get_page(limit=1, filters={"is_active": True, "is_banned": False})
+        await users.get_page(limit=1, cursor=cursor, filters={"is_active": True, "is_banned": False})
+
+    return [
+        PlanCheck("users.get_by_id", lambda: users.get_by_id(1)),
+        PlanCheck("users.get_by_telegram_id", lambda: users.get_by_telegram_id(1000001)),
+        PlanCheck("users.get_by_referral_code", lambda: users.get_by_field("referral_code", "REF1")),
+        PlanCheck(
+            "users.get_all_by_created_at",
+            lambda: users.get_all(order_by="created_at", filters={"is_active": True, "is_banned": False}),
+        ),
+        PlanCheck("users.get_page", second_page),
+        PlanCheck("users.search_telegram_id", lambda: users.search_users("1000001")),
+        PlanCheck("users.search_username", lambda: users.search_users("@user1")),
+        PlanCheck("users.search_text", lambda: users.search_users("user")),
+        PlanCheck("users.get_with_subscriptions", lambda: users.get_with_subscriptions(1)),
+        PlanCheck("users.get_profile", lambda: users.get_profile(1000001)),
+        PlanCheck("users.get_referral_stats", lambda: users.get_referral_stats("REF1")),
+        PlanCheck("users.count_referral_stats", lambda: users.count_referral_stats("REF1")),
+        PlanCheck(
+            "users.count_created_by_day", lambda: users.count_created_by_day(since), allow=(TEMP_SORT,)
+        ),
+        PlanCheck("users.count_users_stats", users.count_users_stats, allow=(FULL_SCAN,)),
+        PlanCheck(
+            "subscriptions.get_user_subscriptions",
+            lambda: subscriptions.get_user_subscriptions(1),
+            allow=(TEMP_SORT,),
+        ),
+        PlanCheck("subscriptions.get_active_subscription", lambda: subscriptions.get_active_subscription(1)),
+        PlanCheck("subscriptions.get_expiring", lambda: subscriptions.get_expiring_subscriptions()),
+        PlanCheck(
+            "subscriptions.iter_expired",
+            lambda: iterate(subscriptions.iter_expired_subscriptions()),
+            allow=(TEMP_SORT,),
+        ),
+        PlanCheck("subscriptions.get_next_expirations", lambda: subscriptions.get_next_expirations(10)),
+        PlanCheck(
+            "subscriptions.by_server",
+            lambda: BaseRepository(Subscription).get_all(filters={"server_id": 1, "is_active": True}),
+        ),
+        PlanCheck("subscriptions.get_stats", subscriptions.get_subscriptions_stats),
+        PlanCheck(
+            "subscriptions.count_stats", subscriptions.count_subscriptions_stats, allow=(FULL_SCAN,)
+        ),
+        PlanCheck("payments.by_user", lambda: payments.get_all(filters={"user_id": 1})),
+        PlanCheck("stats.get_counters", lambda: stats.get_counters([USERS_TOTAL])),
+        PlanCheck("stats.get_users_created_since", lambda: stats.get_users_created_since(since)),
+    ]
+
+
+async def seed_database(rows: int = 50):
+    """Минимальные тестовые данные, если таблица users пуста."""
+    from app.database.models import Payment, Server, Subscription, Tariff
+    from app.database.repositories.base import BaseRepository
+    from app.database.repositories.user_repository import UserRepository
+    from app.services.stats_service import StatsService
+
+    users = UserRepository()
+    if await users.count():
+        return
+
+    now = datetime.utcnow()
+    await users.create_many([
+        {
+            "telegram_id": 1000000 + i,
+            "username": f"user{i}",
+            "first_name": f"User {i}",
+            "referral_code": f"REF{i}",
+            "referred_by": f"REF{i % 5}" if i > 5 else None,
+        }
+        for i in range(1, rows + 1)
+    ])
+    await BaseRepository(Server).create(
+        name="seed", host="127.0.0.1", port=443, xui_url="https://127.0.0.1",
+        xui_username="admin", xui_password="secret", xui_secret_path="panel",
+    )
+    await BaseRepository(Tariff).create(name="seed", duration_days=30, price=100, server_id=1)
+    await BaseRepository(Subscription).create_many([
+        {
+            "user_id": i,
+            "server_id": 1,
+            "tariff_id": 1,
+            "end_date": now + timedelta(hours=i - rows // 2),
+        }
+        for i in range(1, rows + 1)
+    ])
+    await BaseRepository(Payment).create_many([
+        {"user_id": i, "amount": 100, "payment_method": "code", "status": "paid"}
+        for i in range(1, rows + 1)
+    ])
+
+    # Счетчики статистики, чтобы проверялись запросы без пересчета по таблицам
+    await StatsService().reconcile()
+
+
+async def check_repository_plans(engines: Sequence[AsyncEngine]) -> Dict[str, List[PlanIssue]]:
+    """Проблемы планов по каталогу запросов, кроме разрешенных."""
+    report = {}
+    for check in repository_checks():
+        with QueryRecorder(engines) as recorder:
+            await check.call()
+        issues = [issue for issue in await analyze(recorder) if issue.kind not in check.allow]
+        if issues:
+            report[check.name] = issues
+    return report
+
+
+async def main() -> int:
+    """Проверка планов по БД из DATABASE_URL."""
+    from app.database import connection
+    from app.database.routing import replica_router
+
+    await connection.init_database()
+    try:
+        await seed_database()
+        engines = [connection.engine] + [replica.engine for replica in replica_router.replicas]
+        report = await check_repository_plans(engines)
+    finally:
+        await connection.close_database()
+
+    for name, issues in report.items():
+        print(name)
+        for issue in issues:
+            print(f"  {issue}")
+    return 1 if report else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -2,25 +2,103 @@
 Базовый репозиторий для работы с данными.
 """
 
-from typing import Generic, TypeVar, Type, List, Optional, Dict, Any
-from sqlalchemy import select, update, delete, func
+from typing import Generic, TypeVar, Type, List, Optional, Dict, Any, AsyncIterator, Iterator, Sequence, Tuple
+from sqlalchemy import select, insert, update, delete, bindparam, func, tuple_, case, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.database.connection import get_db_session
+from app.database.connection import get_db_session, get_read_session
 from app.database.models import Base
-from app.core.exceptions import DatabaseError
+from app.database.pagination import encode_cursor, keyset_position, stored_created_at
+from app.database.views import view_columns
+from app.database.instrumentation import label_repository_methods
+from app.database.statements import cached_statement
+from app.core.exceptions import DatabaseError, ValidationError
+from config.settings import settings
 from config.logging import db_logger
 
 ModelType = TypeVar("ModelType", bound=Base)
 
 
+def _supports_update_returning(session: AsyncSession) -> bool:
+    """Поддерживает ли диалект сессии UPDATE ... RETURNING."""
+    return session.bind.dialect.update_returning
+
+
+async def _update_returning_ids(session: AsyncSession, model: Type, condition, **values) -> List[int]:
+    """UPDATE по условию с возвратом id измененных строк.
+
+    На диалектах без UPDATE ... RETURNING id выбираются заранее в той же
+    транзакции.
+    """
+    if _supports_update_returning(session):
+        result = await session.execute(
+            update(model).where(condition).values(**values).returning(model.id)
+        )
+        return list(result.scalars().all())
+
+    result = await session.execute(select(model.id).where(condition))
+    ids = list(result.scalars().all())
+    if ids:
+        await session.execute(update(model).where(model.id.in_(ids)).values(**values))
+    return ids
+
+
+async def _delete_returning_ids(session: AsyncSession, model: Type, condition) -> List[int]:
+    """DELETE по условию с возвратом id удаленных строк."""
+    if session.bind.dialect.delete_returning:
+        result = await session.execute(delete(model).where(condition).returning(model.id))
+        return list(result.scalars().all())
+
+    result = await session.execute(select(model.id).where(condition))
+    ids = list(result.scalars().all())
+    if ids:
+        await session.execute(delete(model).where(model.id.in_(ids)))
+    return ids
+
+
+def _dialect_insert(session: AsyncSession):
+    """INSERT с поддержкой ON CONFLICT для диалекта сессии."""
+    dialect_name = session.bind.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise DatabaseError(f"Upsert is not supported for dialect {dialect_name}")
+
+
+def _chunks(rows: Sequence[Dict[str, Any]], size: int) -> Iterator[Sequence[Dict[str, Any]]]:
+    """Разбиение списка строк на пачки."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
 class BaseRepository(Generic[ModelType]):
     """Базовый репозиторий для CRUD операций."""
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Метка метода репозитория для метрик запросов
+        label_repository_methods(cls)
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
+    def _select(self, view: Type = None):
+        """SELECT сущностей или только колонок представления."""
+        if view is None:
+            return select(self.model)
+        return select(*view_columns(self.model, view))
+
+    @staticmethod
+    def _rows(result, view: Type = None) -> list:
+        """Сущности или экземпляры представления из результата."""
+        if view is None:
+            return result.scalars().all()
+        return [view(*row) for row in result.all()]
+
     async def create(self, **kwargs) -> ModelType:
         """Создание новой записи."""
         try:
@@ -34,10 +112,92 @@ class BaseRepository(Generic[ModelType]):
             db_logger.error(f"Failed to create {self.model.__name__}: {e}")
             raise DatabaseError(f"Create operation failed: {e}")
 
+    async def create_many(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: int = None
+    ) -> int:
+        """Массовое создание записей (executemany пачками)."""
+        if not rows:
+            return 0
+
+        chunk_size = chunk_size or settings.database.bulk_chunk_size
+        try:
+            async with get_db_session() as session:
+                for chunk in _chunks(rows, chunk_size):
+                    await session.execute(insert(self.model), list(chunk))
+                return len(rows)
+        except Exception as e:
+            db_logger.error(f"Failed to bulk create {self.model.__name__}: {e}")
+            raise DatabaseError(f"Bulk create operation failed: {e}")
+
+    async def update_many(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: int = None
+    ) -> int:
+        """Массовое обновление записей по первичному ключу.
+
+        Каждая строка содержит ``id`` и новые значения полей; строки
+        отправляются пачками через executemany.
+        """
+        if not rows:
+            return 0
+
+        chunk_size = chunk_size or settings.database.bulk_chunk_size
+        try:
+            async with get_db_session() as session:
+                for chunk in _chunks(rows, chunk_size):
+                    await session.execute(update(self.model), list(chunk))
+                return len(rows)
+        except Exception as e:
+            db_logger.error(f"Failed to bulk update {self.model.__name__}: {e}")
+            raise DatabaseError(f"Bulk update operation failed: {e}")
+
+    async def upsert_many(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        index_elements: Sequence[str],
+        update_fields: Sequence[str] = None,
+        chunk_size: int = None
+    ) -> int:
+        """Массовый INSERT ... ON CONFLICT для SQLite и PostgreSQL.
+
+        При конфликте по ``index_elements`` обновляются ``update_fields``
+        (по умолчанию все переданные поля, кроме ключевых); пустой список
+        означает ON CONFLICT DO NOTHING.
+        """
+        if not rows:
+            return 0
+
+        if update_fields is None:
+            update_fields = [key for key in rows[0] if key not in index_elements]
+
+        chunk_size = chunk_size or settings.database.bulk_chunk_size
+        try:
+            async with get_db_session() as session:
+                stmt = _dialect_insert(session)(self.model)
+                if update_fields:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=list(index_elements),
+                        set_={field: stmt.excluded[field] for field in update_fields},
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+
+                for chunk in _chunks(rows, chunk_size):
+                    await session.execute(stmt, list(chunk))
+                return len(rows)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            db_logger.error(f"Failed to bulk upsert {self.model.__name__}: {e}")
+            raise DatabaseError(f"Bulk upsert operation failed: {e}")
+
     async def get_by_id(self, id: int) -> Optional[ModelType]:
         """Получение записи по ID."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 result = await session.get(self.model, id)
                 return result
         except Exception as e:
@@ -47,9 +207,12 @@ class BaseRepository(Generic[ModelType]):
     async def get_by_field(self, field_name: str, value: Any) -> Optional[ModelType]:
         """Получение записи по полю."""
         try:
-            async with get_db_session() as session:
-                stmt = select(self.model).where(getattr(self.model, field_name) == value)
-                result = await session.execute(stmt)
+            stmt = cached_statement(
+                (self.model, "by_field", field_name),
+                lambda: select(self.model).where(getattr(self.model, field_name) == bindparam("value")),
+            )
+            async with get_read_session() as session:
+                result = await session.execute(stmt, {"value": value})
                 return result.scalar_one_or_none()
         except Exception as e:
             db_logger.error(f"Failed to get {self.model.__name__} by {field_name}: {e}")
@@ -60,12 +223,61 @@ class BaseRepository(Generic[ModelType]):
         limit: int = 100, 
         offset: int = 0,
         order_by: str = "id",
-        filters: Dict[str, Any] = None
+        filters: Dict[str, Any] = None,
+        view: Type = None
     ) -> List[ModelType]:
-        """Получение всех записей с фильтрацией и пагинацией."""
+        """Получение всех записей с фильтрацией и пагинацией.
+
+        С ``view`` выбираются только колонки представления, результат —
+        список его экземпляров вместо ORM сущностей.
+        """
         try:
-            async with get_db_session() as session:
-                stmt = select(self.model)
+            # Фильтры по существующим полям; форма запроса зависит только
+            # от их имен, значения передаются параметрами
+            filters = {
+                field: value for field, value in (filters or {}).items()
+                if hasattr(self.model, field)
+            }
+            if not hasattr(self.model, order_by):
+                order_by = None
+
+            def build():
+                stmt = self._select(view)
+                for field in sorted(filters):
+                    stmt = stmt.where(getattr(self.model, field) == bindparam(f"filter_{field}"))
+                if order_by:
+                    stmt = stmt.order_by(getattr(self.model, order_by))
+                return stmt.limit(bindparam("limit")).offset(bindparam("offset"))
+
+            stmt = cached_statement((self.model, "all", view, tuple(sorted(filters)), order_by), build)
+            params = {f"filter_{field}": value for field, value in filters.items()}
+            params.update(limit=limit, offset=offset)
+
+            async with get_read_session() as session:
+                result = await session.execute(stmt, params)
+                return self._rows(result, view)
+        except Exception as e:
+            db_logger.error(f"Failed to get all {self.model.__name__}: {e}")
+            raise DatabaseError(f"Get all operation failed: {e}")
+
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: str = None,
+        filters: Dict[str, Any] = None,
+        view: Type = None,
+        offset: int = 0
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """Keyset пагинация по (created_at, id).
+
+        Возвращает записи страницы и курсор следующей страницы
+        (``None``, если страница последняя). Без ``cursor`` страница
+        может начинаться с ``offset`` — для клиентов пагинации через
+        OFFSET. ``view`` — как в get_all.
+        """
+        try:
+            async with get_read_session() as session:
+                stmt = self._select(view)
 
                 # Применяем фильтры
                 if filters:
@@ -73,24 +285,104 @@ class BaseRepository(Generic[ModelType]):
                         if hasattr(self.model, field):
                             stmt = stmt.where(getattr(self.model, field) == value)
 
-                # Сортировка
-                if hasattr(self.model, order_by):
-                    stmt = stmt.order_by(getattr(self.model, order_by))
+                if cursor:
+                    created_at, last_id = keyset_position(session, cursor)
+                    stmt = stmt.where(
+                        tuple_(self.model.created_at, self.model.id) > tuple_(created_at, last_id)
+                    )
+                elif offset:
+                    stmt = stmt.offset(offset)
 
-                # Пагинация
-                stmt = stmt.limit(limit).offset(offset)
+                # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+                stmt = stmt.order_by(self.model.created_at, self.model.id).limit(limit + 1)
 
                 result = await session.execute(stmt)
-                return result.scalars().all()
+                items = self._rows(result, view)
+
+                next_cursor = None
+                if len(items) > limit:
+                    items = items[:limit]
+                    last = items[-1]
+                    next_cursor = encode_cursor(
+                        last.created_at,
+                        last.id,
+                        await stored_created_at(session, self.model, last.id),
+                    )
+
+                return items, next_cursor
+        except ValidationError:
+            raise
         except Exception as e:
-            db_logger.error(f"Failed to get all {self.model.__name__}: {e}")
-            raise DatabaseError(f"Get all operation failed: {e}")
+            db_logger.error(f"Failed to get page of {self.model.__name__}: {e}")
+            raise DatabaseError(f"Get page operation failed: {e}")
+
+    async def iter_chunks(
+        self,
+        columns: Sequence[Any],
+        where: Any = None,
+        join: Any = None,
+        chunk_size: int = None
+    ) -> AsyncIterator[List[Row]]:
+        """Потоковая выборка колонок пачками по ``chunk_size`` строк.
+
+        На PostgreSQL строки читаются серверным курсором (``yield_per``),
+        на остальных диалектах — keyset пачками по id, каждая в своей
+        короткой сессии. Память не зависит от числа строк. Колонка id
+        добавляется в выборку первой, если ее нет в ``columns``.
+        """
+        chunk_size = chunk_size or settings.database.bulk_chunk_size
+        columns = [self.model.id] + [c for c in columns if c is not self.model.id]
+
+        stmt = select(*columns)
+        if join is not None:
+            stmt = stmt.join(join)
+        if where is not None:
+            stmt = stmt.where(where)
+
+        last_id = None
+        try:
+            while True:
+                async with get_read_session() as session:
+                    if session.bind.dialect.name == "postgresql":
+                        result = await session.stream(
+                            stmt.execution_options(yield_per=chunk_size)
+                        )
+                        async for rows in result.partitions():
+                            yield rows
+                        return
+
+                    batch = stmt.order_by(self.model.id).limit(chunk_size)
+                    if last_id is not None:
+                        batch = batch.where(self.model.id > last_id)
+                    rows = (await session.execute(batch)).all()
+
+                # Сессия закрыта до передачи пачки вызывающему коду
+                if rows:
+                    yield rows
+                if len(rows) < chunk_size:
+                    return
+                last_id = rows[-1].id
+        except Exception as e:
+            db_logger.error(f"Failed to iterate {self.model.__name__}: {e}")
+            raise DatabaseError(f"Iterate operation failed: {e}")
 
     async def update(self, id: int, **kwargs) -> Optional[ModelType]:
-        """Обновление записи."""
+        """Обновление записи с возвратом обновленной строки.
+
+        На PostgreSQL и SQLite >= 3.35 выполняется одним запросом
+        UPDATE ... RETURNING, на остальных — UPDATE + SELECT.
+        """
         try:
             async with get_db_session() as session:
                 stmt = update(self.model).where(self.model.id == id).values(**kwargs)
+
+                if _supports_update_returning(session):
+                    result = await session.execute(
+                        stmt.returning(self.model),
+                        execution_options={"populate_existing": True},
+                    )
+                    return result.scalar_one_or_none()
+
                 await session.execute(stmt)
 
                 # Получаем обновленную запись
@@ -100,6 +392,42 @@ class BaseRepository(Generic[ModelType]):
             db_logger.error(f"Failed to update {self.model.__name__} with id {id}: {e}")
             raise DatabaseError(f"Update operation failed: {e}")
 
+    async def update_values(self, id: int, **kwargs) -> int:
+        """Обновление записи без чтения строки.
+
+        Для вызывающих, которым достаточно факта обновления: один UPDATE,
+        возвращает количество затронутых строк.
+        """
+        try:
+            async with get_db_session() as session:
+                stmt = update(self.model).where(self.model.id == id).values(**kwargs)
+                result = await session.execute(stmt)
+                return result.rowcount
+        except Exception as e:
+            db_logger.error(f"Failed to update {self.model.__name__} with id {id}: {e}")
+            raise DatabaseError(f"Update operation failed: {e}")
+
+    async def update_changed(self, id: int, **kwargs) -> int:
+        """Обновление записи, только если значение хотя бы одного поля отличается.
+
+        Возвращает количество фактически измененных строк: 0 означает, что
+        записи нет или она уже в нужном состоянии. Используется там, где от
+        перехода состояния зависят счетчики статистики.
+        """
+        try:
+            async with get_db_session() as session:
+                stmt = (
+                    update(self.model)
+                    .where(self.model.id == id)
+                    .where(or_(*[getattr(self.model, field) != value for field, value in kwargs.items()]))
+                    .values(**kwargs)
+                )
+                result = await session.execute(stmt)
+                return result.rowcount
+        except Exception as e:
+            db_logger.error(f"Failed to update {self.model.__name__} with id {id}: {e}")
+            raise DatabaseError(f"Update operation failed: {e}")
+
     async def delete(self, id: int) -> bool:
         """Удаление записи."""
         try:
@@ -114,7 +442,7 @@ class BaseRepository(Generic[ModelType]):
     async def count(self, filters: Dict[str, Any] = None) -> int:
         """Подсчет количества записей."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 stmt = select(func.count(self.model.id))
 
                 # Применяем фильтры
@@ -129,10 +457,44 @@ class BaseRepository(Generic[ModelType]):
             db_logger.error(f"Failed to count {self.model.__name__}: {e}")
             raise DatabaseError(f"Count operation failed: {e}")
 
+    async def aggregate_counts(
+        self,
+        conditions: Dict[str, Any],
+        where: Any = None
+    ) -> Dict[str, int]:
+        """Несколько счетчиков за один проход по таблице.
+
+        ``conditions`` — словарь ``{имя метрики: условие}``; условие ``None``
+        означает общее количество записей. Каждая метрика считается как
+        ``COUNT(CASE WHEN условие THEN 1 END)`` в одном SELECT, поэтому новая
+        метрика добавляет колонку, а не запрос. ``where`` ограничивает
+        набор строк для всех метрик сразу.
+        """
+        try:
+            async with get_read_session() as session:
+                columns = [
+                    (
+                        func.count(self.model.id)
+                        if condition is None
+                        else func.count(case((condition, 1)))
+                    ).label(name)
+                    for name, condition in conditions.items()
+                ]
+                stmt = select(*columns).select_from(self.model)
+                if where is not None:
+                    stmt = stmt.where(where)
+
+                result = await session.execute(stmt)
+                row = result.one()
+                return {name: row._mapping[name] or 0 for name in conditions}
+        except Exception as e:
+            db_logger.error(f"Failed to aggregate {self.model.__name__}: {e}")
+            raise DatabaseError(f"Aggregate operation failed: {e}")
+
     async def exists(self, **kwargs) -> bool:
         """Проверка существования записи."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 stmt = select(self.model)
 
                 for field, value in kwargs.items():
@@ -145,3 +507,6 @@ class BaseRepository(Generic[ModelType]):
         except Exception as e:
             db_logger.error(f"Failed to check existence for {self.model.__name__}: {e}")
             raise DatabaseError(f"Exists operation failed: {e}")
+
+
+label_repository_methods(BaseRepository)
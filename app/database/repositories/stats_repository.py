@@ -0,0 +1,137 @@
+"""
+Репозиторий инкрементальных счетчиков статистики.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable
+
+from sqlalchemy import select, delete, func, and_
+
+from app.database.models import StatsCounter
+from app.database.repositories.base import BaseRepository, _dialect_insert
+from app.database.connection import get_db_session, get_read_session
+from app.core.exceptions import DatabaseError
+from config.logging import db_logger
+
+# Имена счетчиков
+USERS_TOTAL = "users.total"
+USERS_ACTIVE = "users.active"
+USERS_BANNED = "users.banned"
+USERS_TRIAL_USED = "users.trial_used"
+USERS_CREATED_PREFIX = "users.created:"
+SUBSCRIPTIONS_TOTAL = "subscriptions.total"
+SUBSCRIPTIONS_TRIAL = "subscriptions.trial"
+SUBSCRIPTIONS_ACTIVE_FLAG = "subscriptions.active_flag"
+PAYMENTS_TOTAL = "payments.total"
+
+
+def users_created_counter(day: date) -> str:
+    """Имя дневного счетчика новых пользователей."""
+    return f"{USERS_CREATED_PREFIX}{day.isoformat()}"
+
+
+def new_users_window_start(days: int = 30) -> date:
+    """Первый день окна «новых пользователей» для дневных счетчиков."""
+    return datetime.utcnow().date() - timedelta(days=days)
+
+
+class StatsRepository(BaseRepository[StatsCounter]):
+    """Репозиторий для работы со счетчиками статистики.
+
+    Счетчики изменяются в той же транзакции, что и исходная запись
+    (репозитории вызывают increment внутри unit_of_work), поэтому чтение
+    статистики — это выборка нескольких строк по первичному ключу.
+    """
+
+    def __init__(self):
+        super().__init__(StatsCounter)
+
+    async def increment(self, deltas: Dict[str, int]):
+        """Атомарное изменение счетчиков на заданные величины."""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        try:
+            async with get_db_session() as session:
+                stmt = _dialect_insert(session)(StatsCounter)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["name"],
+                    set_={
+                        "value": StatsCounter.value + stmt.excluded.value,
+                        "updated_at": func.now(),
+                    },
+                )
+                await session.execute(
+                    stmt,
+                    [{"name": name, "value": delta} for name, delta in deltas.items()],
+                )
+        except Exception as e:
+            db_logger.error(f"Failed to increment stats counters {list(deltas)}: {e}")
+            raise DatabaseError(f"Increment stats counters failed: {e}")
+
+    async def get_counters(self, names: Iterable[str]) -> Dict[str, int]:
+        """Значения счетчиков по именам (отсутствующие не попадают в результат)."""
+        try:
+            async with get_read_session() as session:
+                result = await session.execute(
+                    select(StatsCounter.name, StatsCounter.value)
+                    .where(StatsCounter.name.in_(list(names)))
+                )
+                return {name: value for name, value in result.all()}
+        except Exception as e:
+            db_logger.error(f"Failed to get stats counters: {e}")
+            raise DatabaseError(f"Get stats counters failed: {e}")
+
+    async def get_users_created_since(self, since: date) -> int:
+        """Сумма дневных счетчиков новых пользователей начиная с даты."""
+        try:
+            async with get_read_session() as session:
+                result = await session.execute(
+                    select(func.coalesce(func.sum(StatsCounter.value), 0)).where(
+                        and_(
+                            StatsCounter.name >= users_created_counter(since),
+                            StatsCounter.name.like(f"{USERS_CREATED_PREFIX}%"),
+                        )
+                    )
+                )
+                return result.scalar()
+        except Exception as e:
+            db_logger.error(f"Failed to sum daily users counters: {e}")
+            raise DatabaseError(f"Get daily users counters failed: {e}")
+
+    async def lock_counters(self, names: Iterable[str]) -> Dict[str, int]:
+        """Значения счетчиков с блокировкой строк до конца транзакции.
+
+        Используется при сверке: increment других транзакций ждет ее
+        завершения, поэтому пересчет не теряет их изменения.
+        """
+        try:
+            async with get_db_session() as session:
+                result = await session.execute(
+                    select(StatsCounter.name, StatsCounter.value)
+                    .where(StatsCounter.name.in_(list(names)))
+                    .order_by(StatsCounter.name)
+                    .with_for_update()
+                )
+                return {name: value for name, value in result.all()}
+        except Exception as e:
+            db_logger.error(f"Failed to lock stats counters: {e}")
+            raise DatabaseError(f"Lock stats counters failed: {e}")
+
+    async def prune_daily_counters(self, keep_since: date) -> int:
+        """Удаление дневных счетчиков старше заданной даты."""
+        try:
+            async with get_db_session() as session:
+                result = await session.execute(
+                    delete(StatsCounter).where(
+                        and_(
+                            StatsCounter.name.like(f"{USERS_CREATED_PREFIX}%"),
+                            StatsCounter.name < users_created_counter(keep_since),
+                        )
+                    )
+                )
+                return result.rowcount
+        except Exception as e:
+            db_logger.error(f"Failed to prune daily stats counters: {e}")
+            raise DatabaseError(f"Prune daily stats counters failed: {e}")
@@ -2,23 +2,47 @@
 Репозиторий для работы с подписками.
 """
 
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, bindparam, func, and_, or_
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import selectinload
 
 from app.database.models import Subscription, User, Server, Tariff
-from app.database.repositories.base import BaseRepository
-from app.database.connection import get_db_session
+from app.database.repositories.base import BaseRepository, _chunks, _update_returning_ids
+from app.database.repositories.stats_repository import (
+    StatsRepository,
+    SUBSCRIPTIONS_TOTAL,
+    SUBSCRIPTIONS_TRIAL,
+    SUBSCRIPTIONS_ACTIVE_FLAG,
+)
+from app.database.connection import get_read_session, unit_of_work
+from app.database.statements import cached_statement
 from app.core.exceptions import DatabaseError
+from config.settings import settings
 from config.logging import db_logger
 
 
+# Колонки, достаточные для обработки истекающих/истекших подписок
+# (уведомление пользователя, отключение клиента на сервере)
+SWEEP_COLUMNS = (
+    Subscription.id,
+    Subscription.user_id,
+    Subscription.server_id,
+    Subscription.tariff_id,
+    Subscription.client_id,
+    Subscription.is_trial,
+    Subscription.end_date,
+    User.telegram_id,
+)
+
+
 class SubscriptionRepository(BaseRepository[Subscription]):
     """Репозиторий для работы с подписками."""
 
     def __init__(self):
         super().__init__(Subscription)
+        self.stats = StatsRepository()
 
     async def create_subscription(
         self,
@@ -35,16 +59,24 @@ class SubscriptionRepository(BaseRepository[Subscription]):
             start_date = datetime.utcnow()
             end_date = start_date + timedelta(days=duration_days)
 
-            return await self.create(
-                user_id=user_id,
-                server_id=server_id,
-                tariff_id=tariff_id,
-                start_date=start_date,
-                end_date=end_date,
-                is_trial=is_trial,
-                vless_config=vless_config,
-                client_id=client_id
-            )
+            async with unit_of_work():
+                subscription = await self.create(
+                    user_id=user_id,
+                    server_id=server_id,
+                    tariff_id=tariff_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    is_trial=is_trial,
+                    vless_config=vless_config,
+                    client_id=client_id
+                )
+
+                await self.stats.increment({
+                    SUBSCRIPTIONS_TOTAL: 1,
+                    SUBSCRIPTIONS_TRIAL: int(is_trial),
+                    SUBSCRIPTIONS_ACTIVE_FLAG: 1,
+                })
+                return subscription
         except Exception as e:
             db_logger.error(f"Failed to create subscription: {e}")
             raise DatabaseError(f"Create subscription failed: {e}")
@@ -56,7 +88,7 @@ class SubscriptionRepository(BaseRepository[Subscription]):
     ) -> List[Subscription]:
         """Получение подписок пользователя."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 stmt = (
                     select(Subscription)
                     .options(
@@ -80,8 +112,9 @@ class SubscriptionRepository(BaseRepository[Subscription]):
     async def get_active_subscription(self, user_id: int) -> Optional[Subscription]:
         """Получение активной подписки пользователя."""
         try:
-            async with get_db_session() as session:
-                stmt = (
+            stmt = cached_statement(
+                "subscriptions.active",
+                lambda: (
                     select(Subscription)
                     .options(
                         selectinload(Subscription.server),
@@ -89,16 +122,18 @@ class SubscriptionRepository(BaseRepository[Subscription]):
                     )
                     .where(
                         and_(
-                            Subscription.user_id == user_id,
+                            Subscription.user_id == bindparam("user_id"),
                             Subscription.is_active == True,
-                            Subscription.end_date > datetime.utcnow()
+                            Subscription.end_date > bindparam("now")
                         )
                     )
                     .order_by(Subscription.end_date.desc())
                     .limit(1)
-                )
+                ),
+            )
 
-                result = await session.execute(stmt)
+            async with get_read_session() as session:
+                result = await session.execute(stmt, {"user_id": user_id, "now": datetime.utcnow()})
                 return result.scalar_one_or_none()
         except Exception as e:
             db_logger.error(f"Failed to get active subscription for user {user_id}: {e}")
@@ -110,7 +145,7 @@ class SubscriptionRepository(BaseRepository[Subscription]):
     ) -> List[Subscription]:
         """Получение подписок, которые скоро истекут."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 expiry_threshold = datetime.utcnow() + timedelta(hours=hours_before)
 
                 stmt = (
@@ -138,7 +173,7 @@ class SubscriptionRepository(BaseRepository[Subscription]):
     async def get_expired_subscriptions(self) -> List[Subscription]:
         """Получение истекших подписок."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 stmt = (
                     select(Subscription)
                     .options(
@@ -159,15 +194,164 @@ class SubscriptionRepository(BaseRepository[Subscription]):
             db_logger.error(f"Failed to get expired subscriptions: {e}")
             raise DatabaseError(f"Get expired subscriptions failed: {e}")
 
+    def iter_expiring_subscriptions(
+        self,
+        hours_before: int = 24,
+        chunk_size: int = None
+    ) -> AsyncIterator[List[Row]]:
+        """Пачки строк SWEEP_COLUMNS для подписок, которые скоро истекут."""
+        now = datetime.utcnow()
+        return self.iter_chunks(
+            SWEEP_COLUMNS,
+            where=and_(
+                Subscription.is_active == True,
+                Subscription.end_date <= now + timedelta(hours=hours_before),
+                Subscription.end_date > now
+            ),
+            join=Subscription.user,
+            chunk_size=chunk_size,
+        )
+
+    def iter_expired_subscriptions(self, chunk_size: int = None) -> AsyncIterator[List[Row]]:
+        """Пачки строк SWEEP_COLUMNS для истекших, но активных подписок."""
+        return self.iter_chunks(
+            SWEEP_COLUMNS,
+            where=and_(
+                Subscription.is_active == True,
+                Subscription.end_date <= datetime.utcnow()
+            ),
+            join=Subscription.user,
+            chunk_size=chunk_size,
+        )
+
     async def deactivate_subscription(self, subscription_id: int) -> bool:
         """Деактивация подписки."""
         try:
-            updated = await self.update(subscription_id, is_active=False)
-            return updated is not None
+            async with unit_of_work():
+                if not await self.update_changed(subscription_id, is_active=False):
+                    # Подписка уже неактивна или не существует
+                    return await self.exists(id=subscription_id)
+
+                await self.stats.increment({SUBSCRIPTIONS_ACTIVE_FLAG: -1})
+                return True
         except Exception as e:
             db_logger.error(f"Failed to deactivate subscription {subscription_id}: {e}")
             return False
 
+    async def get_next_expirations(self, limit: int) -> List[Tuple[datetime, int]]:
+        """Ближайшие сроки окончания активных подписок ``(end_date, id)``.
+
+        Читается по индексу idx_subscriptions_active_end без сортировки.
+        """
+        try:
+            async with get_read_session() as session:
+                stmt = (
+                    select(Subscription.end_date, Subscription.id)
+                    .where(Subscription.is_active == True)
+                    .order_by(Subscription.end_date, Subscription.id)
+                    .limit(limit)
+                )
+                result = await session.execute(stmt)
+                return [(end_date, id) for end_date, id in result.all()]
+        except Exception as e:
+            db_logger.error(f"Failed to get next subscription expirations: {e}")
+            raise DatabaseError(f"Get next expirations failed: {e}")
+
+    async def get_owner_telegram_ids(self, subscription_ids: Sequence[int]) -> List[int]:
+        """telegram_id владельцев подписок из списка (для сброса кэша профилей)."""
+        if not subscription_ids:
+            return []
+
+        try:
+            owners = set()
+            async with get_read_session() as session:
+                for chunk in _chunks(list(subscription_ids), settings.database.bulk_chunk_size):
+                    result = await session.execute(
+                        select(User.telegram_id)
+                        .join(Subscription, Subscription.user_id == User.id)
+                        .where(Subscription.id.in_(chunk))
+                    )
+                    owners.update(result.scalars().all())
+            return list(owners)
+        except Exception as e:
+            db_logger.error(f"Failed to get owners of {len(subscription_ids)} subscriptions: {e}")
+            raise DatabaseError(f"Get subscription owners failed: {e}")
+
+    async def deactivate_expired(self, subscription_ids: Sequence[int]) -> List[int]:
+        """Массовая деактивация истекших подписок из списка.
+
+        Подписки, которые уже неактивны или были продлены, не
+        затрагиваются. Возвращает id фактически деактивированных подписок.
+        """
+        if not subscription_ids:
+            return []
+
+        try:
+            now = datetime.utcnow()
+            deactivated = []
+
+            async with unit_of_work() as session:
+                for chunk in _chunks(list(subscription_ids), settings.database.bulk_chunk_size):
+                    condition = and_(
+                        Subscription.id.in_(chunk),
+                        Subscription.is_active == True,
+                        Subscription.end_date <= now
+                    )
+
+                    deactivated.extend(
+                        await _update_returning_ids(session, Subscription, condition, is_active=False)
+                    )
+
+                await self.stats.increment({SUBSCRIPTIONS_ACTIVE_FLAG: -len(deactivated)})
+
+            return deactivated
+        except Exception as e:
+            db_logger.error(f"Failed to deactivate expired subscriptions: {e}")
+            raise DatabaseError(f"Deactivate expired subscriptions failed: {e}")
+
+    async def deactivate_user_subscriptions(self, user_id: int) -> List[int]:
+        """Деактивация всех активных подписок пользователя одним UPDATE.
+
+        Подписки помечаются ``suspended_by_ban``, чтобы разблокировка
+        вернула только их. Возвращает id деактивированных подписок.
+        """
+        try:
+            async with unit_of_work() as session:
+                condition = and_(Subscription.user_id == user_id, Subscription.is_active == True)
+                deactivated = await _update_returning_ids(
+                    session, Subscription, condition, is_active=False, suspended_by_ban=True
+                )
+                await self.stats.increment({SUBSCRIPTIONS_ACTIVE_FLAG: -len(deactivated)})
+                return deactivated
+        except Exception as e:
+            db_logger.error(f"Failed to deactivate subscriptions of user {user_id}: {e}")
+            raise DatabaseError(f"Deactivate user subscriptions failed: {e}")
+
+    async def reactivate_user_subscriptions(self, user_id: int) -> List[int]:
+        """Повторная активация подписок, деактивированных блокировкой.
+
+        Одним UPDATE активируются только неистекшие подписки с
+        ``suspended_by_ban``; подписки, отключенные по другой причине (или
+        до блокировки), не затрагиваются. Возвращает id активированных
+        подписок.
+        """
+        try:
+            async with unit_of_work() as session:
+                condition = and_(
+                    Subscription.user_id == user_id,
+                    Subscription.suspended_by_ban == True,
+                    Subscription.is_active == False,
+                    Subscription.end_date > datetime.utcnow()
+                )
+                reactivated = await _update_returning_ids(
+                    session, Subscription, condition, is_active=True, suspended_by_ban=False
+                )
+                await self.stats.increment({SUBSCRIPTIONS_ACTIVE_FLAG: len(reactivated)})
+                return reactivated
+        except Exception as e:
+            db_logger.error(f"Failed to reactivate subscriptions of user {user_id}: {e}")
+            raise DatabaseError(f"Reactivate user subscriptions failed: {e}")
+
     async def extend_subscription(
         self,
         subscription_id: int,
@@ -175,11 +359,14 @@ class SubscriptionRepository(BaseRepository[Subscription]):
     ) -> bool:
         """Продление подписки."""
         try:
-            async with get_db_session() as session:
+            async with unit_of_work() as session:
                 subscription = await session.get(Subscription, subscription_id)
                 if not subscription:
                     return False
 
+                if not subscription.is_active:
+                    await self.stats.increment({SUBSCRIPTIONS_ACTIVE_FLAG: 1})
+
                 # Если подписка уже истекла, продлеваем от текущего времени
                 if subscription.end_date <= datetime.utcnow():
                     new_end_date = datetime.utcnow() + timedelta(days=additional_days)
@@ -188,6 +375,7 @@ class SubscriptionRepository(BaseRepository[Subscription]):
 
                 subscription.end_date = new_end_date
                 subscription.is_active = True
+                subscription.suspended_by_ban = False
 
                 await session.flush()
                 return True
@@ -200,58 +388,109 @@ class SubscriptionRepository(BaseRepository[Subscription]):
         subscription_id: int,
         traffic_used: int
     ) -> bool:
-        """Обновление статистики трафика."""
+        """Немедленное обновление статистики трафика одной подписки.
+
+        Периодические обновления от серверов передаются в буфер трафика
+        сервисного слоя и пишутся массово (``apply_traffic_usage``).
+        """
         try:
-            updated = await self.update(
+            updated = await self.update_values(
                 subscription_id,
                 traffic_used=traffic_used,
                 last_traffic_update=datetime.utcnow()
             )
-            return updated is not None
+            return updated > 0
         except Exception as e:
             db_logger.error(f"Failed to update traffic for subscription {subscription_id}: {e}")
             return False
 
-    async def get_subscriptions_stats(self) -> dict:
-        """Получение статистики подписок."""
+    async def apply_traffic_usage(
+        self,
+        totals: Dict[int, int],
+        deltas: Dict[int, int]
+    ) -> int:
+        """Массовая запись трафика: абсолютные значения и приращения.
+
+        ``totals`` — ``{subscription_id: traffic_used}``, ``deltas`` —
+        ``{subscription_id: прирост}``, который прибавляется к текущему
+        значению в БД. Обе части пишутся executemany в одной транзакции.
+        """
+        now = datetime.utcnow()
         try:
-            async with get_db_session() as session:
-                # Общее количество подписок
-                total = await session.execute(select(func.count(Subscription.id)))
+            async with unit_of_work() as session:
+                if totals:
+                    await self.update_many([
+                        {"id": id, "traffic_used": value, "last_traffic_update": now}
+                        for id, value in totals.items()
+                    ])
 
-                # Активные подписки
-                active = await session.execute(
-                    select(func.count(Subscription.id)).where(
-                        and_(
-                            Subscription.is_active == True,
-                            Subscription.end_date > datetime.utcnow()
+                if deltas:
+                    table = Subscription.__table__
+                    stmt = (
+                        update(table)
+                        .where(table.c.id == bindparam("subscription_id"))
+                        .values(
+                            traffic_used=table.c.traffic_used + bindparam("delta"),
+                            last_traffic_update=now,
                         )
                     )
-                )
+                    rows = [
+                        {"subscription_id": id, "delta": delta}
+                        for id, delta in deltas.items()
+                    ]
+                    for chunk in _chunks(rows, settings.database.bulk_chunk_size):
+                        await session.execute(stmt, list(chunk))
 
-                # Пробные подписки
-                trial = await session.execute(
-                    select(func.count(Subscription.id)).where(
-                        Subscription.is_trial == True
-                    )
-                )
+            return len(totals) + len(deltas)
+        except Exception as e:
+            db_logger.error(f"Failed to apply traffic usage for {len(totals) + len(deltas)} subscriptions: {e}")
+            raise DatabaseError(f"Apply traffic usage failed: {e}")
 
-                # Истекшие подписки
-                expired = await session.execute(
-                    select(func.count(Subscription.id)).where(
-                        and_(
-                            Subscription.is_active == True,
-                            Subscription.end_date <= datetime.utcnow()
-                        )
-                    )
-                )
+    async def get_subscriptions_stats(self) -> dict:
+        """Получение статистики подписок.
+
+        Общие счетчики читаются из stats_counters; истекшие, но еще не
+        деактивированные подписки считаются по индексу
+        idx_subscriptions_active_end — их немного, пока работает
+        деактивация истекших подписок.
+        """
+        try:
+            counters = await self.stats.get_counters(
+                [SUBSCRIPTIONS_TOTAL, SUBSCRIPTIONS_TRIAL, SUBSCRIPTIONS_ACTIVE_FLAG]
+            )
+            if len(counters) < 3:
+                return await self.count_subscriptions_stats()
 
-                return {
-                    "total": total.scalar(),
-                    "active": active.scalar(),
-                    "trial": trial.scalar(),
-                    "expired": expired.scalar()
-                }
+            pending = await self.aggregate_counts(
+                {"expired": None},
+                where=and_(
+                    Subscription.is_active == True,
+                    Subscription.end_date <= datetime.utcnow()
+                ),
+            )
+            expired = pending["expired"]
+
+            return {
+                "total": counters[SUBSCRIPTIONS_TOTAL],
+                "active": counters[SUBSCRIPTIONS_ACTIVE_FLAG] - expired,
+                "trial": counters[SUBSCRIPTIONS_TRIAL],
+                "expired": expired
+            }
         except Exception as e:
             db_logger.error(f"Failed to get subscriptions stats: {e}")
             return {"total": 0, "active": 0, "trial": 0, "expired": 0}
+
+    async def count_subscriptions_stats(self) -> dict:
+        """Статистика подписок, посчитанная по таблице subscriptions."""
+        now = datetime.utcnow()
+
+        return await self.aggregate_counts({
+            # Общее количество подписок
+            "total": None,
+            # Активные подписки
+            "active": and_(Subscription.is_active == True, Subscription.end_date > now),
+            # Пробные подписки
+            "trial": Subscription.is_trial == True,
+            # Истекшие подписки
+            "expired": and_(Subscription.is_active == True, Subscription.end_date <= now),
+        })
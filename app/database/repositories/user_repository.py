@@ -2,15 +2,32 @@
 Репозиторий для работы с пользователями.
 """
 
-from typing import List, Optional
-from datetime import datetime, timedelta
-from sqlalchemy import select, func, and_, or_
-from sqlalchemy.orm import selectinload
-
-from app.database.models import User, Subscription
-from app.database.repositories.base import BaseRepository
-from app.database.connection import get_db_session
+from typing import Dict, List, Optional, Type
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, update, delete, bindparam, case, func, and_, or_
+from sqlalchemy.orm import aliased, selectinload
+
+from app.database.models import User, Subscription, Server, Tariff, Payment, UserActivity
+from app.database.repositories.base import BaseRepository, _chunks, _delete_returning_ids, _update_returning_ids
+from app.database.repositories.stats_repository import (
+    StatsRepository,
+    USERS_TOTAL,
+    USERS_ACTIVE,
+    USERS_BANNED,
+    USERS_TRIAL_USED,
+    SUBSCRIPTIONS_TOTAL,
+    SUBSCRIPTIONS_TRIAL,
+    SUBSCRIPTIONS_ACTIVE_FLAG,
+    PAYMENTS_TOTAL,
+    users_created_counter,
+    new_users_window_start,
+)
+from app.database.connection import get_db_session, get_read_session, unit_of_work
+from app.database.search import fts_search_condition, like_search_condition
+from app.database.statements import cached_statement
+from app.database.views import UserView, SubscriptionView, ProfileView, view_columns
 from app.core.exceptions import DatabaseError
+from config.settings import settings
 from config.logging import db_logger
 
 
@@ -19,14 +36,19 @@ class UserRepository(BaseRepository[User]):
 
     def __init__(self):
         super().__init__(User)
+        self.stats = StatsRepository()
 
-    async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        """Получение пользователя по Telegram ID."""
+    async def get_by_telegram_id(self, telegram_id: int, view: Type = None) -> Optional[User]:
+        """Получение пользователя по Telegram ID (или его представления ``view``)."""
         try:
-            async with get_db_session() as session:
-                stmt = select(User).where(User.telegram_id == telegram_id)
-                result = await session.execute(stmt)
-                return result.scalar_one_or_none()
+            stmt = cached_statement(
+                ("users.by_telegram_id", view),
+                lambda: self._select(view).where(User.telegram_id == bindparam("telegram_id")),
+            )
+            async with get_read_session() as session:
+                result = await session.execute(stmt, {"telegram_id": telegram_id})
+                rows = self._rows(result, view)
+                return rows[0] if rows else None
         except Exception as e:
             db_logger.error(f"Failed to get user by telegram_id {telegram_id}: {e}")
             raise DatabaseError(f"Get user by telegram_id failed: {e}")
@@ -41,18 +63,26 @@ class UserRepository(BaseRepository[User]):
     ) -> User:
         """Создание нового пользователя."""
         try:
-            # Проверяем, не существует ли уже пользователь
-            existing_user = await self.get_by_telegram_id(telegram_id)
-            if existing_user:
-                return existing_user
-
-            return await self.create(
-                telegram_id=telegram_id,
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                referral_code=referral_code
-            )
+            async with unit_of_work():
+                # Проверяем, не существует ли уже пользователь
+                existing_user = await self.get_by_telegram_id(telegram_id)
+                if existing_user:
+                    return existing_user
+
+                user = await self.create(
+                    telegram_id=telegram_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    referral_code=referral_code
+                )
+
+                await self.stats.increment({
+                    USERS_TOTAL: 1,
+                    USERS_ACTIVE: int(user.is_active and not user.is_banned),
+                    users_created_counter(datetime.utcnow().date()): 1,
+                })
+                return user
         except Exception as e:
             db_logger.error(f"Failed to create user {telegram_id}: {e}")
             raise DatabaseError(f"Create user failed: {e}")
@@ -60,7 +90,7 @@ class UserRepository(BaseRepository[User]):
     async def get_with_subscriptions(self, user_id: int) -> Optional[User]:
         """Получение пользователя с подписками."""
         try:
-            async with get_db_session() as session:
+            async with get_read_session() as session:
                 stmt = (
                     select(User)
                     .options(selectinload(User.subscriptions))
@@ -72,6 +102,72 @@ class UserRepository(BaseRepository[User]):
             db_logger.error(f"Failed to get user with subscriptions {user_id}: {e}")
             raise DatabaseError(f"Get user with subscriptions failed: {e}")
 
+    async def get_profile(self, telegram_id: int) -> Optional[ProfileView]:
+        """Профиль пользователя одним запросом.
+
+        Число активных подписок и id текущей подписки — коррелированные
+        подзапросы по idx_subscriptions_user_active; текущая подписка
+        присоединяется вместе с названиями сервера и тарифа. Счетчики
+        рефералов хранятся в строке пользователя.
+        """
+        try:
+            async with get_read_session() as session:
+                subscriptions_count = (
+                    select(func.count(Subscription.id))
+                    .where(and_(Subscription.user_id == User.id, Subscription.is_active == True))
+                    .scalar_subquery()
+                )
+                active_id = (
+                    select(Subscription.id)
+                    .where(
+                        and_(
+                            Subscription.user_id == User.id,
+                            Subscription.is_active == True,
+                            Subscription.end_date > datetime.utcnow()
+                        )
+                    )
+                    .order_by(Subscription.end_date.desc())
+                    .limit(1)
+                    .scalar_subquery()
+                )
+
+                active = aliased(Subscription)
+                stmt = (
+                    select(
+                        *view_columns(User, UserView),
+                        subscriptions_count,
+                        active.id,
+                        active.user_id,
+                        Server.name,
+                        Tariff.name,
+                        active.start_date,
+                        active.end_date,
+                        active.is_active,
+                        active.is_trial,
+                        active.traffic_used,
+                    )
+                    .select_from(User)
+                    .outerjoin(active, active.id == active_id)
+                    .outerjoin(Server, Server.id == active.server_id)
+                    .outerjoin(Tariff, Tariff.id == active.tariff_id)
+                    .where(User.telegram_id == telegram_id)
+                )
+
+                row = (await session.execute(stmt)).first()
+                if row is None:
+                    return None
+
+                user_fields = len(UserView.__slots__)
+                subscription = row[user_fields + 1:]
+                return ProfileView(
+                    user=UserView(*row[:user_fields]),
+                    subscriptions_count=row[user_fields],
+                    active_subscription=SubscriptionView(*subscription) if subscription[0] is not None else None,
+                )
+        except Exception as e:
+            db_logger.error(f"Failed to get profile for user {telegram_id}: {e}")
+            raise DatabaseError(f"Get profile failed: {e}")
+
     async def get_active_users(self, limit: int = 100, offset: int = 0) -> List[User]:
         """Получение активных пользователей."""
         return await self.get_all(
@@ -86,18 +182,48 @@ class UserRepository(BaseRepository[User]):
         limit: int = 50,
         offset: int = 0
     ) -> List[User]:
-        """Поиск пользователей по имени/username."""
+        """Поиск пользователей по имени/username.
+
+        Числовой запрос ищется как точный telegram_id, запрос вида
+        ``@username`` — как точный username; остальные запросы идут
+        через индекс полнотекстового поиска (FTS5 / pg_trgm). FTS5 находит
+        слова по началу; если по началу слов ничего не найдено, запрос
+        ищется как подстрока.
+        """
         try:
-            async with get_db_session() as session:
+            query = query.strip()
+            async with get_read_session() as session:
+                # Быстрый путь: точный Telegram ID
+                if query.isdigit():
+                    stmt = select(User).where(User.telegram_id == int(query))
+                    result = await session.execute(stmt)
+                    user = result.scalar_one_or_none()
+                    if user:
+                        return [user] if offset == 0 else []
+
+                # Быстрый путь: точный @username
+                if query.startswith("@") and len(query) > 1:
+                    stmt = (
+                        select(User)
+                        .where(func.lower(User.username) == query[1:].lower())
+                        .limit(limit)
+                        .offset(offset)
+                    )
+                    result = await session.execute(stmt)
+                    return result.scalars().all()
+
+                condition = fts_search_condition(session.bind.dialect.name, query)
+                if condition is not None:
+                    found = await session.execute(select(User.id).where(condition).limit(1))
+                    if found.scalar() is None:
+                        # Подстрока внутри слова ("ser1" в "user1")
+                        condition = None
+                if condition is None:
+                    condition = like_search_condition(query)
+
                 stmt = (
                     select(User)
-                    .where(
-                        or_(
-                            User.username.ilike(f"%{query}%"),
-                            User.first_name.ilike(f"%{query}%"),
-                            User.last_name.ilike(f"%{query}%")
-                        )
-                    )
+                    .where(condition)
                     .limit(limit)
                     .offset(offset)
                 )
@@ -110,89 +236,316 @@ class UserRepository(BaseRepository[User]):
     async def update_last_activity(self, user_id: int) -> bool:
         """Обновление времени последней активности."""
         try:
-            updated_user = await self.update(user_id, last_activity=datetime.utcnow())
-            return updated_user is not None
+            return await self.update_values(user_id, last_activity=datetime.utcnow()) > 0
         except Exception as e:
             db_logger.error(f"Failed to update last activity for user {user_id}: {e}")
             return False
 
+    async def update_last_activity_many(self, activity: Dict[int, datetime]) -> int:
+        """Массовая запись last_activity ``{telegram_id: время}``.
+
+        Более раннее время не затирает уже записанное более позднее.
+        """
+        if not activity:
+            return 0
+
+        try:
+            table = User.__table__
+            stmt = (
+                update(table)
+                .where(
+                    and_(
+                        table.c.telegram_id == bindparam("b_telegram_id"),
+                        or_(
+                            table.c.last_activity.is_(None),
+                            table.c.last_activity < bindparam("b_last_activity"),
+                        ),
+                    )
+                )
+                .values(last_activity=bindparam("b_last_activity"))
+            )
+            rows = [
+                {"b_telegram_id": telegram_id, "b_last_activity": at}
+                for telegram_id, at in activity.items()
+            ]
+
+            async with get_db_session() as session:
+                for chunk in _chunks(rows, settings.database.bulk_chunk_size):
+                    await session.execute(stmt, list(chunk))
+            return len(rows)
+        except Exception as e:
+            db_logger.error(f"Failed to update last activity for {len(activity)} users: {e}")
+            raise DatabaseError(f"Bulk update last activity failed: {e}")
+
     async def ban_user(self, user_id: int, banned: bool = True) -> bool:
-        """Блокировка/разблокировка пользователя."""
+        """Блокировка/разблокировка пользователя.
+
+        Ошибка поднимается, а не возвращается False: внутри внешнего
+        unit_of_work иначе зафиксировался бы флаг без счетчиков.
+        """
         try:
-            updated_user = await self.update(user_id, is_banned=banned)
-            return updated_user is not None
+            async with unit_of_work():
+                if not await self.update_changed(user_id, is_banned=banned):
+                    # Пользователь уже в нужном состоянии или не существует
+                    return await self.exists(id=user_id)
+
+                user = await self.get_by_id(user_id)
+                delta = 1 if banned else -1
+                await self.stats.increment({
+                    USERS_BANNED: delta,
+                    USERS_ACTIVE: -delta if user.is_active else 0,
+                })
+
+                # Активные рефералы пригласившего
+                if user.referred_by and user.is_active:
+                    await self._add_referral_counts(user.referred_by, active=-delta)
+                return True
         except Exception as e:
             db_logger.error(f"Failed to ban/unban user {user_id}: {e}")
-            return False
+            raise DatabaseError(f"Ban user failed: {e}")
+
+    async def delete_user(self, user_id: int) -> Optional[List[int]]:
+        """Удаление пользователя вместе с подписками, платежами и активностью.
+
+        Каждая зависимая таблица очищается одним DELETE в общей транзакции,
+        счетчики статистики и рефералов пригласившего корректируются там же.
+        Возвращает id удаленных подписок или None, если пользователя нет.
+        """
+        try:
+            async with unit_of_work() as session:
+                user = await self.get_by_id(user_id)
+                if not user:
+                    return None
+
+                result = await session.execute(
+                    select(
+                        func.count(Subscription.id),
+                        func.count(case((Subscription.is_trial == True, 1))),
+                        func.count(case((Subscription.is_active == True, 1))),
+                    ).where(Subscription.user_id == user_id)
+                )
+                subscriptions_total, subscriptions_trial, subscriptions_active = result.one()
+
+                payments = await session.execute(delete(Payment).where(Payment.user_id == user_id))
+                await session.execute(delete(UserActivity).where(UserActivity.user_id == user_id))
+                subscription_ids = await _delete_returning_ids(
+                    session, Subscription, Subscription.user_id == user_id
+                )
+                await session.execute(delete(User).where(User.id == user_id))
+
+                is_active = user.is_active and not user.is_banned
+                deltas = {
+                    USERS_TOTAL: -1,
+                    USERS_ACTIVE: -int(is_active),
+                    USERS_BANNED: -int(user.is_banned),
+                    USERS_TRIAL_USED: -int(user.trial_used),
+                    SUBSCRIPTIONS_TOTAL: -subscriptions_total,
+                    SUBSCRIPTIONS_TRIAL: -subscriptions_trial,
+                    SUBSCRIPTIONS_ACTIVE_FLAG: -subscriptions_active,
+                    PAYMENTS_TOTAL: -payments.rowcount,
+                }
+                if user.created_at and user.created_at.date() >= new_users_window_start():
+                    deltas[users_created_counter(user.created_at.date())] = -1
+                await self.stats.increment(deltas)
+
+                if user.referred_by:
+                    await self._add_referral_counts(user.referred_by, total=-1, active=-int(is_active))
+                return subscription_ids
+        except Exception as e:
+            db_logger.error(f"Failed to delete user {user_id}: {e}")
+            raise DatabaseError(f"Delete user failed: {e}")
 
     async def set_trial_used(self, user_id: int) -> bool:
-        """Отметка об использовании пробного периода."""
+        """Отметка об использовании пробного периода (ошибка поднимается, как в ban_user)."""
         try:
-            updated_user = await self.update(user_id, trial_used=True)
-            return updated_user is not None
+            async with unit_of_work():
+                if not await self.update_changed(user_id, trial_used=True):
+                    return await self.exists(id=user_id)
+
+                await self.stats.increment({USERS_TRIAL_USED: 1})
+                return True
         except Exception as e:
             db_logger.error(f"Failed to set trial used for user {user_id}: {e}")
-            return False
+            raise DatabaseError(f"Set trial used failed: {e}")
 
-    async def get_referral_stats(self, referral_code: str) -> dict:
-        """Получение статистики по рефералам."""
-        try:
-            async with get_db_session() as session:
-                # Количество привлеченных пользователей
-                referred_count = await session.execute(
-                    select(func.count(User.id)).where(User.referred_by == referral_code)
-                )
+    async def attach_referral(self, user_id: int, referral_code: str) -> bool:
+        """Привязка пользователя к пригласившему.
 
-                # Количество активных рефералов
-                active_referred = await session.execute(
-                    select(func.count(User.id)).where(
+        В одной транзакции проставляет referred_by (только если он еще не
+        задан и код принадлежит другому пользователю) и атомарно
+        увеличивает счетчики пригласившего.
+        """
+        try:
+            async with unit_of_work() as session:
+                referrer = aliased(User)
+                result = await session.execute(
+                    update(User)
+                    .where(
                         and_(
-                            User.referred_by == referral_code,
-                            User.is_active == True,
-                            User.is_banned == False
+                            User.id == user_id,
+                            User.referred_by.is_(None),
+                            select(referrer.id)
+                            .where(and_(referrer.referral_code == referral_code, referrer.id != user_id))
+                            .exists()
                         )
                     )
+                    .values(referred_by=referral_code)
                 )
+                if not result.rowcount:
+                    return False
 
-                return {
-                    "total_referred": referred_count.scalar(),
-                    "active_referred": active_referred.scalar()
-                }
+                user = await session.get(User, user_id)
+                await self._add_referral_counts(
+                    referral_code,
+                    total=1,
+                    active=int(user.is_active and not user.is_banned),
+                )
+                return True
+        except Exception as e:
+            db_logger.error(f"Failed to attach referral {referral_code} to user {user_id}: {e}")
+            raise DatabaseError(f"Attach referral failed: {e}")
+
+    async def _add_referral_counts(self, referral_code: str, total: int = 0, active: int = 0):
+        """Атомарное изменение счетчиков рефералов пригласившего."""
+        async with get_db_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.referral_code == referral_code)
+                .values(
+                    referral_count=User.referral_count + total,
+                    referral_active_count=User.referral_active_count + active,
+                )
+            )
+
+    async def get_referral_stats(self, referral_code: str) -> dict:
+        """Получение статистики по рефералам из счетчиков пригласившего."""
+        try:
+            async with get_read_session() as session:
+                result = await session.execute(
+                    select(User.referral_count, User.referral_active_count)
+                    .where(User.referral_code == referral_code)
+                )
+                row = result.one_or_none()
+                if row is None:
+                    return {"total_referred": 0, "active_referred": 0}
+
+                return {"total_referred": row.referral_count, "active_referred": row.referral_active_count}
         except Exception as e:
             db_logger.error(f"Failed to get referral stats for {referral_code}: {e}")
             return {"total_referred": 0, "active_referred": 0}
 
-    async def get_users_stats(self) -> dict:
-        """Получение общей статистики пользователей."""
-        try:
-            async with get_db_session() as session:
-                # Общее количество пользователей
-                total_users = await session.execute(select(func.count(User.id)))
+    async def count_referral_stats(self, referral_code: str) -> dict:
+        """Статистика по рефералам, посчитанная по индексу idx_users_referred_by."""
+        return await self.aggregate_counts(
+            {
+                # Количество привлеченных пользователей
+                "total_referred": None,
+                # Количество активных рефералов
+                "active_referred": and_(User.is_active == True, User.is_banned == False),
+            },
+            where=User.referred_by == referral_code,
+        )
+
+    async def recount_referrals(self) -> List[int]:
+        """Пересчет счетчиков рефералов всех пригласивших (для сверки).
 
-                # Активные пользователи
-                active_users = await session.execute(
-                    select(func.count(User.id)).where(
-                        and_(User.is_active == True, User.is_banned == False)
+        Обновляются только строки, где сохраненные значения расходятся с
+        фактическими; возвращает telegram_id исправленных пользователей.
+        """
+        try:
+            referred = aliased(User)
+            total = (
+                select(func.count(referred.id))
+                .where(referred.referred_by == User.referral_code)
+                .scalar_subquery()
+            )
+            active = (
+                select(func.count(referred.id))
+                .where(
+                    and_(
+                        referred.referred_by == User.referral_code,
+                        referred.is_active == True,
+                        referred.is_banned == False,
                     )
                 )
+                .scalar_subquery()
+            )
 
-                # Заблокированные пользователи
-                banned_users = await session.execute(
-                    select(func.count(User.id)).where(User.is_banned == True)
+            async with get_db_session() as session:
+                condition = and_(
+                    User.referral_code.is_not(None),
+                    or_(User.referral_count != total, User.referral_active_count != active),
                 )
-
-                # Новые пользователи за последние 30 дней
-                thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-                new_users = await session.execute(
-                    select(func.count(User.id)).where(User.created_at >= thirty_days_ago)
+                fixed = await _update_returning_ids(
+                    session, User, condition, referral_count=total, referral_active_count=active
                 )
+                if not fixed:
+                    return []
+
+                result = await session.execute(select(User.telegram_id).where(User.id.in_(fixed)))
+                return list(result.scalars().all())
+        except Exception as e:
+            db_logger.error(f"Failed to recount referrals: {e}")
+            raise DatabaseError(f"Recount referrals failed: {e}")
 
+    async def get_users_stats(self) -> dict:
+        """Получение общей статистики пользователей.
+
+        Читает инкрементальные счетчики; пока сверка еще ни разу не
+        выполнялась, считает статистику по таблице users.
+        """
+        try:
+            counters = await self.stats.get_counters(
+                [USERS_TOTAL, USERS_ACTIVE, USERS_BANNED, USERS_TRIAL_USED]
+            )
+            if len(counters) < 4:
+                return await self.count_users_stats()
+
+            return {
+                "total": counters[USERS_TOTAL],
+                "active": counters[USERS_ACTIVE],
+                "banned": counters[USERS_BANNED],
+                "trial_used": counters[USERS_TRIAL_USED],
+                "new_last_30_days": await self.stats.get_users_created_since(
+                    new_users_window_start()
+                ),
+            }
+        except Exception as e:
+            db_logger.error(f"Failed to get users stats: {e}")
+            return {"total": 0, "active": 0, "banned": 0, "trial_used": 0, "new_last_30_days": 0}
+
+    async def count_users_stats(self) -> dict:
+        """Статистика пользователей, посчитанная по таблице users."""
+        return await self.aggregate_counts({
+            # Общее количество пользователей
+            "total": None,
+            # Активные пользователи
+            "active": and_(User.is_active == True, User.is_banned == False),
+            # Заблокированные пользователи
+            "banned": User.is_banned == True,
+            # Использовавшие пробный период
+            "trial_used": User.trial_used == True,
+            # Новые пользователи за последние 30 дней
+            "new_last_30_days": User.created_at >= datetime.combine(
+                new_users_window_start(), datetime.min.time()
+            ),
+        })
+
+    async def count_created_by_day(self, since: date) -> Dict[date, int]:
+        """Количество новых пользователей по дням начиная с даты."""
+        try:
+            async with get_read_session() as session:
+                day = func.date(User.created_at)
+                stmt = (
+                    select(day, func.count(User.id))
+                    .where(User.created_at >= datetime.combine(since, datetime.min.time()))
+                    .group_by(day)
+                )
+                result = await session.execute(stmt)
                 return {
-                    "total": total_users.scalar(),
-                    "active": active_users.scalar(),
-                    "banned": banned_users.scalar(),
-                    "new_last_30_days": new_users.scalar()
+                    (value if isinstance(value, date) else date.fromisoformat(value)): count
+                    for value, count in result.all()
                 }
         except Exception as e:
-            db_logger.error(f"Failed to get users stats: {e}")
-            return {"total": 0, "active": 0, "banned": 0, "new_last_30_days": 0}
+            db_logger.error(f"Failed to count users by day: {e}")
+            raise DatabaseError(f"Count users by day failed: {e}")
@@ -0,0 +1,133 @@
+"""
+Маршрутизация чтений между основной БД и репликами.
+
+Запросы на чтение (``get_read_session``) направляются на реплику, если
+она доступна и ее отставание не превышает DATABASE_REPLICA_MAX_LAG.
+Иначе, а также сразу после записи в том же контексте запроса, чтение
+идет в основную БД.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from config.settings import settings
+from config.logging import db_logger
+
+# Отставание потоковой реплики PostgreSQL в секундах. Если реплика
+# проиграла все полученные WAL, отставания нет, даже когда на primary
+# давно не было записей.
+_POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+@dataclass
+class Replica:
+    """Реплика для чтения и ее последнее известное состояние."""
+
+    name: str
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    check_lag: bool = True
+    healthy: bool = True
+    lag: float = 0.0
+    checked_at: float = 0.0
+
+
+class ReplicaRouter:
+    """Выбор реплики для запросов на чтение."""
+
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self._next = 0
+
+    def add_replica(
+        self,
+        name: str,
+        engine: AsyncEngine,
+        sessionmaker: async_sessionmaker,
+        check_lag: bool = True
+    ):
+        """Регистрация реплики.
+
+        ``check_lag=False`` — для источников без отставания (пул
+        читателей той же SQLite базы).
+        """
+        self.replicas.append(Replica(name, engine, sessionmaker, check_lag))
+
+    async def pick(self, last_write_at: Optional[float] = None) -> Optional[async_sessionmaker]:
+        """Фабрика сессий подходящей реплики или ``None`` для основной БД.
+
+        ``last_write_at`` — время последней записи в текущем контексте
+        (time.monotonic). Пока оно моложе допустимого отставания, реплики
+        с отставанием пропускаются, чтобы запрос видел свою запись.
+        """
+        if not self.replicas:
+            return None
+
+        recent_write = (
+            last_write_at is not None
+            and time.monotonic() - last_write_at < settings.database.replica_max_lag
+        )
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+
+            if replica.check_lag:
+                if recent_write:
+                    continue
+                await self._refresh(replica)
+
+            if replica.healthy:
+                return replica.sessionmaker
+
+        return None
+
+    async def _refresh(self, replica: Replica):
+        """Проверка отставания реплики не чаще DATABASE_REPLICA_CHECK_INTERVAL."""
+        now = time.monotonic()
+        if now - replica.checked_at < settings.database.replica_check_interval:
+            return
+
+        # Отмечаем время до запроса, чтобы параллельные чтения не
+        # запускали повторную проверку
+        replica.checked_at = now
+        try:
+            async with replica.engine.connect() as conn:
+                result = await asyncio.wait_for(
+                    conn.execute(text(_POSTGRES_LAG_SQL)),
+                    timeout=settings.database.replica_check_interval,
+                )
+                lag = float(result.scalar() or 0)
+            healthy = lag <= settings.database.replica_max_lag
+        except Exception as e:
+            db_logger.warning(f"Replica {replica.name} check failed: {e}")
+            lag, healthy = float("inf"), False
+
+        if healthy != replica.healthy:
+            state = "back in rotation" if healthy else "removed from rotation"
+            db_logger.warning(f"Replica {replica.name} {state} (lag {lag:.1f}s)")
+
+        replica.lag = lag
+        replica.healthy = healthy
+
+    async def dispose(self):
+        """Закрытие соединений всех реплик."""
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        self.replicas = []
+        self._next = 0
+
+
+# Глобальный маршрутизатор чтений
+replica_router = ReplicaRouter()
@@ -0,0 +1,85 @@
+"""
+Версия схемы базы данных и миграции Alembic.
+
+При запуске сравнивается ревизия из таблицы alembic_version с head
+каталога migrations/versions: если они совпадают, схема не
+отражается и DDL не выполняется. Миграции применяются на соединении
+приложения через migrations/env.py.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.database.instrumentation import operation_label
+from app.database.timeouts import MIGRATIONS_OPERATION
+from config.logging import db_logger
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+
+# Ревизия схемы, которую раньше создавал Base.metadata.create_all
+BASELINE_REVISION = "0001_initial"
+
+
+def _alembic_config(connection: Connection = None) -> Config:
+    """Конфигурация Alembic с путями относительно корня проекта."""
+    config = Config(str(MIGRATIONS_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+@lru_cache(maxsize=1)
+def head_revision() -> Optional[str]:
+    """Последняя ревизия в каталоге миграций."""
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+def _current_revision(connection: Connection) -> Optional[str]:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def _upgrade(connection: Connection, revision: str, stamp: Optional[str]):
+    config = _alembic_config(connection)
+    if stamp:
+        command.stamp(config, stamp)
+    command.upgrade(config, revision)
+
+
+async def get_schema_revision(conn: AsyncConnection) -> Optional[str]:
+    """Ревизия схемы, записанная в БД (None — схема не создана)."""
+    return await conn.run_sync(_current_revision)
+
+
+async def upgrade_schema(engine: AsyncEngine, revision: str = "head") -> Optional[str]:
+    """Применение миграций до ``revision`` в одной транзакции.
+
+    База, созданная до перехода на Alembic (таблицы есть, ревизии нет),
+    сначала помечается базовой ревизией. Возвращает ревизию до обновления.
+    Запросы миграций выполняются без таймаута.
+    """
+    with operation_label(MIGRATIONS_OPERATION):
+        return await _upgrade_schema(engine, revision)
+
+
+async def _upgrade_schema(engine: AsyncEngine, revision: str) -> Optional[str]:
+    async with engine.begin() as conn:
+        current = await get_schema_revision(conn)
+
+        stamp = None
+        if current is None and await conn.run_sync(lambda c: inspect(c).has_table("users")):
+            db_logger.info(f"Existing schema without revision, stamping {BASELINE_REVISION}")
+            stamp = BASELINE_REVISION
+
+        await conn.run_sync(_upgrade, revision, stamp)
+        db_logger.info(f"Database schema upgraded from {current or stamp or 'empty'} to {revision}")
+        return current
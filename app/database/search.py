@@ -0,0 +1,171 @@
+"""
+Индекс полнотекстового поиска пользователей.
+
+Реализация выбирается по диалекту:
+
+- SQLite: виртуальная таблица FTS5 ``users_fts`` (external content над
+  ``users``), синхронизируемая триггерами на INSERT/UPDATE/DELETE;
+- PostgreSQL: GIN индексы ``pg_trgm`` по username/first_name/last_name,
+  которые ускоряют ``ILIKE '%q%'``.
+
+Если индекс создать не удалось (нет FTS5 или прав на расширение),
+поиск работает через ILIKE без индекса.
+
+Таблицы и индексы поиска создаются вне миграций и не описаны в моделях;
+автогенерация Alembic пропускает их (``is_search_index_object``).
+"""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import Integer, column, or_, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database.models import User
+from config.logging import db_logger
+
+SEARCH_COLUMNS = ("username", "first_name", "last_name")
+
+# FTS5 таблица (и ее служебные таблицы users_fts_*) и индексы pg_trgm
+FTS_TABLE = "users_fts"
+TRGM_INDEXES = tuple(f"idx_users_{name}_trgm" for name in SEARCH_COLUMNS)
+
+# Доступен ли индексный поиск в текущей БД (выставляется при инициализации)
+_search_index_enabled = False
+
+_SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, first_name, last_name,
+        content='users', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, first_name, last_name)
+        VALUES (new.id, new.username, new.first_name, new.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, first_name, last_name)
+        VALUES ('delete', old.id, old.username, old.first_name, old.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_fts_au
+    AFTER UPDATE OF username, first_name, last_name ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, first_name, last_name)
+        VALUES ('delete', old.id, old.username, old.first_name, old.last_name);
+        INSERT INTO users_fts(rowid, username, first_name, last_name)
+        VALUES (new.id, new.username, new.first_name, new.last_name);
+    END
+    """,
+]
+
+_POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f"CREATE INDEX IF NOT EXISTS {index} ON users USING gin ({name} gin_trgm_ops)"
+    for index, name in zip(TRGM_INDEXES, SEARCH_COLUMNS)
+]
+
+
+def is_search_index_object(name: str, type_: str) -> bool:
+    """Принадлежит ли объект схемы индексу поиска."""
+    if type_ == "table":
+        return name == FTS_TABLE or name.startswith(f"{FTS_TABLE}_")
+    if type_ == "index":
+        return name in TRGM_INDEXES
+    return False
+
+
+async def install_search_index(conn: AsyncConnection):
+    """Создание индекса поиска для диалекта соединения."""
+    global _search_index_enabled
+
+    dialect_name = conn.dialect.name
+    try:
+        if dialect_name == "sqlite":
+            await _install_sqlite_fts(conn)
+        elif dialect_name == "postgresql":
+            # Отдельная точка сохранения: ошибка CREATE EXTENSION
+            # не должна прерывать транзакцию инициализации
+            async with conn.begin_nested():
+                for statement in _POSTGRES_TRGM_DDL:
+                    await conn.execute(text(statement))
+        else:
+            _search_index_enabled = False
+            return
+
+        _search_index_enabled = True
+        db_logger.info(f"User search index ready ({dialect_name})")
+    except Exception as e:
+        _search_index_enabled = False
+        db_logger.warning(f"User search index unavailable, falling back to ILIKE: {e}")
+
+
+async def detect_search_index(conn: AsyncConnection):
+    """Проверка уже созданного индекса поиска без DDL (быстрый запуск)."""
+    global _search_index_enabled
+
+    dialect_name = conn.dialect.name
+    if dialect_name == "sqlite":
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    elif dialect_name == "postgresql":
+        query = f"SELECT 1 FROM pg_indexes WHERE indexname = '{TRGM_INDEXES[0]}'"
+    else:
+        _search_index_enabled = False
+        return
+
+    result = await conn.execute(text(query))
+    _search_index_enabled = result.scalar() is not None
+    if not _search_index_enabled:
+        db_logger.warning("User search index not found, falling back to ILIKE")
+
+
+async def _install_sqlite_fts(conn: AsyncConnection):
+    """Создание FTS5 таблицы и триггеров синхронизации."""
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    )
+    existed = result.scalar() is not None
+
+    for statement in _SQLITE_FTS_DDL:
+        await conn.execute(text(statement))
+
+    # Первичное наполнение индекса уже существующими пользователями
+    if not existed:
+        await conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+
+def _fts_match_query(query: str) -> str:
+    """Запрос FTS5: все слова как префиксы, экранированные кавычками."""
+    terms = re.findall(r"\w+", query, flags=re.UNICODE)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def fts_search_condition(dialect_name: str, query: str):
+    """Условие WHERE по FTS5 (слова запроса — префиксы слов в полях).
+
+    None, если индекс FTS недоступен или в запросе нет слов.
+    """
+    if _search_index_enabled and dialect_name == "sqlite":
+        match = _fts_match_query(query)
+        if match:
+            matched_ids = (
+                text("SELECT rowid FROM users_fts WHERE users_fts MATCH :fts_query")
+                .bindparams(fts_query=match)
+                .columns(column("rowid", Integer))
+            )
+            return User.id.in_(matched_ids)
+    return None
+
+
+def like_search_condition(query: str):
+    """Условие WHERE по подстроке; на PostgreSQL ILIKE использует GIN индексы pg_trgm."""
+    pattern = f"%{query}%"
+    conditions: List = [getattr(User, name).ilike(pattern) for name in SEARCH_COLUMNS]
+    return or_(*conditions)
@@ -0,0 +1,29 @@
+"""
+Кэш готовых параметризованных запросов репозиториев.
+
+Горячие запросы строятся один раз с ``bindparam`` вместо значений и
+затем переиспользуются: повторный вызов не собирает ``select()`` заново,
+а ключ кэша компиляции SQLAlchemy мемоизирован на самом объекте запроса,
+поэтому компиляция берется из кэша движка без обхода выражения.
+"""
+
+from typing import Any, Callable, Dict, Hashable
+
+from app.core.monitoring import db_statement_cache
+
+_statements: Dict[Hashable, Any] = {}
+
+
+def cached_statement(key: Hashable, build: Callable[[], Any]) -> Any:
+    """Готовый запрос по ключу; ``build`` вызывается только при первом обращении.
+
+    Ключ должен однозначно определять форму запроса (модель, поля,
+    представление), значения передаются параметрами при выполнении.
+    """
+    statement = _statements.get(key)
+    if statement is None:
+        db_statement_cache.labels(cache="statement", result="miss").inc()
+        statement = _statements[key] = build()
+    else:
+        db_statement_cache.labels(cache="statement", result="hit").inc()
+    return statement
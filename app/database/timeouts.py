@@ -0,0 +1,193 @@
+"""
+Таймауты запросов методов репозиториев.
+
+Таймаут определяется меткой метода репозитория (см.
+app.database.instrumentation): DATABASE_STATEMENT_TIMEOUTS для отдельных
+методов, иначе DATABASE_STATEMENT_TIMEOUT. Ограничение действует на трех
+уровнях:
+
+- PostgreSQL: ``statement_timeout`` соединения; значение по умолчанию
+  задается при подключении, ``SET`` выполняется только когда метод
+  требует другого значения;
+- SQLite: progress handler прерывает запрос после дедлайна;
+- asyncio: метод целиком отменяется после таймаута с небольшим запасом
+  (ожидание соединения из пула, зависшее соединение), сессия при этом
+  закрывается и соединение возвращается в пул.
+
+Превышение таймаута поднимает ``QueryTimeoutError``.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.util import await_only
+
+from app.core.exceptions import QueryTimeoutError
+from app.core.monitoring import db_statement_timeouts
+from config.settings import settings
+
+# Метка запросов миграций: выполняются без ограничения
+MIGRATIONS_OPERATION = "migrations"
+
+# Запас asyncio отмены поверх таймаута запроса, секунды
+_CANCEL_GRACE = 1.0
+
+# Через сколько инструкций SQLite вызывается progress handler
+_SQLITE_PROGRESS_STEPS = 1000
+
+# SQLSTATE query_canceled (в том числе statement_timeout)
+_PG_QUERY_CANCELED = "57014"
+
+# Ключи в info DBAPI соединения
+_PG_TIMEOUT_KEY = "statement_timeout_ms"
+_PG_TIMEOUT_BEFORE_TX_KEY = "statement_timeout_ms_before_tx"
+_SQLITE_STATE_KEY = "statement_deadline"
+
+
+def statement_timeout_for(operation: str) -> float:
+    """Таймаут метода репозитория в секундах (0 — без ограничения)."""
+    if operation == MIGRATIONS_OPERATION:
+        return 0
+    return settings.database.statement_timeouts.get(operation, settings.database.statement_timeout)
+
+
+def _timeout_ms(operation: str) -> int:
+    return int(statement_timeout_for(operation) * 1000)
+
+
+def _default_timeout_ms() -> int:
+    return int(settings.database.statement_timeout * 1000)
+
+
+@asynccontextmanager
+async def cancel_after(operation: str) -> AsyncIterator[None]:
+    """Отмена текущей задачи, если метод не уложился в таймаут.
+
+    Отмена выполняется в той же задаче (без ``wait_for``), поэтому
+    контекст unit_of_work и время последней записи сохраняются.
+    """
+    timeout = statement_timeout_for(operation)
+    if not timeout:
+        yield
+        return
+
+    task = asyncio.current_task()
+    fired = False
+
+    def cancel():
+        nonlocal fired
+        fired = True
+        task.cancel()
+
+    handle = asyncio.get_running_loop().call_later(timeout + _CANCEL_GRACE, cancel)
+    try:
+        yield
+    except asyncio.CancelledError:
+        if not fired:
+            raise
+        if hasattr(task, "uncancel"):
+            task.uncancel()
+        db_statement_timeouts.labels(operation=operation).inc()
+        raise QueryTimeoutError(f"{operation} timed out after {timeout}s")
+    finally:
+        handle.cancel()
+
+
+def find_timeout(error: BaseException) -> Optional[QueryTimeoutError]:
+    """QueryTimeoutError в цепочке исключений (репозитории оборачивают ошибки)."""
+    while error is not None:
+        if isinstance(error, QueryTimeoutError):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def pg_connect_args() -> dict:
+    """Параметры asyncpg: таймаут по умолчанию для новых соединений."""
+    return {"server_settings": {"statement_timeout": str(_default_timeout_ms())}}
+
+
+def on_connect(dbapi_connection, connection_record, dialect_name: str):
+    """Начальное состояние таймаута нового соединения."""
+    if dialect_name == "postgresql":
+        connection_record.info[_PG_TIMEOUT_KEY] = _default_timeout_ms()
+    elif dialect_name == "sqlite":
+        state = connection_record.info[_SQLITE_STATE_KEY] = {"deadline": None, "expired": False}
+
+        def progress_handler():
+            deadline = state["deadline"]
+            if deadline is not None and time.monotonic() > deadline:
+                state["expired"] = True
+                return 1
+            return 0
+
+        # Обработчик вызывается в потоке aiosqlite, ставится через его очередь
+        driver_connection = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        result = driver_connection.set_progress_handler(progress_handler, _SQLITE_PROGRESS_STEPS)
+        if asyncio.iscoroutine(result):
+            await_only(result)
+
+
+def before_statement(conn, cursor, operation: str):
+    """Ограничение времени запроса перед выполнением."""
+    dialect_name = conn.dialect.name
+    if dialect_name == "postgresql":
+        timeout_ms = _timeout_ms(operation)
+        info = conn.info
+        if info.get(_PG_TIMEOUT_KEY) != timeout_ms:
+            # SET откатывается вместе с транзакцией: запоминаем прежнее значение
+            info.setdefault(_PG_TIMEOUT_BEFORE_TX_KEY, info.get(_PG_TIMEOUT_KEY))
+            cursor.execute(f"SET statement_timeout = {timeout_ms}")
+            info[_PG_TIMEOUT_KEY] = timeout_ms
+    elif dialect_name == "sqlite":
+        state = conn.info.get(_SQLITE_STATE_KEY)
+        if state is not None:
+            timeout = statement_timeout_for(operation)
+            state["deadline"] = time.monotonic() + timeout if timeout else None
+            state["expired"] = False
+
+
+def after_statement(conn):
+    """Снятие дедлайна SQLite после выполнения."""
+    state = conn.info.get(_SQLITE_STATE_KEY)
+    if state is not None:
+        state["deadline"] = None
+
+
+def on_transaction_end(info: dict, committed: bool):
+    """Учет SET statement_timeout при завершении транзакции.
+
+    После отката PostgreSQL возвращает значение, действовавшее до начала
+    транзакции.
+    """
+    if _PG_TIMEOUT_BEFORE_TX_KEY not in info:
+        return
+    before = info.pop(_PG_TIMEOUT_BEFORE_TX_KEY)
+    if not committed:
+        info[_PG_TIMEOUT_KEY] = before
+
+
+def statement_error(conn, original_exception, operation: str) -> Optional[QueryTimeoutError]:
+    """QueryTimeoutError, если запрос прерван по таймауту."""
+    if conn is None:
+        return None
+
+    after_statement(conn)
+    timed_out = False
+    if conn.dialect.name == "postgresql":
+        timed_out = getattr(original_exception, "sqlstate", None) == _PG_QUERY_CANCELED
+    else:
+        state = conn.info.get(_SQLITE_STATE_KEY)
+        if state is not None and state["expired"]:
+            state["expired"] = False
+            timed_out = True
+
+    if not timed_out:
+        return None
+
+    db_statement_timeouts.labels(operation=operation).inc()
+    return QueryTimeoutError(
+        f"Statement in {operation} timed out after {statement_timeout_for(operation)}s"
+    )
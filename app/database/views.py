@@ -0,0 +1,118 @@
+"""
+Легкие представления строк для ответов сервисов.
+
+Вместо ORM сущностей (identity map, отслеживание изменений, загрузка
+связей) списки и профили читаются выборкой нужных колонок через Core
+``select()`` в неизменяемые dataclass со ``__slots__``.
+"""
+
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, List, Optional, Type
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def view_columns(model: Type, view: Type) -> List[Any]:
+    """Колонки модели, соответствующие полям представления."""
+    return [getattr(model, field.name) for field in fields(view)]
+
+
+@dataclass(frozen=True)
+class UserView:
+    """Пользователь для списков и профиля."""
+
+    __slots__ = (
+        "id", "telegram_id", "username", "first_name", "last_name", "email",
+        "is_active", "is_banned", "trial_used", "referral_code", "referred_by",
+        "referral_count", "referral_active_count", "created_at", "last_activity",
+    )
+
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    email: Optional[str]
+    is_active: bool
+    is_banned: bool
+    trial_used: bool
+    referral_code: Optional[str]
+    referred_by: Optional[str]
+    referral_count: int
+    referral_active_count: int
+    created_at: Optional[datetime]
+    last_activity: Optional[datetime]
+
+    @classmethod
+    def from_entity(cls, user) -> "UserView":
+        """Представление из ORM сущности."""
+        return cls(*(getattr(user, name) for name in cls.__slots__))
+
+    def to_dict(self) -> dict:
+        """Сериализация для API и бота."""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["created_at"] = _isoformat(self.created_at)
+        data["last_activity"] = _isoformat(self.last_activity)
+        return data
+
+
+@dataclass(frozen=True)
+class SubscriptionView:
+    """Подписка с названиями сервера и тарифа."""
+
+    __slots__ = (
+        "id", "user_id", "server_name", "tariff_name", "start_date", "end_date",
+        "is_active", "is_trial", "traffic_used",
+    )
+
+    id: int
+    user_id: int
+    server_name: Optional[str]
+    tariff_name: Optional[str]
+    start_date: Optional[datetime]
+    end_date: Optional[datetime]
+    is_active: bool
+    is_trial: bool
+    traffic_used: int
+
+    @classmethod
+    def from_entity(cls, subscription) -> "SubscriptionView":
+        """Представление из ORM сущности (с загруженными server и tariff)."""
+        return cls(
+            id=subscription.id,
+            user_id=subscription.user_id,
+            server_name=subscription.server.name if subscription.server else None,
+            tariff_name=subscription.tariff.name if subscription.tariff else None,
+            start_date=subscription.start_date,
+            end_date=subscription.end_date,
+            is_active=subscription.is_active,
+            is_trial=subscription.is_trial,
+            traffic_used=subscription.traffic_used,
+        )
+
+    def to_dict(self) -> dict:
+        """Сериализация для API и бота."""
+        return {
+            "id": self.id,
+            "server_name": self.server_name,
+            "tariff_name": self.tariff_name,
+            "start_date": _isoformat(self.start_date),
+            "end_date": _isoformat(self.end_date),
+            "is_active": self.is_active,
+            "is_trial": self.is_trial,
+            "traffic_used": self.traffic_used,
+        }
+
+
+@dataclass(frozen=True)
+class ProfileView:
+    """Профиль пользователя: пользователь, число активных подписок и текущая подписка."""
+
+    __slots__ = ("user", "subscriptions_count", "active_subscription")
+
+    user: UserView
+    subscriptions_count: int
+    active_subscription: Optional[SubscriptionView]
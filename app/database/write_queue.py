@@ -0,0 +1,247 @@
+"""
+Очередь записи SQLite с групповым коммитом.
+
+Все транзакции записи (``get_db_session``, ``unit_of_work``) выполняются
+на одном соединении по очереди. Фоновая задача открывает транзакцию
+``BEGIN IMMEDIATE`` и по очереди выдает соединение ожидающим
+транзакциям; каждая из них выполняется в своей SAVEPOINT: ошибка
+откатывает только ее. Когда очередь пуста или набрано
+SQLITE_WRITE_BATCH_SIZE транзакций, выполняется один COMMIT на всю
+пачку, и только после него транзакции пачки завершаются у вызывающих.
+
+Под нагрузкой пачки растут, и число коммитов и передач блокировки
+записи не растет вместе с числом транзакций. Занятость базы другим
+процессом (SQLITE_BUSY) при взятии блокировки повторяется с
+экспоненциальной задержкой со случайным разбросом.
+
+Очередь и соединение писателя привязаны к event loop, в котором очередь
+запущена (loop приложения: бот и фоновые сервисы). Async маршруты Flask
+выполняются в потоках waitress со своими event loop: их транзакции
+идут мимо очереди, через пул основной БД из одного соединения, и
+ждут в пуле окончания текущей пачки.
+"""
+
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from app.core.exceptions import DatabaseError
+from app.core.monitoring import db_write_batch_size, db_write_busy_retries, db_write_queue_depth
+from config.settings import settings
+from config.logging import db_logger
+
+# Основные коды SQLITE_BUSY и SQLITE_LOCKED (расширенные коды, например
+# SQLITE_BUSY_SNAPSHOT, содержат их в младшем байте)
+_SQLITE_BUSY_CODES = (5, 6)
+
+# Верхняя граница задержки между повторами, секунды
+_MAX_BACKOFF = 2.0
+
+
+def is_busy_error(error: BaseException) -> bool:
+    """База занята другим соединением (SQLITE_BUSY/SQLITE_LOCKED)."""
+    if not isinstance(error, OperationalError):
+        return False
+    code = getattr(error.orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in _SQLITE_BUSY_CODES
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def _resolve(future: asyncio.Future, result=None, error: BaseException = None):
+    """Результат future, если ожидающий еще не отменил его."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _WriteRequest:
+    """Транзакция в очереди записи."""
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        # Соединение выдано транзакции
+        self.granted: asyncio.Future = loop.create_future()
+        # Транзакция вернула соединение (True — SAVEPOINT зафиксирована)
+        self.released: asyncio.Future = loop.create_future()
+        # COMMIT пачки выполнен
+        self.committed: asyncio.Future = loop.create_future()
+
+
+class WriteQueue:
+    """Единственный писатель SQLite с групповым коммитом."""
+
+    def __init__(self):
+        self._engine: Optional[AsyncEngine] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def serves_current_loop(self) -> bool:
+        """Принимает ли очередь транзакции из текущего event loop."""
+        if not self.running or self._closing:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def start(self, engine: AsyncEngine):
+        """Запуск задачи писателя для движка основной БД."""
+        self._engine = engine
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        db_logger.info("SQLite write queue started")
+
+    async def stop(self):
+        """Остановка писателя после выполнения транзакций из очереди.
+
+        Новые транзакции идут мимо очереди, через пул основной БД.
+        """
+        if self._task is None:
+            return
+
+        self._closing = True
+        # Пробуждение писателя, ожидающего очередь
+        self._queue.put_nowait(None)
+        try:
+            await self._task
+        except Exception as e:
+            db_logger.error(f"SQLite write queue stopped with error: {e}")
+        db_write_queue_depth.set(0)
+
+        self._task = None
+        self._queue = None
+        self._loop = None
+        self._engine = None
+        db_logger.info("SQLite write queue stopped")
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        """Сессия транзакции записи из очереди.
+
+        Выход из контекста без ошибки ждет COMMIT пачки, в которую
+        попала транзакция; при ошибке откатывается только ее SAVEPOINT.
+        """
+        if not self.serves_current_loop():
+            raise DatabaseError("Write queue is not running in this event loop")
+
+        request = _WriteRequest()
+        self._queue.put_nowait(request)
+        db_write_queue_depth.set(self._queue.qsize())
+
+        try:
+            connection = await request.granted
+        except asyncio.CancelledError:
+            # Соединение могло быть выдано одновременно с отменой
+            if request.granted.done() and not request.granted.cancelled():
+                _resolve(request.released, False)
+            raise
+
+        session = AsyncSession(
+            bind=connection,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        saved = False
+        try:
+            yield session
+            await session.commit()
+            saved = True
+        except Exception as e:
+            db_logger.error(f"Database session error: {e}")
+            raise
+        finally:
+            try:
+                if not saved:
+                    await session.rollback()
+                await session.close()
+            except BaseException as e:
+                # Соединение в неизвестном состоянии: писатель откатит пачку
+                _resolve(request.released, error=e)
+                raise
+            _resolve(request.released, saved)
+
+        # Отмена вызывающего не отменяет COMMIT пачки
+        await asyncio.shield(request.committed)
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            request = await self._queue.get()
+            db_write_queue_depth.set(self._queue.qsize())
+            if request is None or request.granted.cancelled():
+                continue
+            try:
+                await self._run_batch(request)
+            except Exception as e:
+                db_logger.error(f"Write batch failed: {e}")
+
+    async def _run_batch(self, request: _WriteRequest):
+        """Пачка транзакций из очереди в одной транзакции БД."""
+        batch: List[_WriteRequest] = []
+        try:
+            async with self._engine.connect() as connection:
+                try:
+                    await self._begin(connection)
+                except Exception as e:
+                    _resolve(request.granted, error=DatabaseError(f"Write transaction failed: {e}"))
+                    raise
+
+                while True:
+                    if request is not None and not request.granted.cancelled():
+                        _resolve(request.granted, connection)
+                        if await request.released:
+                            batch.append(request)
+
+                    if len(batch) >= settings.database.sqlite_write_batch_size or self._queue.empty():
+                        break
+                    request = self._queue.get_nowait()
+                    db_write_queue_depth.set(self._queue.qsize())
+
+                await connection.commit()
+        except BaseException as e:
+            error = DatabaseError(f"Write batch commit failed: {e}")
+            for done in batch:
+                _resolve(done.committed, error=error)
+            raise
+
+        for done in batch:
+            _resolve(done.committed)
+        if batch:
+            db_write_batch_size.observe(len(batch))
+
+    async def _begin(self, connection: AsyncConnection):
+        """BEGIN IMMEDIATE с повтором, пока базу держит другой процесс."""
+        attempt = 0
+        while True:
+            try:
+                await connection.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError as e:
+                if not is_busy_error(e) or attempt >= settings.database.sqlite_busy_retries:
+                    raise
+                await connection.rollback()
+
+            db_write_busy_retries.inc()
+            delay = min(_MAX_BACKOFF, settings.database.sqlite_busy_backoff * 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, delay))
+
+
+# Глобальная очередь записи SQLite
+write_queue = WriteQueue()
@@ -16,6 +16,11 @@ from app.database.connection import init_database
 from app.bot.main import start_bot
 from app.api.main import start_web_server
 from app.core.monitoring import setup_monitoring
+from app.core.startup import startup_timer
+from app.services.stats_service import stats_service
+from app.services.expiry_service import expiry_service
+from app.services.traffic_service import traffic_buffer
+from app.services.activity_service import activity_tracker
 
 # Настройка логирования
 logger = setup_logging()
@@ -27,6 +32,7 @@ class Application:
     def __init__(self):
         self.bot_task = None
         self.web_task = None
+        self.background_tasks = []
         self.running = False
 
     async def startup(self):
@@ -35,12 +41,33 @@ class Application:
 
         try:
             # Инициализация базы данных
-            await init_database()
+            with startup_timer.phase("database"):
+                await init_database()
             logger.info("Database initialized")
 
+            # Сверка счетчиков статистики: при старте — только если их
+            # еще нет, далее периодически
+            with startup_timer.phase("stats_reconcile"):
+                await stats_service.reconcile_on_startup()
+            self.background_tasks.append(asyncio.create_task(
+                stats_service.run_reconciliation(settings.database.stats_reconcile_interval)
+            ))
+
+            # Деактивация истекших подписок
+            self.background_tasks.append(asyncio.create_task(expiry_service.run()))
+
+            # Отложенная запись статистики трафика
+            self.background_tasks.append(asyncio.create_task(
+                traffic_buffer.run(settings.database.traffic_flush_interval)
+            ))
+            self.background_tasks.append(asyncio.create_task(
+                activity_tracker.run(settings.database.activity_flush_interval)
+            ))
+
             # Настройка мониторинга
             if settings.monitoring.metrics_enabled:
-                setup_monitoring()
+                with startup_timer.phase("monitoring"):
+                    setup_monitoring()
                 logger.info("Monitoring setup completed")
 
             # Запуск бота и веб-сервера
@@ -49,6 +76,7 @@ class Application:
 
             self.running = True
             logger.info("All services started successfully")
+            startup_timer.log_summary()
 
             # Ожидание завершения задач
             await asyncio.gather(self.bot_task, self.web_task)
@@ -81,6 +109,18 @@ class Application:
             except asyncio.CancelledError:
                 pass
 
+        for task in self.background_tasks:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        # Запись накопленных трафика и активности
+        await traffic_buffer.flush()
+        await activity_tracker.flush()
+
         logger.info("Application shutdown completed")
 
 
@@ -0,0 +1,87 @@
+"""
+Учет последней активности пользователей с отложенной записью.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.database.repositories.user_repository import UserRepository
+from app.core.cache import invalidate_profiles
+from config.logging import get_logger
+
+logger = get_logger("activity_service")
+
+
+class ActivityTracker:
+    """Время последней активности пользователей в памяти.
+
+    Каждое сообщение пользователя только обновляет значение в словаре
+    ``telegram_id -> время``; в users.last_activity накопленные значения
+    записываются одним массовым UPDATE раз в
+    DATABASE_ACTIVITY_FLUSH_INTERVAL секунд и при остановке приложения.
+    Чтения подмешивают еще не записанное значение (``merge``).
+    """
+
+    def __init__(self):
+        self.user_repo = UserRepository()
+        self._pending: Dict[int, datetime] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def touch(self, telegram_id: int, at: datetime = None):
+        """Отметка активности пользователя."""
+        at = at or datetime.utcnow()
+        current = self._pending.get(telegram_id)
+        if current is None or at > current:
+            self._pending[telegram_id] = at
+
+    def pending(self, telegram_id: int) -> Optional[datetime]:
+        """Еще не записанное время активности пользователя."""
+        return self._pending.get(telegram_id)
+
+    def merge(self, telegram_id: int, last_activity: Optional[datetime]) -> Optional[datetime]:
+        """Последняя активность с учетом незаписанного значения."""
+        pending = self._pending.get(telegram_id)
+        if pending is None:
+            return last_activity
+        if last_activity is None:
+            return pending
+
+        # PostgreSQL возвращает aware datetime, в буфере — naive UTC
+        stored = last_activity
+        if stored.tzinfo is not None:
+            stored = stored.astimezone(timezone.utc).replace(tzinfo=None)
+        return pending if pending > stored else last_activity
+
+    async def flush(self) -> int:
+        """Запись накопленной активности; возвращает число пользователей."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            try:
+                updated = await self.user_repo.update_last_activity_many(batch)
+            except Exception as e:
+                logger.error(f"Activity flush failed, {len(batch)} updates kept in buffer: {e}")
+                for telegram_id, at in batch.items():
+                    self.touch(telegram_id, at)
+                return 0
+
+            # Закэшированные профили записанных пользователей устарели:
+            # незаписанное значение больше не подмешивается
+            await invalidate_profiles(batch)
+            return updated
+
+    async def run(self, interval: int):
+        """Фоновая периодическая запись."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Activity flush failed: {e}")
+
+
+# Глобальный трекер активности
+activity_tracker = ActivityTracker()
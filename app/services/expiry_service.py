@@ -0,0 +1,105 @@
+"""
+Сервис деактивации истекших подписок.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from app.database.repositories.subscription_repository import SubscriptionRepository
+from app.core.cache import invalidate_profiles
+from app.core.monitoring import subscriptions_expired, expiry_delay
+from config.settings import settings
+from config.logging import get_logger
+
+logger = get_logger("expiry_service")
+
+
+def _as_utc_naive(value: datetime) -> datetime:
+    """Приведение end_date к naive UTC (PostgreSQL возвращает aware)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ExpiryService:
+    """Деактивация подписок точно в момент окончания.
+
+    В памяти хранится куча ближайших DATABASE_EXPIRY_HEAP_SIZE сроков,
+    загруженная по индексу idx_subscriptions_active_end. Сервис спит до
+    ближайшего срока, деактивирует все наступившие подписки пачкой и
+    перечитывает кучу, когда она опустела. Новые и продленные подписки
+    подхватываются перечитыванием не реже DATABASE_EXPIRY_MAX_SLEEP
+    секунд; устаревшие записи кучи безвредны — UPDATE проверяет
+    is_active и end_date.
+    """
+
+    def __init__(self):
+        self.subscription_repo = SubscriptionRepository()
+        self._heap: List[Tuple[datetime, int]] = []
+
+    async def refill(self):
+        """Перечитывание ближайших сроков из индекса."""
+        rows = await self.subscription_repo.get_next_expirations(
+            settings.database.expiry_heap_size
+        )
+        self._heap = [(_as_utc_naive(end_date), id) for end_date, id in rows]
+        heapq.heapify(self._heap)
+
+    async def expire_due(self) -> List[int]:
+        """Деактивация всех подписок кучи, срок которых наступил."""
+        now = datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+
+        if not due:
+            return []
+
+        deadlines = dict((id, end_date) for end_date, id in due)
+        deactivated = await self.subscription_repo.deactivate_expired(list(deadlines))
+
+        for id in deactivated:
+            expiry_delay.observe((now - deadlines[id]).total_seconds())
+        subscriptions_expired.inc(len(deactivated))
+
+        if deactivated:
+            try:
+                await invalidate_profiles(await self.subscription_repo.get_owner_telegram_ids(deactivated))
+            except Exception as e:
+                logger.error(f"Failed to invalidate profiles after expiry: {e}")
+            logger.info(f"Deactivated {len(deactivated)} expired subscriptions")
+        return deactivated
+
+    async def run(self):
+        """Фоновый цикл деактивации."""
+        refill_at = 0.0
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                # Куча опустела или пора подхватить новые/продленные подписки
+                if not self._heap or loop.time() >= refill_at:
+                    await self.refill()
+                    refill_at = loop.time() + settings.database.expiry_max_sleep
+
+                deactivated = await self.expire_due()
+                if deactivated and not self._heap:
+                    # Наступили все сроки кучи — за ними в индексе могут быть еще
+                    continue
+
+                timeout = refill_at - loop.time()
+                if self._heap:
+                    until_deadline = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                    timeout = min(timeout, until_deadline)
+            except Exception as e:
+                logger.error(f"Subscription expiry failed: {e}")
+                timeout = settings.database.expiry_max_sleep
+                refill_at = 0.0
+
+            await asyncio.sleep(max(timeout, 0))
+
+
+# Глобальный экземпляр сервиса деактивации подписок
+expiry_service = ExpiryService()
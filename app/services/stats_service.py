@@ -0,0 +1,156 @@
+"""
+Сервис сверки инкрементальных счетчиков статистики.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict
+
+from app.database.connection import unit_of_work
+from app.database.models import Payment, Subscription
+from app.database.repositories.base import BaseRepository
+from app.database.repositories.user_repository import UserRepository
+from app.database.repositories.subscription_repository import SubscriptionRepository
+from app.database.repositories.stats_repository import (
+    StatsRepository,
+    USERS_TOTAL,
+    USERS_ACTIVE,
+    USERS_BANNED,
+    USERS_TRIAL_USED,
+    USERS_CREATED_PREFIX,
+    SUBSCRIPTIONS_TOTAL,
+    SUBSCRIPTIONS_TRIAL,
+    SUBSCRIPTIONS_ACTIVE_FLAG,
+    PAYMENTS_TOTAL,
+    users_created_counter,
+    new_users_window_start,
+)
+from app.core.cache import invalidate_profiles
+from app.core.monitoring import stats_counter_drift
+from config.logging import get_logger
+
+logger = get_logger("stats_service")
+
+
+class StatsService:
+    """Сервис поддержки счетчиков stats_counters.
+
+    Репозитории обновляют счетчики при каждой записи, но массовые
+    операции и удаления их не затрагивают. Периодическая сверка
+    пересчитывает значения по исходным таблицам, исправляет счетчики на
+    величину расхождения и сообщает о нем.
+    """
+
+    def __init__(self):
+        self.user_repo = UserRepository()
+        self.subscription_repo = SubscriptionRepository()
+        self.payment_repo = BaseRepository(Payment)
+        self.stats_repo = StatsRepository()
+
+    async def reconcile(self) -> Dict[str, int]:
+        """Пересчет счетчиков по исходным таблицам.
+
+        Возвращает расхождения ``{счетчик: сохраненное - фактическое}``
+        для счетчиков, которые уже существовали.
+        """
+        since = new_users_window_start()
+        days = [since + timedelta(days=offset) for offset in range((datetime.utcnow().date() - since).days + 1)]
+        names = [
+            USERS_TOTAL,
+            USERS_ACTIVE,
+            USERS_BANNED,
+            USERS_TRIAL_USED,
+            SUBSCRIPTIONS_TOTAL,
+            SUBSCRIPTIONS_TRIAL,
+            SUBSCRIPTIONS_ACTIVE_FLAG,
+            PAYMENTS_TOTAL,
+        ] + [users_created_counter(day) for day in days]
+
+        async with unit_of_work():
+            # Строки счетчиков блокируются до подсчета: increment записей,
+            # завершившихся позже, дождется сверки и применится поверх нее
+            stored = await self.stats_repo.lock_counters(names)
+
+            users = await self.user_repo.count_users_stats()
+            subscriptions = await self.subscription_repo.aggregate_counts({
+                "total": None,
+                "trial": Subscription.is_trial == True,
+                "active_flag": Subscription.is_active == True,
+            })
+            created_by_day = await self.user_repo.count_created_by_day(since)
+
+            actual = {
+                USERS_TOTAL: users["total"],
+                USERS_ACTIVE: users["active"],
+                USERS_BANNED: users["banned"],
+                USERS_TRIAL_USED: users["trial_used"],
+                SUBSCRIPTIONS_TOTAL: subscriptions["total"],
+                SUBSCRIPTIONS_TRIAL: subscriptions["trial"],
+                SUBSCRIPTIONS_ACTIVE_FLAG: subscriptions["active_flag"],
+                PAYMENTS_TOTAL: await self.payment_repo.count(),
+            }
+            for day in days:
+                actual[users_created_counter(day)] = created_by_day.get(day, 0)
+
+            drift = {
+                name: stored[name] - value
+                for name, value in actual.items()
+                if name in stored and stored[name] != value
+            }
+
+            # Исправление — приращением, а не перезаписью значения
+            await self.stats_repo.increment({
+                name: value - stored.get(name, 0) for name, value in actual.items()
+            })
+            await self.stats_repo.prune_daily_counters(since)
+
+            # Счетчики рефералов хранятся в самих строках users
+            referrers_fixed = await self.user_repo.recount_referrals()
+
+        self._report_drift(actual, drift)
+        stats_counter_drift.labels(counter="users.referrals").set(len(referrers_fixed))
+        if referrers_fixed:
+            await invalidate_profiles(referrers_fixed)
+            logger.warning(f"Referral counters corrected for {len(referrers_fixed)} users")
+        return drift
+
+    async def reconcile_on_startup(self) -> bool:
+        """Сверка при запуске, только если счетчиков еще нет.
+
+        Полный пересчет читает таблицы целиком и держит соединение записи;
+        существующие счетчики сверяет периодическая задача. Возвращает,
+        выполнялась ли сверка.
+        """
+        if await self.stats_repo.exists():
+            return False
+        await self.reconcile()
+        return True
+
+    def _report_drift(self, actual: Dict[str, int], drift: Dict[str, int]):
+        """Экспорт и логирование расхождений."""
+        # Дневные счетчики сводим в одну метку, чтобы кардинальность была постоянной
+        daily_drift = sum(
+            value for name, value in drift.items() if name.startswith(USERS_CREATED_PREFIX)
+        )
+        for name in actual:
+            if not name.startswith(USERS_CREATED_PREFIX):
+                stats_counter_drift.labels(counter=name).set(drift.get(name, 0))
+        stats_counter_drift.labels(counter=USERS_CREATED_PREFIX.rstrip(":")).set(daily_drift)
+
+        if drift:
+            logger.warning(f"Stats counters drift corrected: {drift}")
+        else:
+            logger.info("Stats counters reconciled without drift")
+
+    async def run_reconciliation(self, interval: int):
+        """Фоновая периодическая сверка счетчиков."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Stats reconciliation failed: {e}")
+
+
+# Глобальный экземпляр сервиса статистики
+stats_service = StatsService()
@@ -0,0 +1,110 @@
+"""
+Буфер отложенной записи статистики трафика.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from app.database.repositories.subscription_repository import SubscriptionRepository
+from app.core.cache import invalidate_profiles
+from app.core.monitoring import traffic_buffer_depth, traffic_flush_duration
+from config.settings import settings
+from config.logging import get_logger
+
+logger = get_logger("traffic_service")
+
+# Накопленное состояние подписки: (абсолютное значение или None, прирост)
+_Pending = Tuple[Optional[int], int]
+
+
+class TrafficBuffer:
+    """Накопление обновлений трафика с отложенной массовой записью.
+
+    Источники передают либо абсолютные значения счетчика (``set_usage``),
+    либо приращения (``add_usage``). Обновления одной подписки сливаются
+    в памяти; запись в БД выполняется одним массовым UPDATE при накоплении
+    DATABASE_TRAFFIC_FLUSH_SIZE подписок, раз в
+    DATABASE_TRAFFIC_FLUSH_INTERVAL секунд и при остановке приложения.
+    """
+
+    def __init__(self):
+        self.subscription_repo = SubscriptionRepository()
+        self._pending: Dict[int, _Pending] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def set_usage(self, subscription_id: int, traffic_used: int):
+        """Абсолютное значение счетчика трафика (заменяет накопленное)."""
+        self._pending[subscription_id] = (traffic_used, 0)
+        self._after_add()
+
+    def add_usage(self, subscription_id: int, delta: int):
+        """Прирост трафика к текущему значению."""
+        total, pending_delta = self._pending.get(subscription_id, (None, 0))
+        self._pending[subscription_id] = (total, pending_delta + delta)
+        self._after_add()
+
+    def _after_add(self):
+        """Обновление метрики и запуск записи при достижении порога."""
+        traffic_buffer_depth.set(len(self._pending))
+        if len(self._pending) >= settings.database.traffic_flush_size:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Запись накопленных обновлений; возвращает число подписок."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            traffic_buffer_depth.set(0)
+
+            totals = {}
+            deltas = {}
+            for subscription_id, (total, delta) in batch.items():
+                if total is not None:
+                    totals[subscription_id] = total + delta
+                else:
+                    deltas[subscription_id] = delta
+
+            started = time.perf_counter()
+            try:
+                await self.subscription_repo.apply_traffic_usage(totals, deltas)
+            except Exception as e:
+                logger.error(f"Traffic flush failed, {len(batch)} updates kept in buffer: {e}")
+                self._restore(batch)
+                return 0
+            finally:
+                traffic_flush_duration.observe(time.perf_counter() - started)
+
+            try:
+                await invalidate_profiles(await self.subscription_repo.get_owner_telegram_ids(list(batch)))
+            except Exception as e:
+                logger.error(f"Failed to invalidate profiles after traffic flush: {e}")
+            return len(batch)
+
+    def _restore(self, batch: Dict[int, _Pending]):
+        """Возврат незаписанных обновлений с учетом поступивших за время записи."""
+        for subscription_id, (total, delta) in batch.items():
+            newer = self._pending.get(subscription_id)
+            if newer is None:
+                self._pending[subscription_id] = (total, delta)
+            elif newer[0] is None:
+                # Новые приращения поверх незаписанного состояния
+                self._pending[subscription_id] = (total, delta + newer[1])
+        traffic_buffer_depth.set(len(self._pending))
+
+    async def run(self, interval: int):
+        """Фоновая периодическая запись."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Traffic flush failed: {e}")
+
+
+# Глобальный буфер трафика
+traffic_buffer = TrafficBuffer()
@@ -2,14 +2,18 @@
 Сервис для работы с пользователями.
 """
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 
+from app.database.connection import unit_of_work
 from app.database.repositories.user_repository import UserRepository
 from app.database.repositories.subscription_repository import SubscriptionRepository
+from app.database.views import UserView, SubscriptionView
+from app.services.activity_service import activity_tracker
 from app.core.security import security_manager
-from app.core.cache import cache, cached
-from app.core.exceptions import UserNotFoundError, ValidationError
+from app.core.cache import cache, cached, invalidate_profiles, profile_cache_key
+from app.core.exceptions import DatabaseError, UserNotFoundError, ValidationError
+from config.settings import settings
 from config.logging import get_logger
 
 logger = get_logger("user_service")
@@ -30,22 +34,57 @@ class UserService:
         last_name: str = None,
         referred_by: str = None
     ) -> dict:
-        """Получение или создание пользователя."""
+        """Получение или создание пользователя.
+
+        Поиск выполняется по сессии чтения; транзакция записи открывается
+        только для нового пользователя.
+        """
         try:
-            # Проверяем существующего пользователя
             user = await self.user_repo.get_by_telegram_id(telegram_id)
-
             if user:
-                # Обновляем последнюю активность
-                await self.user_repo.update_last_activity(user.id)
-
-                # Инвалидируем кэш
-                await cache.delete(f"user:{telegram_id}")
+                # Последняя активность записывается в БД отложенно
+                activity_tracker.touch(telegram_id)
 
                 logger.info(f"User {telegram_id} found and activity updated")
                 return self._user_to_dict(user)
 
-            # Создаем нового пользователя
+            try:
+                created, referral_attached = await self._create_user(
+                    telegram_id, username, first_name, last_name, referred_by
+                )
+            except DatabaseError:
+                # Пользователя мог создать параллельный запрос (конфликт
+                # уникального telegram_id) — перечитываем с основной БД
+                async with unit_of_work():
+                    user = await self.user_repo.get_by_telegram_id(telegram_id)
+                    if not user:
+                        raise
+                    return self._user_to_dict(user)
+
+            # Счетчики пригласившего зафиксированы — сбрасываем его профиль
+            if referral_attached:
+                await self._invalidate_referrer(referred_by)
+            logger.info(f"New user created: {telegram_id}")
+            return created
+
+        except Exception as e:
+            logger.error(f"Failed to get or create user {telegram_id}: {e}")
+            raise
+
+    async def _create_user(
+        self,
+        telegram_id: int,
+        username: str,
+        first_name: str,
+        last_name: str,
+        referred_by: str
+    ) -> Tuple[dict, bool]:
+        """Создание пользователя и привязка реферала одной транзакцией.
+
+        Возвращает пользователя и признак привязки реферала.
+        """
+        referral_attached = False
+        async with unit_of_work():
             referral_code = security_manager.generate_referral_code()
 
             user = await self.user_repo.create_user(
@@ -58,14 +97,12 @@ class UserService:
 
             # Обработка реферала
             if referred_by and referred_by != referral_code:
-                await self._process_referral(user.id, referred_by)
+                user_id = user.id
+                referral_attached = await self._process_referral(user_id, referred_by)
+                # Откат SAVEPOINT привязки сбрасывает загруженные атрибуты
+                user = await self.user_repo.get_by_id(user_id)
 
-            logger.info(f"New user created: {telegram_id}")
-            return self._user_to_dict(user)
-
-        except Exception as e:
-            logger.error(f"Failed to get or create user {telegram_id}: {e}")
-            raise
+            return self._user_to_dict(user), referral_attached
 
     @cached(ttl=300, key_prefix="user")
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[dict]:
@@ -81,26 +118,39 @@ class UserService:
             raise
 
     async def get_user_profile(self, telegram_id: int) -> dict:
-        """Получение полного профиля пользователя."""
-        try:
-            user = await self.user_repo.get_by_telegram_id(telegram_id)
-            if not user:
-                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+        """Получение полного профиля пользователя.
 
-            # Получаем подписки пользователя
-            subscriptions = await self.subscription_repo.get_user_subscriptions(user.id)
-            active_subscription = await self.subscription_repo.get_active_subscription(user.id)
-
-            # Статистика рефералов
-            referral_stats = await self.user_repo.get_referral_stats(user.referral_code)
-
-            profile = self._user_to_dict(user)
-            profile.update({
-                "subscriptions_count": len(subscriptions),
-                "has_active_subscription": active_subscription is not None,
-                "active_subscription": self._subscription_to_dict(active_subscription) if active_subscription else None,
-                "referral_stats": referral_stats
-            })
+        Профиль собирается одним запросом и кэшируется на
+        REDIS_PROFILE_TTL секунд. Записи через сервис и массовые записи
+        фоновых сервисов сбрасывают кэш затронутых пользователей
+        (``invalidate_profiles``).
+        """
+        try:
+            cache_key = profile_cache_key(telegram_id)
+            profile = await cache.get(cache_key)
+
+            if profile is None:
+                view = await self.user_repo.get_profile(telegram_id)
+                if not view:
+                    raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+
+                profile = view.user.to_dict()
+                profile.update({
+                    "subscriptions_count": view.subscriptions_count,
+                    "has_active_subscription": view.active_subscription is not None,
+                    "active_subscription": self._subscription_to_dict(view.active_subscription),
+                    # Статистика рефералов — из счетчиков пользователя
+                    "referral_stats": {
+                        "total_referred": view.user.referral_count,
+                        "active_referred": view.user.referral_active_count
+                    }
+                })
+                await cache.set(cache_key, profile, ttl=settings.redis.profile_ttl)
+
+            # Активность, еще не записанная в БД, всегда новее сохраненной
+            pending = activity_tracker.pending(telegram_id)
+            if pending:
+                profile["last_activity"] = pending.isoformat()
 
             return profile
         except Exception as e:
@@ -117,10 +167,6 @@ class UserService:
     ) -> bool:
         """Обновление информации о пользователе."""
         try:
-            user = await self.user_repo.get_by_telegram_id(telegram_id)
-            if not user:
-                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
-
             update_data = {}
             if username is not None:
                 update_data["username"] = username
@@ -132,11 +178,17 @@ class UserService:
                 # Здесь можно добавить валидацию email
                 update_data["email"] = email
 
-            if update_data:
-                await self.user_repo.update(user.id, **update_data)
+            async with unit_of_work():
+                user = await self.user_repo.get_by_telegram_id(telegram_id)
+                if not user:
+                    raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+
+                if update_data:
+                    await self.user_repo.update(user.id, **update_data)
 
+            if update_data:
                 # Инвалидируем кэш
-                await cache.delete(f"user:{telegram_id}")
+                await self._invalidate_cache(telegram_id)
 
                 logger.info(f"User {telegram_id} info updated")
                 return True
@@ -148,45 +200,89 @@ class UserService:
 
     async def ban_user(self, telegram_id: int, banned: bool = True) -> bool:
         """Блокировка/разблокировка пользователя."""
+        return await self.ban_user_with_subscriptions(telegram_id, banned) is not None
+
+    async def ban_user_with_subscriptions(self, telegram_id: int, banned: bool = True) -> Optional[List[int]]:
+        """Блокировка/разблокировка пользователя вместе с его подписками.
+
+        При блокировке все активные подписки деактивируются, при
+        разблокировке активируются снова неистекшие подписки, которые
+        деактивировала блокировка, — одним UPDATE в той же транзакции, что
+        и смена флага. Возвращает id затронутых подписок (для отзыва
+        доступа на VPN-панели) или None, если пользователь удален во время
+        операции. Если пользователь не найден, выбрасывается
+        UserNotFoundError; прочие ошибки пробрасываются после отката всей
+        транзакции, включая смену флага.
+        """
         try:
-            user = await self.user_repo.get_by_telegram_id(telegram_id)
-            if not user:
-                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+            subscription_ids = []
+            async with unit_of_work():
+                user = await self.user_repo.get_by_telegram_id(telegram_id)
+                if not user:
+                    raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+
+                was_banned = user.is_banned
+                success = await self.user_repo.ban_user(user.id, banned)
+
+                # Подписки меняем только при фактической смене состояния
+                if success and was_banned != banned:
+                    if banned:
+                        subscription_ids = await self.subscription_repo.deactivate_user_subscriptions(user.id)
+                    else:
+                        subscription_ids = await self.subscription_repo.reactivate_user_subscriptions(user.id)
+
+            if not success:
+                return None
 
-            success = await self.user_repo.ban_user(user.id, banned)
+            # Инвалидируем кэш
+            await self._invalidate_cache(telegram_id)
+            if user.referred_by and was_banned != banned:
+                # Изменился счетчик активных рефералов пригласившего
+                await self._invalidate_referrer(user.referred_by)
 
-            if success:
-                # Инвалидируем кэш
-                await cache.delete(f"user:{telegram_id}")
+            logger.info(
+                f"User {telegram_id} {'banned' if banned else 'unbanned'}, "
+                f"subscriptions affected: {len(subscription_ids)}"
+            )
+            return subscription_ids
+        except Exception as e:
+            logger.error(f"Failed to ban/unban user {telegram_id}: {e}")
+            raise
 
-                # Если пользователь заблокирован, деактивируем его подписки
-                if banned:
-                    subscriptions = await self.subscription_repo.get_user_subscriptions(user.id)
-                    for subscription in subscriptions:
-                        await self.subscription_repo.deactivate_subscription(subscription.id)
+    async def delete_user(self, telegram_id: int) -> List[int]:
+        """Удаление пользователя; возвращает id удаленных подписок."""
+        try:
+            user = await self.user_repo.get_by_telegram_id(telegram_id)
+            if not user:
+                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
 
-                logger.info(f"User {telegram_id} {'banned' if banned else 'unbanned'}")
+            subscription_ids = await self.user_repo.delete_user(user.id)
+            if subscription_ids is None:
+                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
 
-            return success
+            await self._invalidate_cache(telegram_id)
+            logger.info(f"User {telegram_id} deleted, subscriptions removed: {len(subscription_ids)}")
+            return subscription_ids
         except Exception as e:
-            logger.error(f"Failed to ban/unban user {telegram_id}: {e}")
+            logger.error(f"Failed to delete user {telegram_id}: {e}")
             raise
 
     async def use_trial(self, telegram_id: int) -> bool:
         """Отметка об использовании пробного периода."""
         try:
-            user = await self.user_repo.get_by_telegram_id(telegram_id)
-            if not user:
-                raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
+            async with unit_of_work():
+                user = await self.user_repo.get_by_telegram_id(telegram_id)
+                if not user:
+                    raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
 
-            if user.trial_used:
-                raise ValidationError("User has already used trial period")
+                if user.trial_used:
+                    raise ValidationError("User has already used trial period")
 
-            success = await self.user_repo.set_trial_used(user.id)
+                success = await self.user_repo.set_trial_used(user.id)
 
             if success:
                 # Инвалидируем кэш
-                await cache.delete(f"user:{telegram_id}")
+                await self._invalidate_cache(telegram_id)
                 logger.info(f"Trial marked as used for user {telegram_id}")
 
             return success
@@ -214,7 +310,8 @@ class UserService:
                     limit=limit,
                     offset=offset,
                     order_by="created_at",
-                    filters=filters
+                    filters=filters,
+                    view=UserView
                 )
 
             return [self._user_to_dict(user) for user in users]
@@ -222,6 +319,38 @@ class UserService:
             logger.error(f"Failed to get users list: {e}")
             raise
 
+    async def get_users_page(
+        self,
+        limit: int = 50,
+        cursor: str = None,
+        active_only: bool = True,
+        offset: int = 0
+    ) -> dict:
+        """Страница списка пользователей с keyset пагинацией.
+
+        Без ``cursor`` страница начинается с ``offset``.
+        """
+        try:
+            filters = {}
+            if active_only:
+                filters.update({"is_active": True, "is_banned": False})
+
+            users, next_cursor = await self.user_repo.get_page(
+                limit=limit,
+                cursor=cursor,
+                filters=filters,
+                view=UserView,
+                offset=offset
+            )
+
+            return {
+                "items": [self._user_to_dict(user) for user in users],
+                "next_cursor": next_cursor
+            }
+        except Exception as e:
+            logger.error(f"Failed to get users page: {e}")
+            raise
+
     async def get_users_statistics(self) -> dict:
         """Получение статистики пользователей."""
         try:
@@ -230,62 +359,55 @@ class UserService:
             logger.error(f"Failed to get users statistics: {e}")
             raise
 
-    async def _process_referral(self, user_id: int, referral_code: str):
-        """Обработка реферала."""
-        try:
-            # Находим пользователя, который пригласил
-            referrer = await self.user_repo.get_by_field("referral_code", referral_code)
-            if referrer:
-                # Увеличиваем счетчик рефералов
-                await self.user_repo.update(
-                    referrer.id,
-                    referral_count=referrer.referral_count + 1
-                )
+    async def _process_referral(self, user_id: int, referral_code: str) -> bool:
+        """Обработка реферала; возвращает True, если реферал привязан.
 
-                # Отмечаем у нового пользователя, кто его пригласил
-                await self.user_repo.update(
-                    user_id,
-                    referred_by=referral_code
-                )
+        Ошибка привязки не мешает созданию пользователя: привязка
+        выполняется в SAVEPOINT и откатывается только она.
+        """
+        try:
+            # Привязка и увеличение счетчиков пригласившего — одной транзакцией
+            async with unit_of_work() as session:
+                async with session.begin_nested():
+                    attached = await self.user_repo.attach_referral(user_id, referral_code)
 
+            if attached:
                 logger.info(f"Referral processed: {referral_code} -> user {user_id}")
+            return attached
         except Exception as e:
             logger.error(f"Failed to process referral {referral_code}: {e}")
+            return False
+
+    async def _invalidate_cache(self, telegram_id: int):
+        """Сброс кэшированных данных пользователя."""
+        await cache.delete(f"user:{telegram_id}")
+        await cache.delete(profile_cache_key(telegram_id))
+
+    async def _invalidate_referrer(self, referral_code: str):
+        """Сброс кэша профиля пригласившего (изменились его счетчики рефералов)."""
+        referrer = await self.user_repo.get_by_field("referral_code", referral_code)
+        if referrer:
+            await invalidate_profiles([referrer.telegram_id])
 
     def _user_to_dict(self, user) -> dict:
-        """Преобразование пользователя в словарь."""
+        """Преобразование пользователя (сущности или UserView) в словарь."""
         if not user:
             return None
 
-        return {
-            "id": user.id,
-            "telegram_id": user.telegram_id,
-            "username": user.username,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "is_active": user.is_active,
-            "is_banned": user.is_banned,
-            "trial_used": user.trial_used,
-            "referral_code": user.referral_code,
-            "referred_by": user.referred_by,
-            "referral_count": user.referral_count,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "last_activity": user.last_activity.isoformat() if user.last_activity else None
-        }
+        if not isinstance(user, UserView):
+            user = UserView.from_entity(user)
+        data = user.to_dict()
+
+        # Учитываем активность, еще не записанную в БД
+        last_activity = activity_tracker.merge(user.telegram_id, user.last_activity)
+        data["last_activity"] = last_activity.isoformat() if last_activity else None
+        return data
 
     def _subscription_to_dict(self, subscription) -> dict:
-        """Преобразование подписки в словарь."""
+        """Преобразование подписки (сущности или SubscriptionView) в словарь."""
         if not subscription:
             return None
 
-        return {
-            "id": subscription.id,
-            "server_name": subscription.server.name if subscription.server else None,
-            "tariff_name": subscription.tariff.name if subscription.tariff else None,
-            "start_date": subscription.start_date.isoformat() if subscription.start_date else None,
-            "end_date": subscription.end_date.isoformat() if subscription.end_date else None,
-            "is_active": subscription.is_active,
-            "is_trial": subscription.is_trial,
-            "traffic_used": subscription.traffic_used
-        }
+        if not isinstance(subscription, SubscriptionView):
+            subscription = SubscriptionView.from_entity(subscription)
+        return subscription.to_dict()
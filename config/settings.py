@@ -6,7 +6,7 @@
 """
 
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings
 from cryptography.fernet import Fernet
@@ -17,8 +17,63 @@ class DatabaseSettings(BaseSettings):
 
     url: str = Field(default="sqlite:///data/database.db", alias="DATABASE_URL")
     echo: bool = Field(default=False, alias="DATABASE_ECHO")
+    auto_migrate: bool = Field(default=True, alias="DATABASE_AUTO_MIGRATE")
     pool_size: int = Field(default=10, alias="DATABASE_POOL_SIZE")
     max_overflow: int = Field(default=20, alias="DATABASE_MAX_OVERFLOW")
+    query_cache_size: int = Field(default=500, alias="DATABASE_QUERY_CACHE_SIZE")
+    prepared_statement_cache_size: int = Field(default=100, alias="DATABASE_PREPARED_STATEMENT_CACHE_SIZE")
+    bulk_chunk_size: int = Field(default=1000, alias="DATABASE_BULK_CHUNK_SIZE")
+    stats_reconcile_interval: int = Field(default=3600, alias="DATABASE_STATS_RECONCILE_INTERVAL")
+    expiry_heap_size: int = Field(default=1000, alias="DATABASE_EXPIRY_HEAP_SIZE")
+    expiry_max_sleep: int = Field(default=60, alias="DATABASE_EXPIRY_MAX_SLEEP")  # seconds
+    traffic_flush_size: int = Field(default=1000, alias="DATABASE_TRAFFIC_FLUSH_SIZE")
+    traffic_flush_interval: int = Field(default=30, alias="DATABASE_TRAFFIC_FLUSH_INTERVAL")  # seconds
+    activity_flush_interval: int = Field(default=60, alias="DATABASE_ACTIVITY_FLUSH_INTERVAL")  # seconds
+    slow_query_threshold: float = Field(default=0.5, alias="DATABASE_SLOW_QUERY_THRESHOLD")  # seconds, 0 — выключено
+    statement_timeout: float = Field(default=30, alias="DATABASE_STATEMENT_TIMEOUT")  # seconds, 0 — без ограничения
+    statement_timeouts: Dict[str, float] = Field(
+        default={
+            "UserRepository.search_users": 5,
+            "UserRepository.get_users_stats": 5,
+            # Сверка счетчиков в фоне читает таблицы целиком
+            "UserRepository.count_users_stats": 300,
+            "UserRepository.count_created_by_day": 300,
+            "UserRepository.recount_referrals": 300,
+            "SubscriptionRepository.aggregate_counts": 300,
+            "BaseRepository.count": 300,
+        },
+        alias="DATABASE_STATEMENT_TIMEOUTS"
+    )  # JSON: {"Класс.метод": seconds}
+
+    # Реплики для чтения
+    # str в типе: pydantic-settings не декодирует значение как JSON, и
+    # список через запятую разбирает валидатор
+    replica_urls: Union[str, List[str]] = Field(default=[], alias="DATABASE_REPLICA_URLS")
+    replica_max_lag: float = Field(default=5.0, alias="DATABASE_REPLICA_MAX_LAG")  # seconds
+    replica_check_interval: int = Field(default=10, alias="DATABASE_REPLICA_CHECK_INTERVAL")  # seconds
+
+    # Профиль производительности SQLite
+    sqlite_journal_mode: str = Field(default="WAL", alias="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: str = Field(default="NORMAL", alias="SQLITE_SYNCHRONOUS")
+    sqlite_mmap_size: int = Field(default=268435456, alias="SQLITE_MMAP_SIZE")  # 256MB
+    sqlite_cache_size: int = Field(default=-65536, alias="SQLITE_CACHE_SIZE")  # 64MB (KiB при отрицательном значении)
+    sqlite_busy_timeout: int = Field(default=5000, alias="SQLITE_BUSY_TIMEOUT")  # ms
+    sqlite_temp_store: str = Field(default="MEMORY", alias="SQLITE_TEMP_STORE")
+    sqlite_read_pool_size: int = Field(default=4, alias="SQLITE_READ_POOL_SIZE")
+    sqlite_write_queue: bool = Field(default=False, alias="SQLITE_WRITE_QUEUE")
+    sqlite_write_batch_size: int = Field(default=64, alias="SQLITE_WRITE_BATCH_SIZE")
+    sqlite_busy_retries: int = Field(default=5, alias="SQLITE_BUSY_RETRIES")
+    sqlite_busy_backoff: float = Field(default=0.05, alias="SQLITE_BUSY_BACKOFF")  # seconds
+
+    # Резервное копирование
+    backup_dir: str = Field(default="backups", alias="DATABASE_BACKUP_DIR")
+    backup_compression: str = Field(default="gzip", alias="DATABASE_BACKUP_COMPRESSION")  # none, gzip, zstd
+
+    @validator("replica_urls", pre=True)
+    def parse_replica_urls(cls, v):
+        if isinstance(v, str):
+            return [url.strip() for url in v.split(",") if url.strip()]
+        return v
 
 
 class RedisSettings(BaseSettings):
@@ -26,6 +81,7 @@ class RedisSettings(BaseSettings):
 
     url: str = Field(default="redis://localhost:6379/0", alias="REDIS_URL")
     ttl: int = Field(default=3600, alias="REDIS_TTL")
+    profile_ttl: int = Field(default=30, alias="REDIS_PROFILE_TTL")
     max_connections: int = Field(default=10, alias="REDIS_MAX_CONNECTIONS")
 
 
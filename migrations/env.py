@@ -2,8 +2,10 @@
 Alembic environment configuration.
 """
 
+import asyncio
 from logging.config import fileConfig
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 import os
 import sys
@@ -12,20 +14,32 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app.database.models import Base
+from app.database.connection import _normalize_url
+from app.database.search import is_search_index_object
 from config.settings import settings
 
 # Alembic Config object
 config = context.config
 
+# Соединение, переданное приложением (app.database.schema.upgrade_schema)
+shared_connection = config.attributes.get("connection")
+
 # Interpret the config file for Python logging
-if config.config_file_name is not None:
+# (при запуске из приложения логирование уже настроено)
+if config.config_file_name is not None and shared_connection is None:
     fileConfig(config.config_file_name)
 
 # Метаданные для автогенерации миграций
 target_metadata = Base.metadata
 
 # Установка URL базы данных из настроек
-config.set_main_option('sqlalchemy.url', settings.database.url)
+# (% экранируется для configparser, например в пароле)
+config.set_main_option('sqlalchemy.url', _normalize_url(settings.database.url).replace('%', '%%'))
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Индекс поиска создается приложением вне миграций — автогенерация его не трогает."""
+    return not is_search_index_object(name, type_)
 
 
 def run_migrations_offline() -> None:
@@ -36,27 +50,47 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
         context.run_migrations()
 
 
-def run_migrations_online() -> None:
-    """Запуск миграций в 'online' режиме."""
-    connectable = engine_from_config(
+def do_run_migrations(connection) -> None:
+    """Миграции на готовом синхронном соединении."""
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Миграции через async движок (aiosqlite, asyncpg)."""
+    connectable = async_engine_from_config(
         config.get_section(config.config_ini_section),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
 
-        with context.begin_transaction():
-            context.run_migrations()
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Запуск миграций в 'online' режиме."""
+    if shared_connection is not None:
+        do_run_migrations(shared_connection)
+    else:
+        asyncio.run(run_async_migrations())
 
 
 if context.is_offline_mode():
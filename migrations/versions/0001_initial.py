@@ -0,0 +1,190 @@
+"""Initial schema
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+Схема, которую раньше создавал Base.metadata.create_all при каждом
+запуске. Существующие базы без таблицы alembic_version помечаются этой
+ревизией при первом запуске (см. app.database.schema).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bot_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=100), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('image_path', sa.String(length=500), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('parse_mode', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bot_messages_id'), 'bot_messages', ['id'], unique=False)
+    op.create_index(op.f('ix_bot_messages_key'), 'bot_messages', ['key'], unique=True)
+
+    op.create_table('promocodes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=100), nullable=False),
+        sa.Column('discount_percent', sa.Integer(), nullable=False),
+        sa.Column('discount_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('usage_limit', sa.Integer(), nullable=True),
+        sa.Column('usage_count', sa.Integer(), nullable=False),
+        sa.Column('valid_from', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('valid_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_promocodes_code'), 'promocodes', ['code'], unique=True)
+    op.create_index(op.f('ix_promocodes_id'), 'promocodes', ['id'], unique=False)
+
+    op.create_table('servers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('host', sa.String(length=255), nullable=False),
+        sa.Column('port', sa.Integer(), nullable=False),
+        sa.Column('xui_url', sa.String(length=500), nullable=False),
+        sa.Column('xui_username', sa.String(length=255), nullable=False),
+        sa.Column('xui_password', sa.Text(), nullable=False),
+        sa.Column('xui_secret_path', sa.String(length=255), nullable=False),
+        sa.Column('inbound_id', sa.Integer(), nullable=False),
+        sa.Column('inbound_id_trial', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('max_users', sa.Integer(), nullable=False),
+        sa.Column('current_users', sa.Integer(), nullable=False),
+        sa.Column('country_code', sa.String(length=10), nullable=True),
+        sa.Column('city', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_health_check', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_servers_id'), 'servers', ['id'], unique=False)
+
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=True),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('first_name', sa.String(length=255), nullable=True),
+        sa.Column('last_name', sa.String(length=255), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('is_banned', sa.Boolean(), nullable=False),
+        sa.Column('trial_used', sa.Boolean(), nullable=False),
+        sa.Column('referral_code', sa.String(length=50), nullable=True),
+        sa.Column('referred_by', sa.String(length=50), nullable=True),
+        sa.Column('referral_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_activity', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_users_telegram_id_active', 'users', ['telegram_id', 'is_active'], unique=False)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_referral_code'), 'users', ['referral_code'], unique=True)
+    op.create_index(op.f('ix_users_telegram_id'), 'users', ['telegram_id'], unique=True)
+
+    op.create_table('tariffs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('duration_days', sa.Integer(), nullable=False),
+        sa.Column('speed_limit', sa.Integer(), nullable=True),
+        sa.Column('traffic_limit', sa.BigInteger(), nullable=True),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('is_trial', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tariffs_id'), 'tariffs', ['id'], unique=False)
+
+    op.create_table('user_activities',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('activity_type', sa.String(length=50), nullable=False),
+        sa.Column('activity_data', sa.Text(), nullable=True),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('user_agent', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_user_activity_type_created', 'user_activities', ['activity_type', 'created_at'], unique=False)
+    op.create_index(op.f('ix_user_activities_activity_type'), 'user_activities', ['activity_type'], unique=False)
+    op.create_index(op.f('ix_user_activities_id'), 'user_activities', ['id'], unique=False)
+
+    op.create_table('subscriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('tariff_id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('end_date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('vless_config', sa.Text(), nullable=True),
+        sa.Column('client_id', sa.String(length=255), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('is_trial', sa.Boolean(), nullable=False),
+        sa.Column('traffic_used', sa.BigInteger(), nullable=False),
+        sa.Column('last_traffic_update', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ),
+        sa.ForeignKeyConstraint(['tariff_id'], ['tariffs.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_subscriptions_end_date', 'subscriptions', ['end_date'], unique=False)
+    op.create_index('idx_subscriptions_user_active', 'subscriptions', ['user_id', 'is_active'], unique=False)
+    op.create_index(op.f('ix_subscriptions_id'), 'subscriptions', ['id'], unique=False)
+
+    op.create_table('payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('subscription_id', sa.Integer(), nullable=True),
+        sa.Column('external_id', sa.String(length=255), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('payment_method', sa.String(length=50), nullable=False),
+        sa.Column('payment_system', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('metadata', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('paid_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['subscription_id'], ['subscriptions.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_payments_status_created', 'payments', ['status', 'created_at'], unique=False)
+    op.create_index(op.f('ix_payments_external_id'), 'payments', ['external_id'], unique=False)
+    op.create_index(op.f('ix_payments_id'), 'payments', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table('payments')
+    op.drop_table('subscriptions')
+    op.drop_table('user_activities')
+    op.drop_table('tariffs')
+    op.drop_table('users')
+    op.drop_table('servers')
+    op.drop_table('promocodes')
+    op.drop_table('bot_messages')
@@ -0,0 +1,153 @@
+"""Stats counters, active referral counts and query indexes
+
+Revision ID: 0002_stats_counters
+Revises: 0001_initial
+Create Date: 2026-10-17 00:00:00
+
+Таблица счетчиков stats_counters, users.referral_active_count и индексы
+запросов репозиториев. Счетчики заполняются по текущим данным, поэтому
+база, созданная до перехода на Alembic, сразу получает точную статистику.
+"""
+
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_stats_counters'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+# Окно дневных счетчиков новых пользователей
+# (app.database.repositories.stats_repository.new_users_window_start)
+_NEW_USERS_WINDOW_DAYS = 30
+
+_users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+    sa.column('is_banned', sa.Boolean),
+    sa.column('trial_used', sa.Boolean),
+    sa.column('referral_code', sa.String),
+    sa.column('referred_by', sa.String),
+    sa.column('referral_count', sa.Integer),
+    sa.column('referral_active_count', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+_subscriptions = sa.table(
+    'subscriptions',
+    sa.column('id', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+    sa.column('is_trial', sa.Boolean),
+)
+_payments = sa.table('payments', sa.column('id', sa.Integer))
+
+
+def _count_if(condition):
+    return sa.func.coalesce(sa.func.sum(sa.case((condition, 1), else_=0)), 0)
+
+
+def _backfill_referral_counts():
+    referred = _users.alias('referred')
+    total = (
+        sa.select(sa.func.count(referred.c.id))
+        .where(referred.c.referred_by == _users.c.referral_code)
+        .scalar_subquery()
+    )
+    active = (
+        sa.select(sa.func.count(referred.c.id))
+        .where(
+            referred.c.referred_by == _users.c.referral_code,
+            referred.c.is_active == sa.true(),
+            referred.c.is_banned == sa.false(),
+        )
+        .scalar_subquery()
+    )
+    op.execute(
+        _users.update()
+        .where(_users.c.referral_code.is_not(None))
+        .values(referral_count=total, referral_active_count=active)
+    )
+
+
+def _counter_rows(bind):
+    users = bind.execute(sa.select(
+        sa.func.count(_users.c.id),
+        _count_if(sa.and_(_users.c.is_active == sa.true(), _users.c.is_banned == sa.false())),
+        _count_if(_users.c.is_banned == sa.true()),
+        _count_if(_users.c.trial_used == sa.true()),
+    )).one()
+    subscriptions = bind.execute(sa.select(
+        sa.func.count(_subscriptions.c.id),
+        _count_if(_subscriptions.c.is_trial == sa.true()),
+        _count_if(_subscriptions.c.is_active == sa.true()),
+    )).one()
+    payments = bind.execute(sa.select(sa.func.count(_payments.c.id))).scalar()
+
+    counters = {
+        'users.total': users[0],
+        'users.active': users[1],
+        'users.banned': users[2],
+        'users.trial_used': users[3],
+        'subscriptions.total': subscriptions[0],
+        'subscriptions.trial': subscriptions[1],
+        'subscriptions.active_flag': subscriptions[2],
+        'payments.total': payments,
+    }
+
+    today = datetime.utcnow().date()
+    since = today - timedelta(days=_NEW_USERS_WINDOW_DAYS)
+    day = sa.func.date(_users.c.created_at)
+    created_by_day = {
+        str(value): count
+        for value, count in bind.execute(
+            sa.select(day, sa.func.count(_users.c.id))
+            .where(_users.c.created_at >= datetime.combine(since, datetime.min.time()))
+            .group_by(day)
+        )
+    }
+    for offset in range((today - since).days + 1):
+        name = (since + timedelta(days=offset)).isoformat()
+        counters[f'users.created:{name}'] = created_by_day.get(name, 0)
+
+    return [{'name': name, 'value': int(value)} for name, value in counters.items()]
+
+
+def upgrade() -> None:
+    stats_counters = op.create_table('stats_counters',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    op.add_column('users', sa.Column('referral_active_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.create_index('idx_users_created_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('idx_users_referred_by', 'users', ['referred_by'], unique=False)
+    op.create_index('idx_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+    op.create_index('idx_subscriptions_active_end', 'subscriptions', ['is_active', 'end_date'], unique=False)
+    op.create_index('idx_subscriptions_created_id', 'subscriptions', ['created_at', 'id'], unique=False)
+    op.create_index('idx_subscriptions_server_active', 'subscriptions', ['server_id', 'is_active'], unique=False)
+    op.create_index('idx_payments_user_id', 'payments', ['user_id'], unique=False)
+
+    _backfill_referral_counts()
+    op.bulk_insert(stats_counters, _counter_rows(op.get_bind()))
+
+
+def downgrade() -> None:
+    op.drop_index('idx_payments_user_id', table_name='payments')
+    op.drop_index('idx_subscriptions_server_active', table_name='subscriptions')
+    op.drop_index('idx_subscriptions_created_id', table_name='subscriptions')
+    op.drop_index('idx_subscriptions_active_end', table_name='subscriptions')
+    op.drop_index('idx_users_username_lower', table_name='users')
+    op.drop_index('idx_users_referred_by', table_name='users')
+    op.drop_index('idx_users_created_id', table_name='users')
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('referral_active_count')
+
+    op.drop_table('stats_counters')
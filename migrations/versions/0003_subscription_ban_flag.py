@@ -0,0 +1,56 @@
+"""Subscriptions suspended by a user ban
+
+Revision ID: 0003_subscription_ban_flag
+Revises: 0002_stats_counters
+Create Date: 2026-10-17 00:00:00
+
+Колонка subscriptions.suspended_by_ban: разблокировка пользователя
+активирует только подписки, которые деактивировала блокировка. Для уже
+заблокированных пользователей метка ставится на их неактивные
+неистекшие подписки — раньше разблокировка активировала именно их.
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_subscription_ban_flag'
+down_revision = '0002_stats_counters'
+branch_labels = None
+depends_on = None
+
+_users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('is_banned', sa.Boolean),
+)
+_subscriptions = sa.table(
+    'subscriptions',
+    sa.column('user_id', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+    sa.column('end_date', sa.DateTime),
+    sa.column('suspended_by_ban', sa.Boolean),
+)
+
+
+def upgrade() -> None:
+    op.add_column('subscriptions', sa.Column('suspended_by_ban', sa.Boolean(), server_default='0', nullable=False))
+
+    banned_users = sa.select(_users.c.id).where(_users.c.is_banned == sa.true())
+    op.execute(
+        _subscriptions.update()
+        .where(
+            _subscriptions.c.user_id.in_(banned_users),
+            _subscriptions.c.is_active == sa.false(),
+            _subscriptions.c.end_date > datetime.utcnow(),
+        )
+        .values(suspended_by_ban=True)
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('subscriptions') as batch_op:
+        batch_op.drop_column('suspended_by_ban')
@@ -0,0 +1,79 @@
+"""
+Тесты учета активности пользователей.
+"""
+
+import asyncio
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.database.query_plan import seed_database
+from app.database.repositories.user_repository import UserRepository
+from app.services.activity_service import ActivityTracker
+
+
+async def _last_activity(telegram_id: int) -> datetime:
+    user = await UserRepository().get_by_telegram_id(telegram_id)
+    return user.last_activity
+
+
+@pytest.mark.asyncio
+class TestActivityTracker:
+    """Тесты ActivityTracker."""
+
+    async def test_flush_coalesces_touches(self, setup_database):
+        """Отметки одного пользователя сливаются в последнюю и пишутся одним вызовом."""
+        await seed_database()
+        tracker = ActivityTracker()
+        latest = datetime.utcnow().replace(microsecond=0)
+
+        tracker.touch(1000020, latest - timedelta(minutes=5))
+        tracker.touch(1000020, latest)
+        tracker.touch(1000020, latest - timedelta(minutes=1))
+        tracker.touch(1000021, latest - timedelta(minutes=2))
+
+        with patch.object(
+            tracker.user_repo,
+            "update_last_activity_many",
+            wraps=tracker.user_repo.update_last_activity_many,
+        ) as update:
+            await tracker.flush()
+            assert await tracker.flush() == 0
+
+        update.assert_awaited_once_with({1000020: latest, 1000021: latest - timedelta(minutes=2)})
+        assert tracker.pending(1000020) is None
+        assert await _last_activity(1000020) == latest
+        assert await _last_activity(1000021) == latest - timedelta(minutes=2)
+
+    async def test_older_activity_does_not_overwrite(self, setup_database):
+        """Более раннее время не затирает записанное более позднее."""
+        await seed_database()
+        tracker = ActivityTracker()
+        latest = datetime.utcnow().replace(microsecond=0)
+
+        tracker.touch(1000022, latest)
+        await tracker.flush()
+        tracker.touch(1000022, latest - timedelta(hours=1))
+        await tracker.flush()
+
+        assert await _last_activity(1000022) == latest
+
+    async def test_flush_on_shutdown(self, setup_database):
+        """После отмены фоновой записи (остановка приложения) flush пишет накопленное."""
+        await seed_database()
+        tracker = ActivityTracker()
+        latest = datetime.utcnow().replace(microsecond=0)
+
+        task = asyncio.create_task(tracker.run(3600))
+        tracker.touch(1000023, latest)
+        await asyncio.sleep(0)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert tracker.pending(1000023) == latest
+
+        assert await tracker.flush() == 1
+        assert tracker.pending(1000023) is None
+        assert await _last_activity(1000023) == latest
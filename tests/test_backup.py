@@ -0,0 +1,86 @@
+"""
+Тесты резервного копирования.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+from unittest.mock import patch
+
+from app.database.backup import BackupEngine, BackupJob
+from config.settings import settings
+
+
+def _create_database(path: str, rows: int):
+    """База в режиме WAL на несколько тысяч страниц."""
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, payload TEXT)")
+    connection.executemany(
+        "INSERT INTO items (payload) VALUES (?)", [("x" * 1000,) for _ in range(rows)]
+    )
+    connection.commit()
+    connection.close()
+
+
+class TestSqliteBackup:
+    """Тесты online backup SQLite."""
+
+    def test_backup_finishes_under_concurrent_writes(self, tmp_path):
+        """Постоянная запись в источник не перезапускает копирование."""
+        source_path = str(tmp_path / "source.db")
+        backup_path = str(tmp_path / "backup.db")
+        _create_database(source_path, rows=10000)
+
+        stop = threading.Event()
+
+        def writer():
+            connection = sqlite3.connect(source_path, timeout=5)
+            while not stop.is_set():
+                connection.execute("INSERT INTO items (payload) VALUES ('written')")
+                connection.commit()
+            connection.close()
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+        try:
+            with patch.object(settings.database, "url", f"sqlite:///{source_path}"):
+                job = BackupEngine().start(backup_path, "none")
+                assert job.finished.wait(timeout=30)
+        finally:
+            stop.set()
+            writer_thread.join()
+
+        assert job.status == "done", job.error
+        backup = sqlite3.connect(backup_path)
+        try:
+            assert backup.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+            assert backup.execute("SELECT count(*) FROM items").fetchone()[0] >= 10000
+        finally:
+            backup.close()
+
+
+@pytest.mark.asyncio
+class TestPostgresBackup:
+    """Тесты копирования PostgreSQL."""
+
+    @pytest.mark.parametrize("url", [
+        "postgresql://user:p%40ss@db:5432/vpn",
+        "postgresql+psycopg2://user:p%40ss@db:5432/vpn",
+        "postgresql+asyncpg://user:p%40ss@db:5432/vpn",
+    ])
+    async def test_copy_engine_uses_asyncpg(self, tmp_path, url):
+        """URL с любым драйвером приводится к postgresql+asyncpg без потери параметров."""
+        job = BackupJob(id="pg", path=str(tmp_path / "pg"), compression="gzip")
+
+        with patch.object(settings.database, "url", url), \
+                patch("app.database.backup.create_async_engine", side_effect=RuntimeError("stop")) as create:
+            with pytest.raises(RuntimeError):
+                await BackupEngine()._backup_postgres(job)
+
+        copy_url = create.call_args.args[0]
+        assert copy_url.drivername == "postgresql+asyncpg"
+        assert (copy_url.username, copy_url.password, copy_url.host, copy_url.port, copy_url.database) == (
+            "user", "p@ss", "db", 5432, "vpn"
+        )
@@ -0,0 +1,212 @@
+"""
+Тесты операций записи BaseRepository на SQLite.
+"""
+
+import pytest
+from sqlalchemy import delete
+
+from app.core.exceptions import DatabaseError
+from app.database.connection import get_db_session, unit_of_work
+from app.database.models import User
+from app.database.repositories.base import BaseRepository
+
+# Диапазон telegram_id пользователей этих тестов
+_FIRST_ID, _LAST_ID = 2000000, 2000099
+
+
+async def _delete_test_users():
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.telegram_id.between(_FIRST_ID, _LAST_ID)))
+
+
+@pytest.fixture
+async def repo(setup_database):
+    """Репозиторий пользователей; строки из диапазона тестов удаляются."""
+    await _delete_test_users()
+    yield BaseRepository(User)
+    await _delete_test_users()
+
+
+def _user(telegram_id: int, **values) -> dict:
+    row = {"telegram_id": telegram_id, "username": f"bulk{telegram_id}", "first_name": "Bulk"}
+    row.update(values)
+    return row
+
+
+async def _by_telegram_id(repo: BaseRepository, telegram_ids) -> dict:
+    users = [await repo.get_by_field("telegram_id", telegram_id) for telegram_id in telegram_ids]
+    return {user.telegram_id: user for user in users if user is not None}
+
+
+@pytest.mark.asyncio
+class TestUpsertMany:
+    """Тесты upsert_many."""
+
+    async def test_conflicts_update_and_new_rows_insert(self, repo):
+        """Конфликтующие строки обновляются, новые вставляются; пачки любого размера."""
+        await repo.create_many([_user(2000001), _user(2000002)])
+
+        rows = [
+            _user(2000001, username="updated1"),
+            _user(2000002, username="updated2"),
+            _user(2000003),
+            _user(2000004),
+            _user(2000005),
+        ]
+        assert await repo.upsert_many(rows, index_elements=["telegram_id"], chunk_size=2) == 5
+
+        users = await _by_telegram_id(repo, range(2000001, 2000006))
+        assert sorted(users) == list(range(2000001, 2000006))
+        assert users[2000001].username == "updated1"
+        assert users[2000002].username == "updated2"
+        assert users[2000003].username == "bulk2000003"
+
+    async def test_update_fields_limit_updated_columns(self, repo):
+        """При конфликте меняются только update_fields."""
+        await repo.create_many([_user(2000011, first_name="Original")])
+
+        await repo.upsert_many(
+            [_user(2000011, username="renamed", first_name="Ignored")],
+            index_elements=["telegram_id"],
+            update_fields=["username"],
+        )
+
+        user = (await _by_telegram_id(repo, [2000011]))[2000011]
+        assert user.username == "renamed"
+        assert user.first_name == "Original"
+
+    async def test_empty_update_fields_do_nothing(self, repo):
+        """Пустой update_fields — ON CONFLICT DO NOTHING."""
+        await repo.create_many([_user(2000021, username="kept")])
+
+        await repo.upsert_many(
+            [_user(2000021, username="dropped"), _user(2000022)],
+            index_elements=["telegram_id"],
+            update_fields=[],
+        )
+
+        users = await _by_telegram_id(repo, [2000021, 2000022])
+        assert users[2000021].username == "kept"
+        assert 2000022 in users
+
+    async def test_other_unique_conflict_rolls_back_batch(self, repo):
+        """Конфликт по другому уникальному полю — DatabaseError и откат всей пачки."""
+        await repo.create_many([_user(2000031, referral_code="BULK31")])
+
+        with pytest.raises(DatabaseError):
+            await repo.upsert_many(
+                [_user(2000032), _user(2000033, referral_code="BULK31")],
+                index_elements=["telegram_id"],
+                chunk_size=1,
+            )
+
+        assert list(await _by_telegram_id(repo, [2000031, 2000032, 2000033])) == [2000031]
+
+
+@pytest.mark.asyncio
+class TestUpdateMany:
+    """Тесты update_many."""
+
+    async def test_updates_rows_by_primary_key(self, repo):
+        """Каждая строка обновляется по своему id, остальные не меняются."""
+        await repo.create_many([_user(telegram_id) for telegram_id in (2000041, 2000042, 2000043)])
+        users = await _by_telegram_id(repo, [2000041, 2000042, 2000043])
+
+        updated = await repo.update_many(
+            [
+                {"id": users[2000041].id, "username": "first"},
+                {"id": users[2000042].id, "username": "second", "is_active": False},
+            ],
+            chunk_size=1,
+        )
+
+        assert updated == 2
+        users = await _by_telegram_id(repo, [2000041, 2000042, 2000043])
+        assert (users[2000041].username, users[2000041].is_active) == ("first", True)
+        assert (users[2000042].username, users[2000042].is_active) == ("second", False)
+        assert users[2000043].username == "bulk2000043"
+
+    async def test_failed_row_rolls_back_batch(self, repo):
+        """Ошибка в одной строке откатывает уже обновленные пачки."""
+        await repo.create_many([_user(2000051), _user(2000052, referral_code="BULK52")])
+        users = await _by_telegram_id(repo, [2000051, 2000052])
+
+        with pytest.raises(DatabaseError):
+            await repo.update_many(
+                [
+                    {"id": users[2000051].id, "username": "changed"},
+                    {"id": users[2000051].id, "referral_code": "BULK52"},
+                ],
+                chunk_size=1,
+            )
+
+        assert (await _by_telegram_id(repo, [2000051]))[2000051].username == "bulk2000051"
+
+
+async def _collect_chunks(repo: BaseRepository, chunk_size: int, where=None) -> tuple:
+    """Размеры пачек и telegram_id строк iter_chunks по пользователям тестов."""
+    condition = User.telegram_id.between(_FIRST_ID, _LAST_ID)
+    if where is not None:
+        condition = condition & where
+    chunks = [
+        rows async for rows in repo.iter_chunks([User.telegram_id], where=condition, chunk_size=chunk_size)
+    ]
+    return [len(rows) for rows in chunks], [row.telegram_id for rows in chunks for row in rows]
+
+
+@pytest.mark.asyncio
+class TestIterChunks:
+    """Тесты iter_chunks на границах пачек."""
+
+    @pytest.mark.parametrize("chunk_size, sizes", [
+        (2, [2, 2, 2]),
+        (4, [4, 2]),
+        (6, [6]),
+        (10, [6]),
+    ])
+    async def test_chunk_boundaries(self, repo, chunk_size, sizes):
+        """Все строки по одному разу, по возрастанию id, пачками не больше chunk_size."""
+        telegram_ids = list(range(2000061, 2000067))
+        await repo.create_many([_user(telegram_id) for telegram_id in telegram_ids])
+
+        assert await _collect_chunks(repo, chunk_size) == (sizes, telegram_ids)
+
+    async def test_no_rows(self, repo):
+        """Пустая выборка — ни одной пачки."""
+        assert await _collect_chunks(repo, 2) == ([], [])
+
+    async def test_where_applies_to_every_chunk(self, repo):
+        """Фильтр действует во всех пачках, а не только в первой."""
+        await repo.create_many([
+            _user(telegram_id, is_active=telegram_id % 2 == 0) for telegram_id in range(2000071, 2000077)
+        ])
+
+        sizes, telegram_ids = await _collect_chunks(repo, 2, where=User.is_active == True)
+
+        assert sizes == [2, 1]
+        assert telegram_ids == [2000072, 2000074, 2000076]
+
+
+@pytest.mark.asyncio
+class TestUpdate:
+    """Тесты update (UPDATE ... RETURNING)."""
+
+    async def test_missing_id_returns_none(self, repo):
+        """Обновление несуществующей записи возвращает None."""
+        assert await repo.update(999999999, username="nobody") is None
+
+    async def test_returns_fresh_values_for_loaded_row(self, repo):
+        """Строка, уже загруженная в сессию, возвращается с новыми значениями."""
+        await repo.create_many([_user(2000081)])
+
+        async with unit_of_work():
+            loaded = await repo.get_by_field("telegram_id", 2000081)
+            assert loaded.username == "bulk2000081"
+            assert loaded.updated_at is None
+
+            updated = await repo.update(loaded.id, username="fresh")
+
+            assert updated is loaded
+            assert updated.username == "fresh"
+            # onupdate вычисляется в БД — значение приходит из RETURNING
+            assert updated.updated_at is not None
@@ -0,0 +1,86 @@
+"""
+Тесты сессий базы данных.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import delete, text
+
+from app.database import connection
+from app.database.connection import _read_only_session, get_db_session, unit_of_work
+from app.database.models import User
+from app.database.query_plan import seed_database
+from app.database.repositories.base import BaseRepository
+from app.database.repositories.user_repository import UserRepository
+
+
+@pytest.mark.asyncio
+class TestReadOnlySession:
+    """Сессии только для чтения."""
+
+    async def test_read_while_write_transaction_holds_primary(self, setup_database):
+        """На файловой SQLite чтение не ждет единственное соединение записи."""
+        await seed_database()
+
+        async with get_db_session() as session:
+            await session.execute(text("UPDATE users SET first_name = 'writer' WHERE telegram_id = 1000001"))
+
+            async def read():
+                async with _read_only_session() as read_session:
+                    result = await read_session.execute(text("SELECT COUNT(*) FROM users"))
+                    return result.scalar()
+
+            assert await asyncio.wait_for(read(), timeout=5) > 0
+
+        assert connection.ReadOnlySessionLocal.kw["bind"] is not connection.engine
+
+
+@pytest.fixture
+async def uow_telegram_id(setup_database):
+    """telegram_id пользователя, которого нет в БД до и после теста."""
+    telegram_id = 6000001
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.telegram_id == telegram_id))
+    yield telegram_id
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.telegram_id == telegram_id))
+
+
+@pytest.mark.asyncio
+class TestUnitOfWork:
+    """Единая транзакция нескольких вызовов репозиториев."""
+
+    async def test_outer_rollback_undoes_inner_writes(self, uow_telegram_id):
+        """Ошибка во внешнем контексте откатывает записи всех вложенных вызовов."""
+        await seed_database()
+        users = UserRepository()
+        before = await users.get_by_telegram_id(1000002)
+
+        with pytest.raises(RuntimeError):
+            async with unit_of_work():
+                await users.create(telegram_id=uow_telegram_id, first_name="UnitOfWork")
+                await users.update_values(before.id, first_name="changed")
+                # Вложенный unit_of_work присоединяется к внешнему, а не коммитит
+                async with unit_of_work():
+                    await users.set_trial_used(before.id)
+                raise RuntimeError("outer failure")
+
+        after = await users.get_by_telegram_id(1000002)
+        assert await users.get_by_telegram_id(uow_telegram_id) is None
+        assert (after.first_name, after.trial_used) == (before.first_name, before.trial_used)
+
+    async def test_nested_calls_share_session(self, setup_database):
+        """Внутри контекста все репозитории получают одну сессию."""
+        async with unit_of_work() as outer:
+            async with unit_of_work() as inner:
+                assert inner is outer
+            async with get_db_session() as session:
+                assert session is outer
+
+    async def test_commits_on_success(self, uow_telegram_id):
+        """Без ошибок записи фиксируются одним коммитом в конце."""
+        async with unit_of_work():
+            user = await BaseRepository(User).create(telegram_id=uow_telegram_id, first_name="UnitOfWork")
+
+        assert (await UserRepository().get_by_telegram_id(uow_telegram_id)).id == user.id
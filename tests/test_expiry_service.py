@@ -0,0 +1,92 @@
+"""
+Тесты деактивации истекших подписок.
+"""
+
+import asyncio
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from app.database.models import Subscription
+from app.database.query_plan import seed_database
+from app.database.repositories.base import BaseRepository
+from app.services.expiry_service import ExpiryService
+from config.settings import settings
+
+
+async def _create_subscriptions(end_dates):
+    """Активные подписки с заданными сроками окончания."""
+    subscriptions = BaseRepository(Subscription)
+    created = []
+    for end_date in end_dates:
+        subscription = await subscriptions.create(user_id=1, server_id=1, tariff_id=1, end_date=end_date)
+        created.append(subscription.id)
+    return created
+
+
+@pytest.mark.asyncio
+class TestExpiryService:
+    """Тесты ExpiryService."""
+
+    async def test_refill_loads_nearest_deadlines(self, setup_database):
+        """Куча содержит DATABASE_EXPIRY_HEAP_SIZE ближайших сроков по возрастанию."""
+        await seed_database()
+        oldest = datetime(2000, 1, 1)
+        ids = await _create_subscriptions([oldest + timedelta(minutes=i) for i in (2, 0, 1)])
+        service = ExpiryService()
+
+        with patch.object(settings.database, "expiry_heap_size", 2):
+            await service.refill()
+
+        assert sorted(service._heap) == [(oldest, ids[1]), (oldest + timedelta(minutes=1), ids[2])]
+        assert service._heap[0] == (oldest, ids[1])
+
+        await BaseRepository(Subscription).update_many([{"id": id, "is_active": False} for id in ids])
+
+    async def test_expire_due_deactivates_only_due(self, setup_database):
+        """Наступившие сроки деактивируются, будущие остаются в куче."""
+        await seed_database()
+        now = datetime.utcnow()
+        due = await _create_subscriptions([now - timedelta(minutes=2), now - timedelta(minutes=1)])
+        future = (await _create_subscriptions([now + timedelta(days=365)]))[0]
+        service = ExpiryService()
+        service._heap = [(now - timedelta(minutes=2), due[0]), (now - timedelta(minutes=1), due[1])]
+        service._heap.append((now + timedelta(days=365), future))
+
+        assert sorted(await service.expire_due()) == due
+
+        subscriptions = BaseRepository(Subscription)
+        assert [(await subscriptions.get_by_id(id)).is_active for id in due] == [False, False]
+        assert (await subscriptions.get_by_id(future)).is_active is True
+        assert service._heap == [(now + timedelta(days=365), future)]
+
+    async def test_refill_after_heap_drained(self, setup_database):
+        """После истечения всех сроков кучи перечитывание подхватывает следующие."""
+        await seed_database()
+        oldest = datetime(2000, 1, 1)
+        ids = await _create_subscriptions([oldest + timedelta(minutes=i) for i in range(3)])
+        service = ExpiryService()
+
+        with patch.object(settings.database, "expiry_heap_size", 2):
+            await service.refill()
+            assert sorted(await service.expire_due()) == ids[:2]
+            assert service._heap == []
+
+            await service.refill()
+            assert service._heap[0] == (oldest + timedelta(minutes=2), ids[2])
+            assert ids[2] in await service.expire_due()
+
+    async def test_run_sleeps_when_nothing_deactivated(self):
+        """Наступившие, но не деактивированные сроки не зацикливают перечитывание."""
+        service = ExpiryService()
+        service.subscription_repo = AsyncMock()
+        due = [(datetime.utcnow() - timedelta(seconds=1), 1)]
+        service.subscription_repo.get_next_expirations.side_effect = [due, due]
+        service.subscription_repo.deactivate_expired.return_value = []
+
+        with patch("app.services.expiry_service.asyncio.sleep", AsyncMock(side_effect=asyncio.CancelledError)):
+            with pytest.raises(asyncio.CancelledError):
+                await service.run()
+
+        service.subscription_repo.get_next_expirations.assert_awaited_once()
@@ -0,0 +1,121 @@
+"""
+Тесты keyset пагинации.
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy import delete
+from app.database.pagination import encode_cursor, decode_cursor
+from app.database.connection import get_db_session
+from app.database.models import User
+from app.database.query_plan import seed_database
+from app.database.repositories.base import BaseRepository
+from app.database.repositories.user_repository import UserRepository
+from app.core.exceptions import ValidationError
+
+
+class TestCursor:
+    """Тесты кодирования курсора."""
+
+    def test_roundtrip(self):
+        """Курсор декодируется в исходную позицию."""
+        created_at = datetime(2026, 1, 1, 10, 0, 0, 123456)
+
+        cursor = encode_cursor(created_at, 42)
+
+        assert decode_cursor(cursor) == (created_at, 42)
+
+    def test_cursor_is_url_safe(self):
+        """Курсор можно передавать в query string без экранирования."""
+        cursor = encode_cursor(datetime(2026, 1, 1), 1)
+
+        assert all(ch not in cursor for ch in "+/=")
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор приводит к ошибке валидации."""
+        with pytest.raises(ValidationError):
+            decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+class TestOffsetPage:
+    """Страница через OFFSET с курсором следующей страницы."""
+
+    async def test_offset_page_cursor_continues_listing(self, setup_database):
+        """Курсор страницы с offset продолжает тот же порядок без пропусков."""
+        await seed_database()
+        user_repo = UserRepository()
+        listing, _ = await user_repo.get_page(limit=30)
+
+        page, cursor = await user_repo.get_page(limit=10, offset=10)
+        following, _ = await user_repo.get_page(limit=10, cursor=cursor)
+
+        assert [user.id for user in page] == [user.id for user in listing[10:20]]
+        assert [user.id for user in following] == [user.id for user in listing[20:30]]
+
+
+async def _delete_keyset_users():
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.first_name == "keyset"))
+
+
+@pytest.fixture
+async def keyset_users(setup_database):
+    """Пользователи теста страниц; удаляются после теста."""
+    await _delete_keyset_users()
+    yield BaseRepository(User)
+    await _delete_keyset_users()
+
+
+async def _follow_cursor(repo: BaseRepository, limit: int) -> list:
+    """id всех страниц по курсору (не более 20 страниц)."""
+    ids, cursor = [], None
+    for _ in range(20):
+        page, cursor = await repo.get_page(limit=limit, cursor=cursor, filters={"first_name": "keyset"})
+        ids.extend(user.id for user in page)
+        if cursor is None:
+            return ids
+    raise AssertionError(f"Cursor does not advance: {ids}")
+
+
+def _keyset_user(telegram_id: int, **values) -> dict:
+    return {"telegram_id": telegram_id, "first_name": "keyset", **values}
+
+
+@pytest.mark.asyncio
+class TestKeysetTimestamps:
+    """Курсор продвигается при одинаковых created_at на SQLite."""
+
+    async def test_identical_whole_second_timestamps(self, keyset_users):
+        """created_at без микросекунд, записанные SQLAlchemy."""
+        created_at = datetime(2024, 1, 1)
+        await keyset_users.create_many([
+            _keyset_user(3000000 + i, created_at=created_at) for i in range(5)
+        ])
+
+        ids = await _follow_cursor(keyset_users, limit=2)
+
+        assert len(ids) == 5
+        assert ids == sorted(set(ids))
+
+    async def test_server_default_timestamps(self, keyset_users):
+        """created_at из server_default (без дробной части секунд)."""
+        await keyset_users.create_many([_keyset_user(3000010 + i) for i in range(5)])
+
+        ids = await _follow_cursor(keyset_users, limit=2)
+
+        assert len(ids) == 5
+        assert ids == sorted(set(ids))
+
+    async def test_mixed_storage_formats(self, keyset_users):
+        """Одна секунда в формате server_default и в формате SQLAlchemy."""
+        await keyset_users.create_many([_keyset_user(3000020), _keyset_user(3000021)])
+        created_at = (await keyset_users.get_by_field("telegram_id", 3000020)).created_at
+        await keyset_users.create_many([
+            _keyset_user(3000022 + i, created_at=created_at) for i in range(3)
+        ])
+
+        ids = await _follow_cursor(keyset_users, limit=2)
+
+        assert sorted(ids) == sorted(set(ids))
+        assert len(ids) == 5
@@ -0,0 +1,94 @@
+"""
+Тесты сброса кэша профилей пользователей.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from app.core.cache import cache
+from app.database.query_plan import seed_database
+from app.services.activity_service import activity_tracker
+from app.services.expiry_service import ExpiryService
+from app.services.user_service import UserService
+
+
+class FakeRedis:
+    """Redis в памяти: только команды, которые использует кэш."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+@pytest.fixture
+def fake_cache():
+    """Подключенный кэш поверх FakeRedis."""
+    redis, connected = cache.redis, cache.connected
+    cache.redis, cache.connected = FakeRedis(), True
+    yield cache
+    cache.redis, cache.connected = redis, connected
+
+
+@pytest.mark.asyncio
+class TestProfileCacheInvalidation:
+    """Фоновые записи сбрасывают закэшированные профили."""
+
+    async def test_activity_flush_invalidates_profile(self, setup_database, fake_cache):
+        """После записи активности профиль собирается заново."""
+        await seed_database()
+        service = UserService()
+        telegram_id = 1000010
+
+        with patch.object(service.user_repo, "get_profile", wraps=service.user_repo.get_profile) as get_profile:
+            await service.get_user_profile(telegram_id)
+            await service.get_user_profile(telegram_id)
+            assert get_profile.await_count == 1
+
+            activity_tracker.touch(telegram_id)
+            at = activity_tracker.pending(telegram_id)
+            await activity_tracker.flush()
+
+            profile = await service.get_user_profile(telegram_id)
+            assert get_profile.await_count == 2
+
+        assert profile["last_activity"].startswith(at.isoformat()[:19])
+
+    async def test_flush_keeps_other_profiles_cached(self, setup_database, fake_cache):
+        """Сбрасываются только профили записанных пользователей."""
+        await seed_database()
+        service = UserService()
+        await service.get_user_profile(1000012)
+
+        activity_tracker.touch(1000013)
+        await activity_tracker.flush()
+
+        with patch.object(service.user_repo, "get_profile", wraps=service.user_repo.get_profile) as get_profile:
+            await service.get_user_profile(1000012)
+        get_profile.assert_not_awaited()
+
+    async def test_expired_subscriptions_invalidate_profiles(self, setup_database, fake_cache):
+        """Деактивация истекших подписок сбрасывает профили их владельцев."""
+        await seed_database()
+        service = UserService()
+        await service.get_user_profile(1000011)
+
+        expiry = ExpiryService()
+        expiry.subscription_repo = AsyncMock()
+        expiry.subscription_repo.deactivate_expired.return_value = [11]
+        expiry.subscription_repo.get_owner_telegram_ids.return_value = [1000011]
+        expiry._heap = [(datetime.utcnow() - timedelta(seconds=1), 11)]
+        assert await expiry.expire_due() == [11]
+
+        with patch.object(service.user_repo, "get_profile", wraps=service.user_repo.get_profile) as get_profile:
+            await service.get_user_profile(1000011)
+        get_profile.assert_awaited_once()
+        expiry.subscription_repo.get_owner_telegram_ids.assert_awaited_once_with([11])
@@ -0,0 +1,79 @@
+"""
+Тесты планов запросов репозиториев.
+"""
+
+import pytest
+
+from app.database import connection
+from app.database.query_plan import (
+    FULL_SCAN,
+    TEMP_SORT,
+    check_repository_plans,
+    find_issues,
+    seed_database,
+    suggest_index,
+)
+from app.database.routing import replica_router
+
+
+class TestFindIssues:
+    """Тесты разбора планов."""
+
+    def test_sqlite_full_scan_with_suggestion(self):
+        statement = "SELECT payments.id FROM payments WHERE payments.user_id = ? ORDER BY payments.id"
+
+        issues = find_issues(statement, ["SCAN payments"])
+
+        assert [issue.kind for issue in issues] == [FULL_SCAN]
+        assert issues[0].suggestion == "CREATE INDEX idx_payments_user_id_id ON payments (user_id, id)"
+
+    def test_sqlite_index_scan_is_not_flagged(self):
+        statement = "SELECT users.id FROM users ORDER BY users.created_at, users.id"
+
+        assert find_issues(statement, ["SCAN users USING INDEX idx_users_created_id"]) == []
+
+    def test_temp_sort(self):
+        statement = (
+            "SELECT subscriptions.id FROM subscriptions "
+            "WHERE subscriptions.user_id = ? ORDER BY subscriptions.created_at DESC"
+        )
+
+        issues = find_issues(statement, [
+            "SEARCH subscriptions USING INDEX idx_subscriptions_user_active (user_id=?)",
+            "USE TEMP B-TREE FOR ORDER BY",
+        ])
+
+        assert [issue.kind for issue in issues] == [TEMP_SORT]
+        assert issues[0].table == "subscriptions"
+
+    def test_postgres_nodes(self):
+        statement = "SELECT servers.id FROM servers WHERE servers.is_active = $1"
+
+        issues = find_issues(statement, ["Sort", "Seq Scan servers"])
+
+        assert {issue.kind for issue in issues} == {FULL_SCAN, TEMP_SORT}
+
+    def test_suggest_index_orders_equality_before_range(self):
+        statement = (
+            "SELECT users.id FROM users "
+            "WHERE users.created_at >= ? AND users.is_active = ?"
+        )
+
+        suggestion = suggest_index(statement, "users", FULL_SCAN)
+
+        assert suggestion == "CREATE INDEX idx_users_is_active_created_at ON users (is_active, created_at)"
+
+
+@pytest.mark.asyncio
+class TestRepositoryPlans:
+    """Регрессионная проверка планов запросов по тестовой БД."""
+
+    async def test_no_unexpected_scans_or_sorts(self, setup_database):
+        await seed_database()
+        engines = [connection.engine] + [replica.engine for replica in replica_router.replicas]
+
+        report = await check_repository_plans(engines)
+
+        assert report == {}, "\n".join(
+            f"{name}: {issue}" for name, issues in report.items() for issue in issues
+        )
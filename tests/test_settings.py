@@ -0,0 +1,27 @@
+"""
+Тесты настроек приложения.
+"""
+
+import pytest
+
+from config.settings import DatabaseSettings
+
+
+class TestReplicaUrls:
+    """Разбор DATABASE_REPLICA_URLS."""
+
+    @pytest.mark.parametrize("value, expected", [
+        ("postgresql://replica1/db, postgresql://replica2/db", ["postgresql://replica1/db", "postgresql://replica2/db"]),
+        ("postgresql://replica1/db", ["postgresql://replica1/db"]),
+        ('["postgresql://replica1/db", "postgresql://replica2/db"]', ["postgresql://replica1/db", "postgresql://replica2/db"]),
+        ("", []),
+    ])
+    def test_parsed_from_env(self, monkeypatch, value, expected):
+        """URL через запятую и JSON-список из переменной окружения."""
+        monkeypatch.setenv("DATABASE_REPLICA_URLS", value)
+        assert DatabaseSettings().replica_urls == expected
+
+    def test_default_is_empty(self, monkeypatch):
+        """Без переменной окружения реплик нет."""
+        monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+        assert DatabaseSettings().replica_urls == []
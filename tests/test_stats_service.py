@@ -0,0 +1,56 @@
+"""
+Тесты сервиса сверки счетчиков статистики.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.database.query_plan import seed_database
+from app.database.repositories.stats_repository import StatsRepository, USERS_TOTAL
+from app.database.repositories.user_repository import UserRepository
+from app.services.stats_service import StatsService
+
+
+@pytest.mark.asyncio
+class TestStartupReconcile:
+    """Сверка при запуске."""
+
+    def setup_method(self):
+        self.stats_service = StatsService()
+        self.stats_service.stats_repo = AsyncMock()
+
+    async def test_skipped_when_counters_exist(self):
+        """Существующие счетчики сверяет периодическая задача."""
+        self.stats_service.stats_repo.exists.return_value = True
+
+        with patch.object(self.stats_service, "reconcile", AsyncMock()) as reconcile:
+            assert await self.stats_service.reconcile_on_startup() is False
+
+        reconcile.assert_not_called()
+
+    async def test_runs_when_counters_empty(self):
+        """Пустая таблица счетчиков заполняется при запуске."""
+        self.stats_service.stats_repo.exists.return_value = False
+
+        with patch.object(self.stats_service, "reconcile", AsyncMock()) as reconcile:
+            assert await self.stats_service.reconcile_on_startup() is True
+
+        reconcile.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+class TestReconcile:
+    """Сверка счетчиков по исходным таблицам."""
+
+    async def test_drift_corrected(self, setup_database):
+        """Расхождение возвращается и исправляется; повторная сверка его не находит."""
+        await seed_database()
+        stats_service = StatsService()
+        stats_repo = StatsRepository()
+        await stats_service.reconcile()
+
+        await stats_repo.increment({USERS_TOTAL: 5})
+        drift = await stats_service.reconcile()
+
+        assert drift == {USERS_TOTAL: 5}
+        assert (await stats_repo.get_counters([USERS_TOTAL]))[USERS_TOTAL] == await UserRepository().count()
+        assert await stats_service.reconcile() == {}
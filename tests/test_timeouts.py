@@ -0,0 +1,58 @@
+"""
+Тесты таймаутов методов репозиториев.
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import patch
+
+from app.core.exceptions import QueryTimeoutError
+from app.database import timeouts
+from app.database.instrumentation import current_operation, label_repository_methods
+from config.settings import settings
+
+
+@label_repository_methods
+class ReportRepository:
+    """Репозиторий, метод которого вызывает другой метод."""
+
+    def __init__(self):
+        self.seen = []
+
+    async def dashboard(self, delay: float = 0):
+        return await self.scan(delay)
+
+    async def scan(self, delay: float = 0):
+        self.seen.append((current_operation(), timeouts.statement_timeout_for(current_operation())))
+        await asyncio.sleep(delay)
+        return True
+
+
+@pytest.mark.asyncio
+class TestNestedOperations:
+    """Вложенные вызовы выполняются с меткой и таймаутом внешнего метода."""
+
+    async def test_nested_call_keeps_outer_label(self):
+        repo = ReportRepository()
+        budgets = {"ReportRepository.dashboard": 5, "ReportRepository.scan": 300}
+
+        with patch.dict(settings.database.statement_timeouts, budgets):
+            await repo.dashboard()
+            await repo.scan()
+
+        assert repo.seen == [
+            ("ReportRepository.dashboard", 5),
+            ("ReportRepository.scan", 300),
+        ]
+
+    async def test_nested_call_honours_outer_timeout(self):
+        repo = ReportRepository()
+        budgets = {"ReportRepository.dashboard": 0.05, "ReportRepository.scan": 300}
+
+        with patch.dict(settings.database.statement_timeouts, budgets), \
+                patch.object(timeouts, "_CANCEL_GRACE", 0):
+            with pytest.raises(QueryTimeoutError):
+                await asyncio.wait_for(repo.dashboard(delay=5), timeout=2)
+
+        assert current_operation() == "other"
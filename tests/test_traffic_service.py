@@ -0,0 +1,70 @@
+"""
+Тесты буфера трафика.
+"""
+
+import pytest
+from unittest.mock import patch
+
+from app.database.models import Subscription
+from app.database.query_plan import seed_database
+from app.database.repositories.base import BaseRepository
+from app.database.repositories.subscription_repository import SubscriptionRepository
+from app.services.traffic_service import TrafficBuffer, traffic_buffer
+
+
+async def _traffic_used(subscription_id: int) -> int:
+    subscription = await BaseRepository(Subscription).get_by_id(subscription_id)
+    return subscription.traffic_used
+
+
+@pytest.mark.asyncio
+class TestTrafficBuffer:
+    """Тесты TrafficBuffer."""
+
+    async def test_flush_coalesces_updates(self, setup_database):
+        """Обновления одной подписки сливаются и пишутся одним apply_traffic_usage."""
+        await seed_database()
+        await BaseRepository(Subscription).update_many([
+            {"id": 1, "traffic_used": 0},
+            {"id": 2, "traffic_used": 100},
+        ])
+        buffer = TrafficBuffer()
+
+        buffer.set_usage(1, 500)
+        buffer.add_usage(1, 20)
+        buffer.set_usage(1, 1000)
+        buffer.add_usage(1, 5)
+        buffer.add_usage(2, 10)
+        buffer.add_usage(2, 15)
+
+        with patch.object(
+            buffer.subscription_repo,
+            "apply_traffic_usage",
+            wraps=buffer.subscription_repo.apply_traffic_usage,
+        ) as apply:
+            assert await buffer.flush() == 2
+            assert await buffer.flush() == 0
+
+        apply.assert_awaited_once_with({1: 1005}, {2: 25})
+        assert await _traffic_used(1) == 1005
+        assert await _traffic_used(2) == 125
+
+    async def test_set_usage_written_on_flush(self, setup_database):
+        """set_usage не пишет в БД до записи буфера."""
+        await seed_database()
+        await BaseRepository(Subscription).update_many([{"id": 3, "traffic_used": 0}])
+
+        traffic_buffer.set_usage(3, 4096)
+        assert await _traffic_used(3) == 0
+
+        await traffic_buffer.flush()
+        assert await _traffic_used(3) == 4096
+
+    async def test_repository_update_writes_immediately(self, setup_database):
+        """update_traffic_usage пишет сразу; отсутствующая подписка — False."""
+        await seed_database()
+        repo = SubscriptionRepository()
+
+        assert await repo.update_traffic_usage(4, 2048) is True
+        assert await _traffic_used(4) == 2048
+        assert await repo.update_traffic_usage(999999, 1) is False
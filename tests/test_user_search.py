@@ -0,0 +1,129 @@
+"""
+Тесты поиска пользователей.
+"""
+
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.dialects import postgresql
+from unittest.mock import patch
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+
+from app.database import connection, search
+from app.database.connection import get_db_session
+from app.database.models import Base, User
+from app.database.query_plan import seed_database
+from app.database.repositories.user_repository import UserRepository
+
+# Диапазон telegram_id пользователей этих тестов
+_FIRST_ID, _LAST_ID = 5000000, 5000099
+
+
+async def _delete_test_users():
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.telegram_id.between(_FIRST_ID, _LAST_ID)))
+
+
+@pytest.fixture
+async def repo(setup_database):
+    """Репозиторий пользователей с тестовыми данными; строки тестов удаляются."""
+    await seed_database()
+    await _delete_test_users()
+    yield UserRepository()
+    await _delete_test_users()
+
+
+async def _fts_ids(term: str) -> list:
+    """id строк, найденных напрямую в таблице FTS5."""
+    async with get_db_session() as session:
+        result = await session.execute(
+            text("SELECT rowid FROM users_fts WHERE users_fts MATCH :q"),
+            {"q": f'"{term}"*'},
+        )
+        return list(result.scalars().all())
+
+
+@pytest.mark.asyncio
+class TestFastPaths:
+    """Точные совпадения без полнотекстового поиска."""
+
+    async def test_exact_telegram_id(self, repo):
+        """Числовой запрос — точный telegram_id."""
+        users = await repo.search_users("1000003")
+
+        assert [user.telegram_id for user in users] == [1000003]
+        assert await repo.search_users("1000003", offset=1) == []
+
+    async def test_exact_username_ignores_case(self, repo):
+        """@username — точное совпадение без учета регистра, без user30..user39."""
+        users = await repo.search_users("@USER3")
+
+        assert [user.username for user in users] == ["user3"]
+
+
+@pytest.mark.asyncio
+class TestFullTextSearch:
+    """Поиск через FTS5 на SQLite и ILIKE."""
+
+    async def test_word_prefix_found_by_index(self, repo):
+        """Начало любого слова имени находится через FTS5."""
+        assert search._search_index_enabled
+        user = await repo.create(telegram_id=5000001, first_name="Zephyrine Quark")
+
+        assert [found.id for found in await repo.search_users("zeph")] == [user.id]
+        assert [found.id for found in await repo.search_users("qua")] == [user.id]
+
+    async def test_triggers_follow_updates_and_deletes(self, repo):
+        """Триггеры синхронизируют FTS5 с INSERT, UPDATE и DELETE."""
+        user = await repo.create(telegram_id=5000002, first_name="Xanthippe")
+        assert await _fts_ids("xanth") == [user.id]
+
+        await repo.update_values(user.id, first_name="Yevgenia")
+        assert await _fts_ids("xanth") == []
+        assert await _fts_ids("yevgen") == [user.id]
+
+        await repo.delete(user.id)
+        assert await _fts_ids("yevgen") == []
+
+    async def test_substring_falls_back_to_like(self, repo):
+        """Подстрока внутри слова ищется через ILIKE, как без индекса."""
+        usernames = {user.username for user in await repo.search_users("ser1")}
+
+        assert {"user1", "user10", "user19"} <= usernames
+        assert "user2" not in usernames
+
+    async def test_like_without_index(self, repo):
+        """Без индекса поиск идет по подстроке."""
+        user = await repo.create(telegram_id=5000003, first_name="Wolfram")
+
+        with patch.object(search, "_search_index_enabled", False):
+            assert [found.id for found in await repo.search_users("olfra")] == [user.id]
+
+    def test_postgres_uses_trigram_ilike(self):
+        """На PostgreSQL FTS5 не используется, условие — ILIKE под индексы pg_trgm."""
+        assert search.fts_search_condition("postgresql", "user") is None
+
+        sql = str(search.like_search_condition("user").compile(dialect=postgresql.dialect()))
+        assert sql.count("ILIKE") == len(search.SEARCH_COLUMNS)
+
+
+@pytest.mark.asyncio
+class TestAutogenerate:
+    """Индекс поиска не попадает в автогенерацию миграций."""
+
+    async def test_search_index_objects_ignored(self, setup_database):
+        """Таблицы users_fts* существуют, но сравнение схемы их не видит."""
+        def include_object(object, name, type_, reflected, compare_to):
+            return not search.is_search_index_object(name, type_)
+
+        def diff(sync_connection):
+            context = MigrationContext.configure(sync_connection, opts={"include_object": include_object})
+            return compare_metadata(context, Base.metadata)
+
+        async with connection.engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync_connection: sync_connection.dialect.get_table_names(sync_connection))
+            changes = await conn.run_sync(diff)
+
+        assert "users_fts" in tables
+        assert not [change for change in changes if "users_fts" in str(change)]
+        assert search.is_search_index_object("idx_users_username_trgm", "index")
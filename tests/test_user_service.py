@@ -3,80 +3,249 @@
 """
 
 import pytest
-from unittest.mock import AsyncMock, patch
+from sqlalchemy import delete
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.services.user_service import UserService
-from app.core.exceptions import UserNotFoundError
+from app.database.connection import get_db_session
+from app.database.models import Subscription, User
+from app.database.query_plan import seed_database
+from app.database.repositories.base import BaseRepository
+from app.database.repositories.stats_repository import StatsRepository, USERS_ACTIVE, USERS_BANNED
+from app.database.repositories.user_repository import UserRepository
+from app.core.exceptions import DatabaseError, UserNotFoundError
 
 
 @pytest.mark.asyncio
 class TestUserService:
     """Тесты UserService."""
 
-    def setup_method(self):
-        self.user_service = UserService()
-
-    @patch('app.services.user_service.UserRepository')
-    async def test_get_or_create_user_existing(self, mock_repo):
+    @patch('app.services.user_service.unit_of_work')
+    @patch('app.services.user_service.activity_tracker')
+    @patch('app.services.user_service.UserRepository', autospec=True)
+    async def test_get_or_create_user_existing(self, mock_repo, mock_tracker, mock_uow):
         """Тест получения существующего пользователя."""
         # Arrange
-        mock_user = AsyncMock()
+        mock_user = MagicMock()
         mock_user.id = 1
         mock_user.telegram_id = 123456789
         mock_user.username = 'testuser'
 
         mock_repo.return_value.get_by_telegram_id.return_value = mock_user
-        mock_repo.return_value.update_last_activity.return_value = True
+        user_service = UserService()
 
         # Act
-        result = await self.user_service.get_or_create_user(123456789, 'testuser')
+        result = await user_service.get_or_create_user(123456789, 'testuser')
 
         # Assert
-        assert result is not None
+        assert result["telegram_id"] == 123456789
         mock_repo.return_value.get_by_telegram_id.assert_called_once_with(123456789)
-        mock_repo.return_value.update_last_activity.assert_called_once_with(1)
-
-    @patch('app.services.user_service.UserRepository')
-    async def test_get_or_create_user_new(self, mock_repo):
+        mock_repo.return_value.update_last_activity.assert_not_called()
+        mock_repo.return_value.create_user.assert_not_called()
+        mock_tracker.touch.assert_called_once_with(123456789)
+        mock_uow.assert_not_called()
+
+    @patch('app.services.user_service.unit_of_work')
+    @patch('app.services.user_service.UserRepository', autospec=True)
+    async def test_get_or_create_user_new(self, mock_repo, mock_uow):
         """Тест создания нового пользователя."""
         # Arrange
         mock_repo.return_value.get_by_telegram_id.return_value = None
 
-        mock_new_user = AsyncMock()
+        mock_new_user = MagicMock()
         mock_new_user.id = 2
         mock_new_user.telegram_id = 987654321
         mock_new_user.referral_code = 'NEWCODE'
 
         mock_repo.return_value.create_user.return_value = mock_new_user
+        user_service = UserService()
 
         # Act
-        result = await self.user_service.get_or_create_user(987654321, 'newuser')
+        result = await user_service.get_or_create_user(987654321, 'newuser')
 
         # Assert
-        assert result is not None
+        assert result["telegram_id"] == 987654321
         mock_repo.return_value.create_user.assert_called_once()
+        assert mock_repo.return_value.create_user.call_args.kwargs["telegram_id"] == 987654321
+        mock_uow.assert_called_once()
 
-    @patch('app.services.user_service.UserRepository')
+    @patch('app.services.user_service.UserRepository', autospec=True)
     async def test_get_user_profile_not_found(self, mock_repo):
         """Тест получения профиля несуществующего пользователя."""
         # Arrange
-        mock_repo.return_value.get_by_telegram_id.return_value = None
+        mock_repo.return_value.get_profile.return_value = None
+        user_service = UserService()
 
         # Act & Assert
         with pytest.raises(UserNotFoundError):
-            await self.user_service.get_user_profile(999999999)
+            await user_service.get_user_profile(999999999)
 
-    @patch('app.services.user_service.UserRepository')
-    async def test_ban_user_success(self, mock_repo):
+    @patch('app.services.user_service.unit_of_work')
+    @patch('app.services.user_service.SubscriptionRepository', autospec=True)
+    @patch('app.services.user_service.UserRepository', autospec=True)
+    async def test_ban_user_success(self, mock_repo, mock_subscription_repo, mock_uow):
         """Тест блокировки пользователя."""
         # Arrange
-        mock_user = AsyncMock()
+        mock_user = MagicMock()
         mock_user.id = 1
+        mock_user.is_banned = False
+        mock_user.referred_by = None
         mock_repo.return_value.get_by_telegram_id.return_value = mock_user
         mock_repo.return_value.ban_user.return_value = True
+        mock_subscription_repo.return_value.deactivate_user_subscriptions.return_value = [5]
+        user_service = UserService()
 
         # Act
-        result = await self.user_service.ban_user(123456789, True)
+        result = await user_service.ban_user(123456789, True)
 
         # Assert
         assert result is True
         mock_repo.return_value.ban_user.assert_called_once_with(1, True)
+        mock_subscription_repo.return_value.deactivate_user_subscriptions.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+class TestBanTransaction:
+    """Блокировка выполняется одной транзакцией с счетчиками."""
+
+    async def test_counter_failure_rolls_back_ban(self, setup_database):
+        """Ошибка при обновлении счетчиков не оставляет заблокированного пользователя."""
+        await seed_database()
+        user_repo = UserRepository()
+        stats_repo = StatsRepository()
+        user = await user_repo.get_by_telegram_id(1000007)
+        counters_before = await stats_repo.get_counters([USERS_ACTIVE, USERS_BANNED])
+
+        failing = AsyncMock(side_effect=RuntimeError("referrer update failed"))
+        with patch.object(UserRepository, "_add_referral_counts", failing):
+            with pytest.raises(DatabaseError):
+                await UserService().ban_user_with_subscriptions(user.telegram_id, True)
+
+        assert (await user_repo.get_by_id(user.id)).is_banned is False
+        assert await stats_repo.get_counters([USERS_ACTIVE, USERS_BANNED]) == counters_before
+
+    async def test_unban_restores_only_subscriptions_deactivated_by_ban(self, setup_database):
+        """Разблокировка не активирует подписки, отключенные до блокировки."""
+        await seed_database()
+        user = await UserRepository().get_by_telegram_id(1000040)
+        subscriptions = BaseRepository(Subscription)
+        active = (await subscriptions.get_all(filters={"user_id": user.id}))[0]
+        disabled = await subscriptions.create(
+            user_id=user.id,
+            server_id=active.server_id,
+            tariff_id=active.tariff_id,
+            end_date=active.end_date,
+            is_active=False,
+        )
+        service = UserService()
+
+        assert await service.ban_user_with_subscriptions(user.telegram_id, True) == [active.id]
+        assert await service.ban_user_with_subscriptions(user.telegram_id, False) == [active.id]
+
+        assert (await subscriptions.get_by_id(active.id)).is_active is True
+        assert (await subscriptions.get_by_id(disabled.id)).is_active is False
+
+
+@pytest.fixture
+async def new_telegram_id(setup_database):
+    """telegram_id пользователя, которого еще нет в БД."""
+    telegram_id = 4000001
+    async with get_db_session() as session:
+        await session.execute(delete(User).where(User.telegram_id == telegram_id))
+    return telegram_id
+
+
+@pytest.mark.asyncio
+class TestReferral:
+    """Обработка реферала при создании пользователя."""
+
+    async def test_referral_failure_keeps_new_user(self, new_telegram_id):
+        """Ошибка привязки откатывает только привязку, пользователь создается."""
+        await seed_database()
+        user_repo = UserRepository()
+        referrer = await user_repo.get_by_field("referral_code", "REF1")
+
+        failing = AsyncMock(side_effect=RuntimeError("referrer update failed"))
+        with patch.object(UserRepository, "_add_referral_counts", failing):
+            created = await UserService().get_or_create_user(new_telegram_id, referred_by="REF1")
+
+        user = await user_repo.get_by_telegram_id(new_telegram_id)
+        assert user is not None and user.id == created["id"]
+        assert user.referred_by is None
+        assert (await user_repo.get_by_id(referrer.id)).referral_count == referrer.referral_count
+
+    async def test_referral_attached_to_new_user(self, new_telegram_id):
+        """Успешная привязка видна в созданном пользователе и счетчиках пригласившего."""
+        await seed_database()
+        user_repo = UserRepository()
+        referrer = await user_repo.get_by_field("referral_code", "REF2")
+
+        created = await UserService().get_or_create_user(new_telegram_id, referred_by="REF2")
+
+        assert created["referred_by"] == "REF2"
+        assert (await user_repo.get_by_id(referrer.id)).referral_count == referrer.referral_count + 1
+
+    async def test_double_attach_counts_once(self, new_telegram_id):
+        """Повторная привязка не меняет реферала и не увеличивает счетчики второй раз."""
+        await seed_database()
+        user_repo = UserRepository()
+        referrer = await user_repo.get_by_field("referral_code", "REF3")
+        user = await user_repo.create_user(telegram_id=new_telegram_id, referral_code="DOUBLE1")
+
+        assert await user_repo.attach_referral(user.id, "REF3") is True
+        assert await user_repo.attach_referral(user.id, "REF3") is False
+
+        after = await user_repo.get_by_id(referrer.id)
+        assert after.referral_count == referrer.referral_count + 1
+        assert after.referral_active_count == referrer.referral_active_count + 1
+
+    async def test_recount_fixes_drift(self, setup_database):
+        """Сверка восстанавливает счетчики по фактическим рефералам."""
+        await seed_database()
+        user_repo = UserRepository()
+        referrer = await user_repo.get_by_field("referral_code", "REF4")
+        await user_repo._add_referral_counts("REF4", total=7, active=-1)
+
+        assert referrer.telegram_id in await user_repo.recount_referrals()
+
+        after = await user_repo.get_by_id(referrer.id)
+        actual = await user_repo.count_referral_stats("REF4")
+        assert (after.referral_count, after.referral_active_count) == (
+            actual["total_referred"], actual["active_referred"]
+        )
+        assert await user_repo.recount_referrals() == []
+
+
+@pytest.mark.asyncio
+class TestGetOrCreate:
+    """Получение или создание пользователя."""
+
+    async def test_existing_user_without_write_transaction(self, setup_database):
+        """Существующий пользователь читается без транзакции записи."""
+        await seed_database()
+
+        with patch("app.services.user_service.unit_of_work") as uow:
+            user = await UserService().get_or_create_user(1000001)
+
+        assert user["telegram_id"] == 1000001
+        uow.assert_not_called()
+
+    async def test_concurrent_create_returns_existing_user(self, new_telegram_id):
+        """Проигравший гонку создания получает пользователя, созданного другим запросом."""
+        await seed_database()
+        user_repo = UserRepository()
+        existing = await user_repo.create_user(telegram_id=new_telegram_id, referral_code="RACE1")
+        lookups = [None]
+
+        async def stale_lookup(telegram_id, view=None):
+            # Первое чтение (реплика) еще не видит пользователя
+            if lookups:
+                return lookups.pop()
+            return await UserRepository.get_by_telegram_id(user_repo, telegram_id, view)
+
+        service = UserService()
+        service.user_repo = user_repo
+        with patch.object(user_repo, "get_by_telegram_id", side_effect=stale_lookup), \
+                patch.object(user_repo, "create_user", AsyncMock(side_effect=DatabaseError("duplicate key"))):
+            user = await service.get_or_create_user(new_telegram_id)
+
+        assert user["id"] == existing.id
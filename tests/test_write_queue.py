@@ -0,0 +1,149 @@
+"""
+Тесты очереди записи SQLite с групповым коммитом.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database import connection
+from app.database.connection import get_db_session
+from app.database.query_plan import seed_database
+from app.database.repositories.user_repository import UserRepository
+from app.database.write_queue import write_queue
+
+
+@pytest.fixture
+async def running_queue(setup_database):
+    """Очередь записи на движке тестовой БД."""
+    await seed_database()
+    write_queue.start(connection.engine)
+    yield write_queue
+    await write_queue.stop()
+
+
+@pytest.fixture
+def commits(setup_database):
+    """Число COMMIT на основном движке."""
+    counted = []
+
+    def on_commit(conn):
+        counted.append(conn)
+
+    event.listen(connection.engine.sync_engine, "commit", on_commit)
+    yield counted
+    event.remove(connection.engine.sync_engine, "commit", on_commit)
+
+
+async def _first_name(telegram_id: int) -> str:
+    user = await UserRepository().get_by_telegram_id(telegram_id)
+    return user.first_name
+
+
+@pytest.mark.asyncio
+class TestWriteQueue:
+    """Тесты WriteQueue."""
+
+    async def test_concurrent_writes_share_commits(self, running_queue, commits):
+        """Параллельные транзакции фиксируются общими COMMIT."""
+        user_repo = UserRepository()
+        users = [await user_repo.get_by_telegram_id(1000000 + i) for i in range(1, 21)]
+
+        await asyncio.gather(*[
+            user_repo.update_values(user.id, first_name=f"batched {user.id}") for user in users
+        ])
+
+        assert 1 <= len(commits) < len(users)
+        for user in users:
+            assert await _first_name(user.telegram_id) == f"batched {user.id}"
+
+    async def test_failed_transaction_rolls_back_only_itself(self, running_queue):
+        """Ошибка откатывает SAVEPOINT своей транзакции, а не всю пачку."""
+
+        async def failing():
+            async with get_db_session() as session:
+                await session.execute(text("UPDATE users SET first_name = 'failed' WHERE telegram_id = 1000001"))
+                raise RuntimeError("boom")
+
+        async def succeeding():
+            async with get_db_session() as session:
+                await session.execute(text("UPDATE users SET first_name = 'saved' WHERE telegram_id = 1000002"))
+
+        results = await asyncio.gather(failing(), succeeding(), return_exceptions=True)
+
+        assert isinstance(results[0], RuntimeError)
+        assert results[1] is None
+        assert await _first_name(1000001) != "failed"
+        assert await _first_name(1000002) == "saved"
+
+    async def test_cancel_while_waiting_for_connection(self, running_queue):
+        """Отмененная в очереди транзакция не выполняется и не блокирует очередь."""
+        holding, release = asyncio.Event(), asyncio.Event()
+
+        async def holder():
+            async with get_db_session():
+                holding.set()
+                await release.wait()
+
+        async def waiter():
+            async with get_db_session() as session:
+                await session.execute(text("UPDATE users SET first_name = 'cancelled' WHERE telegram_id = 1000003"))
+
+        holder_task = asyncio.create_task(holder())
+        await holding.wait()
+        waiter_task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+
+        waiter_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter_task
+        release.set()
+        await holder_task
+
+        async with get_db_session() as session:
+            await session.execute(text("UPDATE users SET first_name = 'after' WHERE telegram_id = 1000004"))
+        assert await _first_name(1000003) != "cancelled"
+        assert await _first_name(1000004) == "after"
+
+    async def test_stop_drains_queued_transactions(self, running_queue):
+        """stop() выполняет транзакции, уже стоящие в очереди."""
+        holding, release = asyncio.Event(), asyncio.Event()
+
+        async def holder():
+            async with get_db_session():
+                holding.set()
+                await release.wait()
+
+        async def writer(telegram_id: int):
+            async with get_db_session() as session:
+                await session.execute(
+                    text("UPDATE users SET first_name = 'drained' WHERE telegram_id = :telegram_id"),
+                    {"telegram_id": telegram_id},
+                )
+
+        holder_task = asyncio.create_task(holder())
+        await holding.wait()
+        writers = [asyncio.create_task(writer(telegram_id)) for telegram_id in (1000005, 1000006)]
+        await asyncio.sleep(0)
+
+        stop_task = asyncio.create_task(write_queue.stop())
+        release.set()
+        await asyncio.gather(holder_task, *writers, stop_task)
+
+        assert not write_queue.running
+        assert await _first_name(1000005) == "drained"
+        assert await _first_name(1000006) == "drained"
+
+    async def test_other_event_loop_bypasses_queue(self, running_queue):
+        """Транзакции из другого event loop (потоки API) идут мимо очереди."""
+
+        async def write_from_thread():
+            assert not write_queue.serves_current_loop()
+            async with get_db_session() as session:
+                await session.execute(text("UPDATE users SET first_name = 'thread' WHERE telegram_id = 1000007"))
+
+        await asyncio.to_thread(asyncio.run, write_from_thread())
+
+        assert write_queue.serves_current_loop()
+        assert await _first_name(1000007) == "thread"